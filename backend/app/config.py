@@ -37,6 +37,23 @@ class Settings(BaseSettings):
     nova_act_mode: str = "mock"  # "mock" or "real"
     nova_act_starting_page: str = "https://expense.corp.example.com/dashboard"
     nova_act_headless: bool = False
+    # Warm browser sessions: each run worker keeps its Nova Act session open between runs
+    # (reset to the starting page), recycled after max_uses runs or max_age_seconds
+    nova_act_session_pool: bool = True
+    nova_act_session_max_uses: int = 25
+    nova_act_session_max_age_seconds: float = 1800.0
+    # Step fusion: consecutive steps on the same page (up to max_steps) run as one act() call;
+    # submit/confirm steps always run alone, and a failed fused call falls back to per-step
+    nova_act_fuse_steps: bool = True
+    nova_act_fuse_max_steps: int = 4
+    # Record-and-replay: steps that succeeded through act() are recorded as browser actions
+    # and replayed on later runs of the agent (act() only where replay fails)
+    nova_act_replay: bool = True
+    nova_act_replay_timeout_ms: int = 5000
+    # Learned instructions: a submit/confirm retry wording that worked is tried first on later
+    # runs of the agent, and forgotten after max_failures consecutive failures
+    nova_act_learned_instructions: bool = True
+    nova_act_learned_max_failures: int = 2
 
     # Optional API key: when set, require X-API-Key header on /api/* (401 if missing or wrong)
     api_key: str = ""
@@ -54,6 +71,104 @@ class Settings(BaseSettings):
     aws_region: str = "us-east-1"
     # Use inference profile ID for on-demand invocation (foundation ID not supported for on-demand)
     nova_model_id_lite: str = "us.amazon.nova-2-lite-v1:0"  # env NOVA_MODEL_ID_LITE
+    # Bedrock endpoint pool, in priority order: comma-separated "region" or "region=model_id"
+    # (env BEDROCK_ENDPOINTS). Empty = single endpoint aws_region + nova_model_id_lite.
+    bedrock_endpoints: str = ""
+
+    def get_bedrock_endpoints(self) -> list[tuple[str, str]]:
+        """(region, model_id) pairs for the Bedrock pool; model defaults to nova_model_id_lite."""
+        pairs = []
+        for item in (self.bedrock_endpoints or "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            region, _, model_id = item.partition("=")
+            pairs.append((region.strip(), model_id.strip() or self.nova_model_id_lite))
+        return pairs or [(self.aws_region, self.nova_model_id_lite)]
+
+    # Tiered receipt extraction, cheapest first: comma-separated "model_id" or
+    # "model_id=usd_per_1k_input/usd_per_1k_output" (env RECEIPT_MODEL_TIERS).
+    # Empty = single tier nova_model_id_lite. A result below the confidence threshold or
+    # missing amount/merchant/date is escalated to the next tier.
+    receipt_model_tiers: str = ""
+    receipt_escalation_confidence: float = 0.8
+
+    def get_receipt_model_tiers(self) -> list[tuple[str, float, float]]:
+        """(model_id, usd_per_1k_input, usd_per_1k_output) tiers, cheapest first."""
+        tiers = []
+        for item in (self.receipt_model_tiers or "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            model_id, _, prices = item.partition("=")
+            in_price, _, out_price = prices.partition("/")
+            try:
+                tiers.append((model_id.strip(), float(in_price or 0), float(out_price or 0)))
+            except ValueError:
+                tiers.append((model_id.strip(), 0.0, 0.0))
+        return tiers or [(self.nova_model_id_lite, 0.0, 0.0)]
+
+    # Scanned (image-only) PDF receipts: pages are rasterized in a process pool and
+    # extracted concurrently; page_concurrency bounds in-flight Nova calls across requests
+    receipt_pdf_max_pages: int = 20
+    receipt_pdf_render_workers: int = 2
+    receipt_pdf_page_concurrency: int = 4
+    receipt_pdf_render_scale: float = 2.0
+    # Streaming uploads are kept in memory up to this size, then spooled to a temp file
+    upload_spool_threshold_bytes: int = 1024 * 1024
+    # Resumable receipt uploads expire this long after their last received range
+    resumable_upload_ttl_seconds: int = 24 * 3600
+    # Bulk receipt ingestion (many files or a zip per request); workers bound concurrent
+    # extraction + inference across all bulk requests
+    bulk_receipt_workers: int = 4
+    bulk_receipt_max_files: int = 100
+    bulk_receipt_max_total_bytes: int = 200 * 1024 * 1024
+    # Refuse agent runs for a receipt whose duplicate (same file or same merchant/date/
+    # amount/currency) was already submitted; requests can override with allow_duplicate
+    block_duplicate_runs: bool = False
+    # Content-addressed receipt file store: LRU eviction past this size (unreferenced files first)
+    blob_store_budget_bytes: int = 2 * 1024 * 1024 * 1024
+    # Background agent runs (real Nova Act): fixed worker pool with bounded interactive and
+    # bulk queues; a full queue returns 429 with Retry-After based on the run time estimate
+    agent_run_workers: int = 2
+    agent_run_queue_size: int = 10
+    agent_run_bulk_queue_size: int = 50
+    agent_run_estimate_seconds: float = 120.0
+    # Durable run queue (SQLite, shared by all worker processes; empty = demo/queue/runs.sqlite3).
+    # Leases are renewed by heartbeats; a run whose lease expires is re-queued, and failed
+    # once it has been claimed max_attempts times
+    agent_run_queue_db: str = ""
+    agent_run_lease_seconds: float = 60.0
+    agent_run_max_attempts: int = 2
+    agent_run_poll_seconds: float = 2.0
+    # Max expenses (parameter sets) in one batch run
+    agent_batch_max_items: int = 50
+
+    # Bedrock resilience: classified retries with jittered backoff, per-operation deadlines,
+    # and a circuit breaker that fails fast after consecutive throttles/timeouts/5xx
+    bedrock_max_attempts: int = 4
+    bedrock_backoff_base_seconds: float = 0.5
+    bedrock_backoff_max_seconds: float = 20.0
+    bedrock_inference_deadline_seconds: float = 240.0
+    bedrock_receipt_deadline_seconds: float = 90.0
+    bedrock_circuit_failure_threshold: int = 5
+    bedrock_circuit_reset_seconds: float = 30.0
+    # Hedged Nova requests (opt-in): fire a second request, to the next endpoint in the pool,
+    # when the first is slower than the given percentile of recent latency; hedges capped
+    # at budget_ratio of calls
+    nova_hedging_enabled: bool = False
+    nova_hedge_percentile: float = 0.95
+    nova_hedge_min_delay_seconds: float = 1.0
+    nova_hedge_budget_ratio: float = 0.1
+    # Ceiling on threads running hedged Nova requests (primaries, hedges and abandoned losers)
+    nova_hedge_max_workers: int = 64
+    # Mark static prompt prefixes with Bedrock prompt-cache checkpoints (auto-disabled per model if rejected)
+    nova_prompt_cache_enabled: bool = True
+    # Max estimated tokens for the capture session part of the inference prompt (0 = no limit)
+    inference_session_token_budget: int = 6000
+    # Batch inference (bulk backfills): max sessions and estimated input tokens per Nova call
+    inference_batch_size: int = 5
+    inference_batch_token_budget: int = 24000
 
 
 settings = Settings()
@@ -22,8 +22,15 @@ logger = get_logger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Startup and shutdown lifecycle."""
+    from app.services.run_scheduler import resume_run_scheduler, shutdown_run_scheduler
+
     logger.info("application_startup", debug=settings.debug)
+    # Pick up runs queued before a restart or orphaned by a crashed worker
+    resume_run_scheduler()
     yield
+    # Running agent runs finish; queued runs stay in the durable queue
+    # (workers close their own browser sessions as they stop)
+    shutdown_run_scheduler()
     logger.info("application_shutdown")
 
 
@@ -68,7 +75,8 @@ app.add_middleware(APIKeyMiddleware)
 # ---------------------------------------------------------------------------
 # Rate limiter – protects expensive Nova endpoints from abuse.
 # Allows RATE_LIMIT_MAX_CALLS calls per IP per RATE_LIMIT_WINDOW_SECONDS.
-# Only applies to POST /api/capture/receipt and POST /api/agents/*/run.
+# Only applies to POST /api/capture/receipt (plus /bulk and resumable .../complete)
+# and POST /api/agents/*/run (plus /run/batch).
 # Judges doing 5-10 test runs will never hit the limit.
 # ---------------------------------------------------------------------------
 import time as _time
@@ -91,8 +99,9 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             return await call_next(request)
         path = request.url.path
         is_expensive = (
-            path == "/api/capture/receipt"
-            or (path.startswith("/api/agents/") and path.endswith("/run"))
+            path in ("/api/capture/receipt", "/api/capture/receipt/bulk")
+            or (path.startswith("/api/capture/receipt/uploads/") and path.endswith("/complete"))
+            or (path.startswith("/api/agents/") and path.endswith(("/run", "/run/batch")))
         )
         if not is_expensive:
             return await call_next(request)
@@ -136,8 +145,18 @@ def root() -> dict[str, str]:
 
 
 @app.get("/api/health")
-def get_health() -> dict[str, str]:
-    """Health check for load balancers and monitoring; includes mode, region, model_id."""
+def get_health() -> dict:
+    """Health check for load balancers and monitoring; includes mode, region, model_id, endpoint/circuit/hedging state."""
+    from app.services.nova_client import get_circuit_state, get_endpoint_stats, get_hedging_stats
+    from app.services.act_client import get_act_step_stats
+    from app.services.blob_store import get_blob_store
+    from app.services.browser_pool import get_browser_pool_stats
+    from app.services.instruction_cache import get_instruction_cache_stats
+    from app.services.pdf_receipt import get_pdf_receipt_stats
+    from app.services.receipt_parser import get_receipt_routing_stats
+    from app.services.replay import get_replay_stats
+    from app.services.run_scheduler import get_run_scheduler
+
     return {
         "status": "ok",
         "service": "shadow-ops-expense",
@@ -145,4 +164,15 @@ def get_health() -> dict[str, str]:
         "mode": settings.nova_mode,
         "region": settings.aws_region,
         "model_id": settings.nova_model_id_lite,
+        "bedrock_circuit": get_circuit_state(),
+        "bedrock_endpoints": get_endpoint_stats(),
+        "bedrock_hedging": get_hedging_stats(),
+        "receipt_routing": get_receipt_routing_stats(),
+        "receipt_pdf": get_pdf_receipt_stats(),
+        "receipt_blobs": get_blob_store().stats(),
+        "agent_runs": get_run_scheduler().stats(),
+        "nova_act_sessions": get_browser_pool_stats(),
+        "nova_act_steps": get_act_step_stats(),
+        "nova_act_replay": get_replay_stats(),
+        "nova_act_learned_instructions": get_instruction_cache_stats(),
     }
@@ -1,5 +1,7 @@
 """Core data contracts as Pydantic models."""
 
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -61,11 +63,66 @@ class InferredWorkflow(BaseModel):
     time_saved_minutes: int = Field(..., description="Estimated minutes saved per run when automated")
 
 
+class BatchInferRequest(BaseModel):
+    """Request to infer workflows for several stored capture sessions at once."""
+
+    session_ids: list[str] = Field(..., description="Capture session ids to infer workflows for")
+
+
+class BatchInferenceResult(BaseModel):
+    """Result of multi-session batch inference (bulk backfills)."""
+
+    workflows: dict[str, InferredWorkflow] = Field(
+        default_factory=dict,
+        description="Inferred workflows keyed by session_id",
+    )
+    retried: list[str] = Field(
+        default_factory=list,
+        description="Session ids that were missing or invalid in the batch output and retried alone",
+    )
+    errors: dict[str, str] = Field(
+        default_factory=dict,
+        description="Session ids that failed even after the individual retry, with error detail",
+    )
+
+
 # ---------------------------------------------------------------------------
 # Agent generation and execution (Nova Act scaffolding)
 # ---------------------------------------------------------------------------
 
 
+class PlanPart(BaseModel):
+    """A piece of a compiled instruction; a part with a param is kept only when that value is set."""
+
+    text: str = Field(..., description="Literal text; {value} is replaced by the parameter value")
+    param: str | None = Field(None, description="Parameter slot this part depends on")
+
+
+class PlanStep(BaseModel):
+    """One executable step of a compiled plan: instruction template plus parameter slots."""
+
+    index: int = Field(..., description="1-based position among the workflow's ordered steps")
+    order: int = Field(..., description="Step order from the workflow")
+    intent: str = Field(..., description="High-level intent (e.g. fill_field, submit_form)")
+    instruction: str = Field(..., description="Original workflow instruction")
+    parts: list[PlanPart] = Field(default_factory=list, description="Instruction template")
+    requires: str | None = Field(None, description="Use fallback_parts when this parameter is empty")
+    fallback_parts: list[PlanPart] = Field(default_factory=list, description="Template without requires")
+    commit: bool = Field(False, description="Submit/confirm step (files the expense); retried on failure")
+    selector_hint: str | None = Field(None, description="Selector or locator hint from the workflow")
+
+
+class ExecutionPlan(BaseModel):
+    """Ordered, skip-filtered steps compiled once at agent creation; runs only bind parameters."""
+
+    version: int = Field(..., description="Compiler version; older plans are recompiled")
+    steps: list[PlanStep] = Field(default_factory=list, description="Steps to execute, in order")
+    skipped: list[dict] = Field(
+        default_factory=list,
+        description="{index, intent} of steps not executed (browser already on the target page)",
+    )
+
+
 class ActAgentSpec(BaseModel):
     """Spec for an agent generated from an approved workflow."""
 
@@ -80,6 +137,33 @@ class ActAgentSpec(BaseModel):
         default_factory=list,
         description="Ordered steps (e.g. from workflow)",
     )
+    plan: ExecutionPlan | None = Field(None, description="Execution plan compiled from steps")
+
+
+class ReplayAction(BaseModel):
+    """A browser action recorded from a successful step, replayed without Nova Act."""
+
+    kind: Literal["fill", "select", "upload", "click"] = Field(..., description="Playwright action")
+    selector: str = Field(..., description="CSS selector matching exactly one element")
+    param: str | None = Field(None, description="Parameter whose value is filled, selected or uploaded")
+
+
+class ReplayStep(BaseModel):
+    """Recorded actions for one plan step."""
+
+    index: int = Field(..., description="Plan step index")
+    intent: str = Field(..., description="Step intent")
+    params: list[str] = Field(default_factory=list, description="Parameters set when recorded")
+    actions: list[ReplayAction] = Field(default_factory=list, description="Actions in order")
+    act_seconds: float = Field(0.0, description="act() time of the recorded step (latency saved per replay)")
+
+
+class ReplayScript(BaseModel):
+    """Replay script attached to an agent, valid for one compiled plan."""
+
+    agent_id: str = Field(..., description="Agent the script belongs to")
+    plan_fingerprint: str = Field(..., description="Hash of the plan it was recorded for")
+    steps: list[ReplayStep] = Field(default_factory=list, description="Recorded steps")
 
 
 class ExecutionRequest(BaseModel):
@@ -90,6 +174,14 @@ class ExecutionRequest(BaseModel):
         False,
         description="If true, simulate UI changes without performing them",
     )
+    allow_duplicate: bool = Field(
+        False,
+        description="Run even if a duplicate of this receipt was already submitted",
+    )
+    priority: Literal["interactive", "bulk"] = Field(
+        "interactive",
+        description="Queue lane for background runs; interactive runs are started first",
+    )
 
 
 class ExecutionResult(BaseModel):
@@ -104,9 +196,46 @@ class ExecutionResult(BaseModel):
     )
 
 
+class BatchExecutionRequest(BaseModel):
+    """Request to run an agent once per parameter set, back to back in one browser session."""
+
+    items: list[dict] = Field(..., min_length=1, description="Parameter values, one dict per expense")
+    simulate_ui_change: bool = Field(
+        False,
+        description="If true, simulate UI changes without performing them",
+    )
+    priority: Literal["interactive", "bulk"] = Field(
+        "bulk",
+        description="Queue lane for the background batch run",
+    )
+
+
+class BatchExecutionResult(BaseModel):
+    """Per-item results of a batch run; failed items do not stop the batch."""
+
+    status: str = Field(..., description="completed, partial (some items failed) or failed")
+    run_id: str = Field(..., description="Batch identifier (poll like a run)")
+    results: list[ExecutionResult] = Field(default_factory=list, description="One result per item, in order")
+    succeeded: int = Field(0, description="Items that completed")
+    failed: int = Field(0, description="Items that failed")
+    run_log: list[str] = Field(default_factory=list, description="Batch-level log messages")
+
+
 class ReceiptExtractionResult(BaseModel):
     """Result of receipt upload: session_id, extracted fields, workflow_inferred."""
 
     session_id: str = Field(..., description="Created capture session id")
     extracted: dict = Field(..., description="amount, merchant, date, category, currency, confidence")
     workflow_inferred: bool = Field(..., description="Whether inference was run and stored")
+    duplicate_of: list[str] = Field(
+        default_factory=list, description="Earlier receipt sessions for the same expense"
+    )
+    duplicate_reason: str | None = Field(None, description="image (same file) or fields (same expense)")
+
+
+class ResumableUploadCreate(BaseModel):
+    """Request body for POST /capture/receipt/uploads."""
+
+    size: int = Field(..., description="Total file size in bytes")
+    content_type: str = Field(..., description="Declared media type (e.g. image/jpeg, application/pdf)")
+    filename: str | None = Field(None, description="Original file name (informational)")
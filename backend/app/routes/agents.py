@@ -1,13 +1,25 @@
 """Agent generation and execution: generate from approved workflow, run via Nova Act."""
 
-import threading
+from pathlib import Path
 
 from fastapi import APIRouter, HTTPException
 
 from app.logging_config import get_logger
-from app.models import ActAgentSpec, ExecutionRequest, ExecutionResult, InferredWorkflow
+from app.config import settings
+from app.models import (
+    ActAgentSpec,
+    BatchExecutionRequest,
+    BatchExecutionResult,
+    ExecutionRequest,
+    ExecutionResult,
+    InferredWorkflow,
+)
 from app.services.act_client import get_act_client
+from app.services.checkpoints import load_checkpoint, refused_result, resume_lock, resume_refusal
+from app.services.duplicate_index import get_duplicate_index
+from app.services.execution_plan import plan_for
 from app.services.notifier import notify_run_completed
+from app.services.run_scheduler import get_run_scheduler, set_run_handler
 from app.services.storage import (
     agents_dir,
     approvals_dir,
@@ -22,8 +34,15 @@ logger = get_logger(__name__)
 router = APIRouter(prefix="/agents", tags=["agents"])
 act_client = get_act_client()
 
-# In-flight runs tracked by run_id so we can poll status
-_pending_runs: dict[str, dict] = {}  # run_id -> {"session_id": ..., "status": "running"}
+
+def _load_agent_spec(agent_path: Path) -> ActAgentSpec:
+    """Agent spec from disk; a missing or outdated execution plan is compiled and saved back."""
+    spec = ActAgentSpec.model_validate(read_json(agent_path))
+    plan = plan_for(spec)
+    if plan is not spec.plan:
+        spec.plan = plan
+        write_json(agent_path, spec.model_dump(mode="json"))
+    return spec
 
 
 @router.post("/{session_id}/generate")
@@ -59,24 +78,75 @@ def post_agents_generate(session_id: str) -> dict:
     return spec.model_dump(mode="json")
 
 
-def _run_agent_background(
-    session_id: str,
-    run_id: str,
-    agent_spec: ActAgentSpec,
-    parameters: dict,
-    simulate_ui_change: bool,
-) -> None:
-    """Execute agent in a background thread; write result to disk when done."""
+def _store_batch(session_id: str, batch: BatchExecutionResult) -> dict:
+    """Write the batch result and each item's result to demo/runs; notify completed items."""
+    for item in batch.results:
+        item_path = runs_dir() / f"{item.run_id}.json"
+        if item_path.exists() and read_json(item_path).get("status") == "completed":
+            continue  # stored by an earlier delivery of this batch
+        write_json(item_path, item.model_dump(mode="json"))
+        if item.status == "completed":
+            notify_run_completed(session_id, item.confirmation_id, item.run_id)
+    batch_dict = batch.model_dump(mode="json")
+    write_json(runs_dir() / f"{batch.run_id}.json", batch_dict)
+    logger.info(
+        "agent_batch_stored",
+        session_id=session_id,
+        run_id=batch.run_id,
+        succeeded=batch.succeeded,
+        failed=batch.failed,
+    )
+    return batch_dict
+
+
+def _run_agent_background(run: dict) -> dict:
+    """Execute a queued run (or batch) on a scheduler worker; write result to disk and return it."""
+    session_id, run_id, payload = run["session_id"], run["run_id"], run["payload"]
+    if "parameter_sets" in payload:
+        agent_spec = ActAgentSpec.model_validate(payload["agent_spec"])
+        batch = act_client.run_agent_batch(
+            agent_spec, payload["parameter_sets"], payload["simulate_ui_change"], batch_id=run_id
+        )
+        return _store_batch(session_id, batch)
+    # A resume continues the original run's checkpoint; a re-delivered run finds its own
+    checkpoint_id = payload.get("resume_of") or run_id
+    checkpoint = load_checkpoint(checkpoint_id)
+    refusal = None
+    if checkpoint is not None:
+        owner = checkpoint.data.get("resumed_by")
+        # Only the latest resume may continue the checkpoint (not the run it replaced)
+        refusal = f"run {owner} has taken it over" if owner and owner != run_id else resume_refusal(checkpoint)
+    if refusal:
+        logger.warning("agent_run_not_rerun", run_id=run_id, checkpoint=checkpoint_id, reason=refusal)
+        run_path = runs_dir() / f"{run_id}.json"
+        if run_path.exists():
+            stored = read_json(run_path)
+            if stored.get("status") == "completed":
+                return stored  # the earlier attempt's result stands
+        result = refused_result(checkpoint, run_id, refusal)
+        result_dict = result.model_dump(mode="json")
+        write_json(run_path, result_dict)
+        if result.status == "completed":
+            get_duplicate_index().record_run(session_id, run_id)
+            notify_run_completed(session_id, result.confirmation_id, run_id)
+        return result_dict
     try:
-        result = act_client.run_agent(agent_spec, parameters, simulate_ui_change)
+        agent_spec = ActAgentSpec.model_validate(payload["agent_spec"])
+        result = act_client.run_agent(
+            agent_spec,
+            payload["parameters"],
+            payload["simulate_ui_change"],
+            checkpoint_id=checkpoint_id,
+        )
         result_dict = result.model_dump(mode="json")
         result_dict["run_id"] = run_id
         run_path = runs_dir() / f"{run_id}.json"
         write_json(run_path, result_dict)
-        _pending_runs[run_id] = {"session_id": session_id, "status": "completed"}
         logger.info("agent_run_stored", session_id=session_id, run_id=run_id)
         if result.status == "completed":
+            get_duplicate_index().record_run(session_id, run_id)
             notify_run_completed(session_id, result.confirmation_id, run_id)
+        return result_dict
     except Exception as e:
         logger.exception("agent_run_background_error", run_id=run_id, error=str(e))
         error_result = ExecutionResult(
@@ -87,7 +157,10 @@ def _run_agent_background(
         )
         run_path = runs_dir() / f"{run_id}.json"
         write_json(run_path, error_result.model_dump(mode="json"))
-        _pending_runs[run_id] = {"session_id": session_id, "status": "failed"}
+        return error_result.model_dump(mode="json")
+
+
+set_run_handler(_run_agent_background)
 
 
 @router.post("/{session_id}/run")
@@ -95,8 +168,8 @@ def post_agents_run(session_id: str, body: ExecutionRequest) -> dict:
     """
     Execute agent. Runs synchronously for mock/simulate, async for real Nova Act.
 
-    For real Nova Act mode (without simulate), launches a background thread
-    and returns {status: 'running', run_id: '...'}. Poll the GET endpoint.
+    For real Nova Act mode (without simulate), queues the run on the durable run
+    queue and returns {status: 'running', run_id: '...'}. Poll the GET endpoint.
 
     For mock mode or simulate, returns the full result synchronously.
     """
@@ -108,32 +181,57 @@ def post_agents_run(session_id: str, body: ExecutionRequest) -> dict:
             detail="Agent not found; generate the agent first",
         )
 
-    agent_data = read_json(agent_path)
-    agent_spec = ActAgentSpec.model_validate(agent_data)
+    agent_spec = _load_agent_spec(agent_path)
 
-    from app.config import settings
+    if settings.block_duplicate_runs and not body.allow_duplicate and not body.simulate_ui_change:
+        executed = get_duplicate_index().executed_duplicates(session_id)
+        if executed:
+            other_session, other_run = executed[0]
+            logger.warning(
+                "agent_run_blocked_duplicate",
+                session_id=session_id,
+                duplicate_of=other_session,
+                run_id=other_run,
+            )
+            raise HTTPException(
+                status_code=409,
+                detail=(
+                    f"Duplicate expense: session {other_session} was already submitted "
+                    f"(run {other_run}). Set allow_duplicate to run anyway."
+                ),
+            )
     is_real = (settings.nova_act_mode or "mock").strip().lower() == "real"
 
     if is_real and not body.simulate_ui_change:
-        # Real Nova Act: run in background thread to avoid App Runner timeout
+        # Real Nova Act: queue on the durable run queue (any worker process executes it)
+        # to avoid App Runner timeout
         import uuid
         run_id = f"run_{uuid.uuid4().hex[:12]}"
-        _pending_runs[run_id] = {"session_id": session_id, "status": "running"}
-
-        thread = threading.Thread(
-            target=_run_agent_background,
-            args=(session_id, run_id, agent_spec, body.parameters, body.simulate_ui_change),
-            daemon=False,  # Non-daemon so it survives after response
+        position = get_run_scheduler().submit(
+            run_id,
+            session_id,
+            {
+                "agent_spec": agent_spec.model_dump(mode="json"),
+                "parameters": body.parameters,
+                "simulate_ui_change": body.simulate_ui_change,
+            },
+            lane=body.priority,
+        )
+        logger.info(
+            "agent_run_started_async",
+            session_id=session_id,
+            run_id=run_id,
+            lane=body.priority,
+            position=position,
         )
-        thread.start()
-        logger.info("agent_run_started_async", session_id=session_id, run_id=run_id)
 
         return {
             "status": "running",
             "run_id": run_id,
             "confirmation_id": None,
+            "queue_position": position,
             "run_log": [
-                f"[nova-act] Agent execution started in background",
+                f"[nova-act] Agent execution queued ({body.priority}, position {position})",
                 f"[nova-act] Run ID: {run_id}",
                 f"[nova-act] Poll GET /api/agents/{session_id}/run/{run_id} for result",
             ],
@@ -153,11 +251,155 @@ def post_agents_run(session_id: str, body: ExecutionRequest) -> dict:
             session_id=session_id,
             run_id=result.run_id,
         )
+        if result.status == "completed" and not body.simulate_ui_change:
+            get_duplicate_index().record_run(session_id, result.run_id)
         if result.status == "completed":
             notify_run_completed(session_id, result.confirmation_id, result.run_id)
         return result.model_dump(mode="json")
 
 
+@router.post("/{session_id}/run/batch")
+def post_agents_run_batch(session_id: str, body: BatchExecutionRequest) -> dict:
+    """
+    Run the agent once per parameter set, back to back in one browser session.
+
+    Items run in order; a failed item is reported and the batch continues. Real Nova Act
+    batches are queued like runs (default lane: bulk) and return {status: 'running',
+    run_id: 'batch_...'}; poll GET /run/{run_id}. Mock mode or simulate returns the
+    per-item results synchronously.
+    """
+    agent_path = agents_dir() / f"{session_id}.agent.json"
+    if not agent_path.exists():
+        logger.info("agent_run_spec_missing", session_id=session_id)
+        raise HTTPException(
+            status_code=404,
+            detail="Agent not found; generate the agent first",
+        )
+    if len(body.items) > settings.agent_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items. Max {settings.agent_batch_max_items} per batch.",
+        )
+    agent_spec = _load_agent_spec(agent_path)
+    is_real = (settings.nova_act_mode or "mock").strip().lower() == "real"
+
+    if is_real and not body.simulate_ui_change:
+        import uuid
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        position = get_run_scheduler().submit(
+            batch_id,
+            session_id,
+            {
+                "agent_spec": agent_spec.model_dump(mode="json"),
+                "parameter_sets": body.items,
+                "simulate_ui_change": body.simulate_ui_change,
+            },
+            lane=body.priority,
+        )
+        logger.info(
+            "agent_batch_started_async",
+            session_id=session_id,
+            run_id=batch_id,
+            items=len(body.items),
+            lane=body.priority,
+            position=position,
+        )
+        return {
+            "status": "running",
+            "run_id": batch_id,
+            "confirmation_id": None,
+            "queue_position": position,
+            "run_log": [
+                f"[nova-act] Batch of {len(body.items)} queued ({body.priority}, position {position})",
+                f"[nova-act] Poll GET /api/agents/{session_id}/run/{batch_id} for results",
+            ],
+            "message": "Batch execution started. Polling for results...",
+        }
+
+    batch = act_client.run_agent_batch(agent_spec, body.items, body.simulate_ui_change)
+    return _store_batch(session_id, batch)
+
+
+@router.post("/{session_id}/run/{run_id}/resume")
+def post_agent_run_resume(session_id: str, run_id: str) -> dict:
+    """
+    Resume a failed real Nova Act run from its first unfinished step, in a fresh browser
+    session, with the original parameters. Steps before it are restored on the new form.
+
+    409 if the run is still queued or running, if its expense was already submitted, or
+    if its submit/confirm step started without finishing (it may have been filed).
+    Progress goes on in the original run's checkpoint; real mode queues the resume
+    under a new run_id and returns {status: 'running', run_id: '...'}.
+    """
+    agent_path = agents_dir() / f"{session_id}.agent.json"
+    if not agent_path.exists():
+        raise HTTPException(status_code=404, detail="Agent not found; generate the agent first")
+    agent_spec = _load_agent_spec(agent_path)
+    # Held from the checks until the resume is queued (or, in mock mode, has run)
+    with resume_lock(run_id):
+        checkpoint = load_checkpoint(run_id)
+        if checkpoint is None or checkpoint.data["agent_id"] != agent_spec.agent_id:
+            raise HTTPException(status_code=404, detail="No checkpoint for this run")
+
+        active_id = checkpoint.data.get("resumed_by") or run_id
+        active = get_run_scheduler().queue.get(active_id)
+        if active and active["status"] in ("queued", "running"):
+            raise HTTPException(status_code=409, detail=f"Run {active_id} is still in progress")
+        refusal = resume_refusal(checkpoint)
+        if refusal:
+            logger.info("agent_run_resume_refused", session_id=session_id, run_id=run_id, reason=refusal)
+            raise HTTPException(status_code=409, detail=f"Run cannot be resumed: {refusal}")
+
+        resume_from = checkpoint.resume_index()
+        parameters = checkpoint.data["parameters"]
+        is_real = (settings.nova_act_mode or "mock").strip().lower() == "real"
+
+        if is_real:
+            import uuid
+            new_run_id = f"run_{uuid.uuid4().hex[:12]}"
+            checkpoint.mark_resumed(new_run_id)  # before the worker starts writing to it
+            position = get_run_scheduler().submit(
+                new_run_id,
+                session_id,
+                {
+                    "agent_spec": agent_spec.model_dump(mode="json"),
+                    "parameters": parameters,
+                    "simulate_ui_change": False,
+                    "resume_of": run_id,
+                },
+                lane="interactive",
+            )
+            logger.info(
+                "agent_run_resume_queued",
+                session_id=session_id,
+                run_id=new_run_id,
+                resume_of=run_id,
+                step=resume_from,
+                position=position,
+            )
+            return {
+                "status": "running",
+                "run_id": new_run_id,
+                "resume_of": run_id,
+                "resume_from_step": resume_from,
+                "confirmation_id": None,
+                "queue_position": position,
+                "run_log": [
+                    f"[nova-act] Resume of {run_id} from step {resume_from} queued (position {position})",
+                    f"[nova-act] Poll GET /api/agents/{session_id}/run/{new_run_id} for result",
+                ],
+                "message": "Resume started. Polling for result...",
+            }
+
+        result = act_client.run_agent(agent_spec, parameters, checkpoint_id=run_id)
+        write_json(runs_dir() / f"{result.run_id}.json", result.model_dump(mode="json"))
+        logger.info("agent_run_resumed", session_id=session_id, run_id=result.run_id, resume_of=run_id)
+        if result.status == "completed":
+            get_duplicate_index().record_run(session_id, result.run_id)
+            notify_run_completed(session_id, result.confirmation_id, result.run_id)
+        return {**result.model_dump(mode="json"), "resume_of": run_id, "resume_from_step": resume_from}
+
+
 @router.get("/{session_id}/run/{run_id}")
 def get_agent_run_status(session_id: str, run_id: str) -> dict:
     """
@@ -169,9 +411,17 @@ def get_agent_run_status(session_id: str, run_id: str) -> dict:
     if run_path.exists():
         return read_json(run_path)
 
-    # Check in-memory pending status
-    pending = _pending_runs.get(run_id)
-    if pending and pending["status"] == "running":
-        return {"status": "running", "run_id": run_id, "confirmation_id": None, "run_log": []}
+    # Check the shared run queue; queued runs report "running" plus their queue position
+    queued = get_run_scheduler().queue.get(run_id)
+    if queued and queued["session_id"] == session_id:
+        if queued["result"]:
+            return queued["result"]
+        return {
+            "status": "running",
+            "run_id": run_id,
+            "confirmation_id": None,
+            "run_log": [],
+            "queue_position": get_run_scheduler().position(run_id),
+        }
 
     raise HTTPException(status_code=404, detail="Run not found")
@@ -1,16 +1,71 @@
 """Workflow inference: load session, infer workflow, persist and return."""
 
+import re
+
 from fastapi import APIRouter, HTTPException
 
 from app.logging_config import get_logger
-from app.models import CaptureSession
-from app.services.inference import infer_workflow
+from app.models import BatchInferRequest, CaptureSession
+from app.services.inference import infer_workflow, infer_workflows_batch
 from app.services.storage import read_json, sessions_dir, workflows_dir, write_json
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/infer", tags=["infer"])
 
+MAX_BATCH_SESSIONS = 200
+# Session IDs from a request body become file names under demo/sessions
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@router.post("/batch")
+def post_infer_batch(body: BatchInferRequest) -> dict:
+    """
+    Infer workflows for many stored sessions, packing several sessions per Nova call.
+    Stores each workflow under demo/workflows and returns per-session outcome:
+    {inferred, retried, errors, not_found}. Per-session failures do not fail the request;
+    IDs that are not plain names (letters, digits, _ and -) are rejected with 400.
+    """
+    if not body.session_ids:
+        raise HTTPException(status_code=400, detail="session_ids must not be empty")
+    if len(body.session_ids) > MAX_BATCH_SESSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"session_ids must have at most {MAX_BATCH_SESSIONS} items",
+        )
+    invalid = [s for s in body.session_ids if not _SESSION_ID_RE.match(s)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid session_ids: {invalid[:5]}")
+
+    sessions: list[CaptureSession] = []
+    not_found: list[str] = []
+    for session_id in dict.fromkeys(body.session_ids):
+        session_path = sessions_dir() / f"{session_id}.json"
+        if not session_path.exists():
+            not_found.append(session_id)
+            continue
+        sessions.append(CaptureSession.model_validate(read_json(session_path)))
+
+    result = infer_workflows_batch(sessions)
+    for session_id, workflow in result.workflows.items():
+        write_json(
+            workflows_dir() / f"{session_id}.workflow.json",
+            workflow.model_dump(mode="json"),
+        )
+    logger.info(
+        "infer_batch_stored",
+        requested=len(body.session_ids),
+        inferred=len(result.workflows),
+        failed=len(result.errors),
+        not_found=len(not_found),
+    )
+    return {
+        "inferred": list(result.workflows),
+        "retried": result.retried,
+        "errors": result.errors,
+        "not_found": not_found,
+    }
+
 
 @router.post("/{session_id}")
 def post_infer_session(session_id: str) -> dict:
@@ -1,122 +1,213 @@
-"""Receipt upload: parse image, create session, run inference."""
+"""Receipt upload endpoints (single, bulk, resumable); the pipeline lives in receipt_pipeline."""
 
-import uuid
-
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 
+from app.config import settings
 from app.logging_config import get_logger
-from app.models import CaptureSession, CaptureStep
-from app.services.inference import infer_workflow
-from app.services.receipt_parser import parse_receipt
-from app.services.storage import sessions_dir, workflows_dir, write_json
+from app.models import ResumableUploadCreate
+from app.services import resumable_uploads
+from app.services.blob_store import get_blob_store, is_sha256
+from app.services.bulk_ingest import BulkIngest, expand_zip
+from app.services.receipt_pipeline import ALLOWED_CONTENT_TYPES, MAX_FILE_BYTES, process_receipt
+from app.services.storage import read_json, sessions_dir
+from app.services.upload_stream import receive_file, receive_files
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/capture", tags=["capture"])
 
-ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
-MAX_FILE_BYTES = 10 * 1024 * 1024  # 10MB
-
-
-def _synthetic_steps(extracted: dict) -> list[dict]:
-    """Build CaptureStep-like dicts from extracted receipt fields."""
-    return [
-        {
-            "step_index": 0,
-            "url": "/expense/dashboard",
-            "action": "navigate",
-            "element_text": None,
-            "field_label": None,
-            "value_redacted": None,
-            "screenshot_path": None,
-            "timestamp": None,
-        },
-        {
-            "step_index": 1,
-            "url": "/expense/new",
-            "action": "type",
-            "element_text": None,
-            "field_label": "amount",
-            "value_redacted": str(extracted.get("amount") or ""),
-            "screenshot_path": None,
-            "timestamp": None,
-        },
-        {
-            "step_index": 2,
-            "url": "/expense/new",
-            "action": "type",
-            "element_text": None,
-            "field_label": "merchant",
-            "value_redacted": str(extracted.get("merchant") or ""),
-            "screenshot_path": None,
-            "timestamp": None,
+# Documents the multipart body that the handler parses itself from the request stream
+_RECEIPT_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
         },
-        {
-            "step_index": 3,
-            "url": "/expense/new",
-            "action": "type",
-            "element_text": None,
-            "field_label": "date",
-            "value_redacted": str(extracted.get("date") or ""),
-            "screenshot_path": None,
-            "timestamp": None,
-        },
-        {
-            "step_index": 4,
-            "url": "/expense/new",
-            "action": "select",
-            "element_text": None,
-            "field_label": "category",
-            "value_redacted": str(extracted.get("category") or ""),
-            "screenshot_path": None,
-            "timestamp": None,
+    }
+}
+
+
+@router.post("/receipt", openapi_extra=_RECEIPT_UPLOAD_BODY)
+async def post_capture_receipt(request: Request) -> dict:
+    """
+    Upload receipt: extract fields, create CaptureSession, run inference, store workflow.
+    Returns session_id, extracted, workflow_inferred.
+
+    Images use Nova 2 Lite multimodal (or mock). PDFs with a text layer, HTML e-mails,
+    vendor JSON and plain text use the local deterministic parser (ereceipt_parser).
+    The multipart "file" field is streamed: size and file signature are checked as
+    chunks arrive, so oversized or mislabelled uploads are rejected early.
+    """
+    upload = await receive_file(request, ALLOWED_CONTENT_TYPES, MAX_FILE_BYTES)
+    try:
+        media_type = upload.media_type
+        body = upload.read()
+    finally:
+        upload.close()
+    # Extraction and inference block (Nova calls, PDF rendering): keep them off the event loop
+    return await run_in_threadpool(process_receipt, body, media_type, upload.size, upload.sha256)
+
+
+_BULK_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}}
+                    },
+                }
+            }
         },
-    ]
+    }
+}
 
 
-@router.post("/receipt")
-async def post_capture_receipt(file: UploadFile = File(...)) -> dict:
+@router.post("/receipt/bulk", openapi_extra=_BULK_UPLOAD_BODY)
+async def post_capture_receipt_bulk(request: Request) -> StreamingResponse:
     """
-    Upload receipt image: extract fields (Nova 2 Lite multimodal or mock), create
-    CaptureSession, run inference, store workflow. Returns session_id, extracted, workflow_inferred.
+    Upload many receipts (repeated "files" fields; any of them may be a zip archive).
+
+    Each file starts extraction + inference on the bulk worker pool as soon as it has
+    been received. The response is NDJSON: one line per file as it finishes
+    ({index, filename, status: ok|error, session_id, extracted | status_code, error}),
+    then a {"summary": ...} line. Per-file failures do not fail the batch.
     """
-    if not file.content_type or file.content_type.lower() not in ALLOWED_CONTENT_TYPES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid content type. Allowed: {', '.join(sorted(ALLOWED_CONTENT_TYPES))}",
-        )
-    body = await file.read()
-    if len(body) > MAX_FILE_BYTES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {MAX_FILE_BYTES // (1024 * 1024)}MB",
-        )
-    logger.info(
-        "receipt_upload_received",
-        file_size=len(body),
-        media_type=file.content_type,
+    allowed = ALLOWED_CONTENT_TYPES | {"application/zip"}
+    max_files = settings.bulk_receipt_max_files
+    max_total = settings.bulk_receipt_max_total_bytes
+    batch = BulkIngest(process_receipt)
+    received = 0  # receipt bytes accepted so far, zip entries counted uncompressed
+    try:
+        async for filename, item in receive_files(request, allowed, MAX_FILE_BYTES, max_files, max_total):
+            if isinstance(item, HTTPException) or item.media_type != "application/zip":
+                entries = [(filename, item)]
+            else:
+                # Unpacking reads and rewrites every entry: keep it off the event loop
+                entries = await run_in_threadpool(
+                    expand_zip, item, ALLOWED_CONTENT_TYPES, MAX_FILE_BYTES, max_total - received
+                )
+            for name, entry in entries:
+                if batch.count >= max_files:
+                    if not isinstance(entry, HTTPException):
+                        entry.close()
+                    raise HTTPException(status_code=400, detail=f"Too many files. Max files: {max_files}")
+                if not isinstance(entry, HTTPException):
+                    received += entry.size
+                batch.submit(name, entry)
+    except Exception:
+        batch.cancel()
+        raise
+    if batch.count == 0:
+        raise HTTPException(status_code=400, detail="No files uploaded in field 'files'.")
+    logger.info("bulk_receipt_received", files=batch.count)
+    return StreamingResponse(batch.ndjson(), media_type="application/x-ndjson")
+
+
+# ---------------------------------------------------------------------------
+# Resumable uploads: create, PUT byte ranges, query offset, complete.
+# ---------------------------------------------------------------------------
+
+
+@router.post("/receipt/uploads")
+def post_resumable_upload(body: ResumableUploadCreate) -> dict:
+    """Start a resumable receipt upload. Returns upload_id, offset (0), size, expires_at."""
+    return resumable_uploads.create_upload(
+        body.size, body.content_type, ALLOWED_CONTENT_TYPES, MAX_FILE_BYTES
     )
-    extracted = parse_receipt(body, file.content_type or "image/jpeg")
-    session_id = f"receipt_{uuid.uuid4().hex[:12]}"
-    steps_data = _synthetic_steps(extracted)
-    steps = [CaptureStep.model_validate(s) for s in steps_data]
-    session = CaptureSession(
-        session_id=session_id,
-        steps=steps,
-        metadata={"source": "receipt_upload"},
+
+
+@router.get("/receipt/uploads/{upload_id}")
+def get_resumable_upload(upload_id: str) -> dict:
+    """Bytes received so far (offset); resume with PUT from this offset. 404 if expired."""
+    return resumable_uploads.get_upload(upload_id)
+
+
+@router.put("/receipt/uploads/{upload_id}")
+async def put_resumable_upload_range(upload_id: str, request: Request) -> dict:
+    """
+    Append the raw request body at the Content-Range start ("bytes start-end/total").
+    Already-received bytes are skipped; a start past the current offset is 409.
+    Returns the new offset.
+    """
+    start, _, _ = resumable_uploads.parse_content_range(request.headers.get("content-range"))
+    return await resumable_uploads.append_range(
+        upload_id, start, request.stream(), ALLOWED_CONTENT_TYPES
     )
-    session_path = sessions_dir() / f"{session_id}.json"
-    write_json(session_path, session.model_dump(mode="json"))
-    workflow = infer_workflow(session)
-    workflow_path = workflows_dir() / f"{session_id}.workflow.json"
-    write_json(workflow_path, workflow.model_dump(mode="json"))
-    logger.info(
-        "receipt_pipeline_complete",
-        session_id=session_id,
-        workflow_inferred=True,
+
+
+@router.post("/receipt/uploads/{upload_id}/complete")
+def post_resumable_upload_complete(upload_id: str) -> dict:
+    """
+    Run the receipt pipeline on a fully received upload (same response as POST /receipt).
+    409 if bytes are missing or another request for the upload is in progress. The
+    upload is deleted after a successful run.
+    """
+    with resumable_uploads.claim(upload_id):
+        upload = resumable_uploads.open_completed(upload_id, ALLOWED_CONTENT_TYPES, MAX_FILE_BYTES)
+        try:
+            body = upload.read()
+        finally:
+            upload.close()
+        result = process_receipt(body, upload.media_type, upload.size, upload.sha256)
+        resumable_uploads.delete_upload(upload_id)
+    return result
+
+
+@router.delete("/receipt/uploads/{upload_id}")
+def delete_resumable_upload(upload_id: str) -> dict:
+    """Abandon an upload and free its storage. 409 while another request is using it."""
+    with resumable_uploads.claim(upload_id):
+        resumable_uploads.get_upload(upload_id)
+        resumable_uploads.delete_upload(upload_id)
+    return {"upload_id": upload_id, "deleted": True}
+
+
+# ---------------------------------------------------------------------------
+# Stored receipt files (content-addressed)
+# ---------------------------------------------------------------------------
+
+
+def _blob_response(sha256: str) -> FileResponse:
+    store = get_blob_store()
+    meta = store.get(sha256) if is_sha256(sha256) else None
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Receipt file not found")
+    if meta["evicted"]:
+        raise HTTPException(
+            status_code=404, detail="Receipt file was evicted; upload the receipt again to restore it"
+        )
+    # FileResponse handles Range requests and uses the server's zero-copy send extension
+    # when available; content never changes for a hash, so it is cacheable forever.
+    return FileResponse(
+        store.path(sha256),
+        media_type=meta["media_type"],
+        headers={"ETag": f'"{sha256}"', "Cache-Control": "private, max-age=31536000, immutable"},
     )
-    return {
-        "session_id": session_id,
-        "extracted": extracted,
-        "workflow_inferred": True,
-    }
+
+
+@router.get("/receipt/blobs/{sha256}")
+def get_receipt_blob(sha256: str) -> FileResponse:
+    """Stored receipt file by content hash (supports Range). 404 if unknown or evicted."""
+    return _blob_response(sha256)
+
+
+@router.get("/sessions/{session_id}/receipt")
+def get_session_receipt(session_id: str) -> FileResponse:
+    """Receipt file a receipt session was created from. 404 if none or evicted."""
+    path = sessions_dir() / f"{session_id}.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Session not found")
+    metadata = read_json(path).get("metadata") or {}
+    return _blob_response(metadata.get("content_sha256") or "")
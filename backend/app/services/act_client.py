@@ -1,18 +1,54 @@
 """Nova Act client: mock (deterministic) or real (SDK + Workflow/IAM auth)."""
 
+import importlib.util
+import threading
 import time
 import uuid
+from contextlib import ExitStack
 from typing import Any
 
 from app.config import settings
 from app.logging_config import get_logger
-from app.models import ActAgentSpec, ExecutionResult, InferredWorkflow
+from app.models import (
+    ActAgentSpec,
+    BatchExecutionResult,
+    ExecutionPlan,
+    ExecutionResult,
+    InferredWorkflow,
+    PlanStep,
+)
+from app.services.browser_pool import BrowserPool, PooledSession, get_browser_pool
+from app.services.checkpoints import (
+    RunCheckpoint,
+    load_checkpoint,
+    open_checkpoint,
+    refused_result,
+    resume_refusal,
+)
+from app.services.execution_plan import (
+    bind_instruction,
+    compile_plan,
+    fuse_steps,
+    fused_instruction,
+    plan_for,
+)
+from app.services.instruction_cache import get_instruction_cache, learned_instruction
+from app.services.replay import ReplayRun, get_replay_store
+from app.services.run_scheduler import (
+    LeaseLostError,
+    ensure_lease,
+    set_worker_init,
+    set_worker_teardown,
+)
 
 logger = get_logger(__name__)
 
 # Workflow definition name for Nova Act (created once, reused)
 _WORKFLOW_DEFINITION_NAME = "shadow-ops-expense-runner"
 
+# Appended to a failed submit/confirm instruction for its retry (learned when it works)
+_RETRY_ADAPTATION = "The button may have been renamed. Look for alternative submit or confirm buttons."
+
 
 def _workflow_to_parameter_schema(workflow: InferredWorkflow) -> dict[str, Any]:
     """Build a minimal JSON Schema for workflow parameters."""
@@ -36,20 +72,21 @@ def _workflow_steps_as_dicts(workflow: InferredWorkflow) -> list[dict[str, Any]]
     return [s.model_dump(mode="json") for s in workflow.steps]
 
 
-def _interpolate_instruction(
-    instruction: str,
-    uses_parameters: list[str],
-    parameters: dict[str, Any],
-) -> str:
-    """Append param values to instruction for the given param names."""
-    if not uses_parameters:
-        return instruction
-    parts = [instruction.strip()]
-    for name in uses_parameters:
-        val = parameters.get(name)
-        if val is not None and val != "":
-            parts.append(f"{name}: {val}")
-    return " ".join(parts)
+def _batch_result(batch_id: str, results: list[ExecutionResult], run_log: list[str]) -> BatchExecutionResult:
+    """Combine per-item results; status is completed, partial or failed."""
+    succeeded = sum(1 for r in results if r.status == "completed")
+    failed = len(results) - succeeded
+    status = "completed" if not failed else "failed" if not succeeded else "partial"
+    run_log.append(f"Batch finished: {succeeded} completed, {failed} failed")
+    logger.info("act_batch_completed", batch_id=batch_id, succeeded=succeeded, failed=failed)
+    return BatchExecutionResult(
+        status=status,
+        run_id=batch_id,
+        results=results,
+        succeeded=succeeded,
+        failed=failed,
+        run_log=run_log,
+    )
 
 
 def _is_submit_step(intent: str, instruction: str) -> bool:
@@ -79,24 +116,200 @@ def _detect_name_param(client, operation: str) -> str:
     return "name"
 
 
-def _ensure_workflow_definition() -> None:
-    """Create the Nova Act workflow definition if it does not exist (idempotent)."""
-    import boto3
+# Definition resolved once per process: cached boto3 client and parameter names
+_definition_lock = threading.Lock()
+_definition_client = None
+_definition_keys: tuple[str, str] | None = None  # (get key, create key)
+_definition_ready = False
+
+
+def _is_not_found(err: BaseException) -> bool:
+    """True for a ResourceNotFoundException (boto3 ClientError or SDK-wrapped)."""
+    response = getattr(err, "response", None)
+    code = response.get("Error", {}).get("Code", "") if isinstance(response, dict) else ""
+    return "ResourceNotFound" in code or "ResourceNotFound" in type(err).__name__
+
+
+def _ensure_workflow_definition(refresh: bool = False) -> None:
+    """Create the Nova Act workflow definition if it does not exist (idempotent).
+
+    Resolved once per process: later calls return without network round trips unless
+    refresh is set (after the definition turned out to be missing).
+    """
+    global _definition_client, _definition_keys, _definition_ready
+    if _definition_ready and not refresh:
+        return
+    with _definition_lock:
+        if _definition_ready and not refresh:
+            return
+        if _definition_client is None:
+            import boto3
+
+            _definition_client = boto3.client("nova-act", region_name=settings.aws_region)
+        client = _definition_client
+        if _definition_keys is None:
+            _definition_keys = (
+                _detect_name_param(client, "GetWorkflowDefinition"),
+                _detect_name_param(client, "CreateWorkflowDefinition"),
+            )
+            logger.info(
+                "workflow_definition_params", get_key=_definition_keys[0], create_key=_definition_keys[1]
+            )
+        get_key, create_key = _definition_keys
+
+        try:
+            client.get_workflow_definition(**{get_key: _WORKFLOW_DEFINITION_NAME})
+            logger.info("workflow_definition_exists", name=_WORKFLOW_DEFINITION_NAME, refresh=refresh)
+        except client.exceptions.ResourceNotFoundException:
+            client.create_workflow_definition(
+                **{create_key: _WORKFLOW_DEFINITION_NAME},
+                description="Shadow Ops expense workflow automation agent",
+            )
+            logger.info("workflow_definition_created", name=_WORKFLOW_DEFINITION_NAME)
+        _definition_ready = True
+
 
-    client = boto3.client("nova-act", region_name=settings.aws_region)
-    get_key = _detect_name_param(client, "GetWorkflowDefinition")
-    create_key = _detect_name_param(client, "CreateWorkflowDefinition")
-    logger.info("workflow_definition_params", get_key=get_key, create_key=create_key)
+def _open_browser_session() -> PooledSession:
+    """Open a Workflow run and a NovaAct browser on the starting page (browser pool opener)."""
+    from nova_act import NovaAct, Workflow
 
+    # Ensure workflow definition exists (cached after the first check)
+    _ensure_workflow_definition()
+    refreshed = False
+    while True:
+        stack = ExitStack()
+        try:
+            wf = stack.enter_context(
+                Workflow(
+                    workflow_definition_name=_WORKFLOW_DEFINITION_NAME,
+                    model_id="nova-act-latest",
+                )
+            )
+            nova = stack.enter_context(
+                NovaAct(
+                    starting_page=settings.nova_act_starting_page,
+                    workflow=wf,
+                    headless=settings.nova_act_headless,
+                    ignore_https_errors=True,
+                )
+            )
+            return PooledSession(nova, stack.close)
+        except BaseException as e:
+            stack.close()
+            if refreshed or not _is_not_found(e):
+                raise
+            # Definition deleted since it was cached: re-check (recreate) and retry once
+            logger.warning("workflow_definition_missing_refresh", error=str(e))
+            _ensure_workflow_definition(refresh=True)
+            refreshed = True
+
+
+def _browser_pool() -> BrowserPool:
+    return get_browser_pool(_open_browser_session)
+
+
+def _page_url(nova) -> str | None:
+    """Current page URL for checkpoints (None if the browser cannot tell)."""
     try:
-        client.get_workflow_definition(**{get_key: _WORKFLOW_DEFINITION_NAME})
-        logger.info("workflow_definition_exists", name=_WORKFLOW_DEFINITION_NAME)
-    except client.exceptions.ResourceNotFoundException:
-        client.create_workflow_definition(
-            **{create_key: _WORKFLOW_DEFINITION_NAME},
-            description="Shadow Ops expense workflow automation agent",
+        return nova.page.url
+    except Exception:
+        return None
+
+
+class _StepMetrics:
+    """act() calls, sub-steps and wall time of one real run's steps."""
+
+    def __init__(self, plan_steps: int, fused: bool):
+        self.plan_steps = plan_steps
+        self.fused = fused
+        self.act_calls = 0
+        self.fused_calls = 0
+        self.fallbacks = 0
+        self.sub_steps = 0
+        self.replayed = 0
+        # Failed act() calls that may have clicked or typed before failing
+        self.uncertain_failures = 0
+        self.in_doubt: set[int] = set()  # failed commit steps with such a failure
+        self.started = time.perf_counter()
+
+    def act(self, nova, instruction: str):
+        """nova.act(), counted."""
+        self.act_calls += 1
+        try:
+            result = nova.act(instruction)
+        except Exception as e:
+            if _may_have_acted(e):
+                self.uncertain_failures += 1
+            raise
+        self.sub_steps += result.metadata.num_steps_executed or 0
+        return result
+
+
+def _may_have_acted(err: BaseException) -> bool:
+    """
+    False only when a failed act() reports that it executed no browser actions (e.g. it
+    never found the button); any other failure may have happened after a click.
+    """
+    metadata = getattr(err, "metadata", None)
+    return getattr(metadata, "num_steps_executed", None) != 0
+
+
+# Per-run step totals since process start, keyed by "fused" / "per_step" (fusion on or off)
+_step_stats_lock = threading.Lock()
+_step_stats: dict[str, dict[str, float]] = {}
+
+
+def _record_step_metrics(metrics: _StepMetrics, run_log: list[str]) -> None:
+    elapsed = time.perf_counter() - metrics.started
+    run_log.append(
+        f"[nova-act] {metrics.act_calls} act() calls for {metrics.plan_steps} steps "
+        f"({metrics.replayed} replayed, {metrics.sub_steps} sub-steps, {elapsed:.1f}s)"
+    )
+    logger.info(
+        "nova_act_run_metrics",
+        fused=metrics.fused,
+        plan_steps=metrics.plan_steps,
+        act_calls=metrics.act_calls,
+        fused_calls=metrics.fused_calls,
+        fallbacks=metrics.fallbacks,
+        replayed=metrics.replayed,
+        sub_steps=metrics.sub_steps,
+        elapsed_sec=round(elapsed, 2),
+    )
+    key = "fused" if metrics.fused else "per_step"
+    with _step_stats_lock:
+        totals = _step_stats.setdefault(
+            key, {"runs": 0, "plan_steps": 0, "act_calls": 0, "sub_steps": 0, "fallbacks": 0, "seconds": 0.0}
         )
-        logger.info("workflow_definition_created", name=_WORKFLOW_DEFINITION_NAME)
+        totals["runs"] += 1
+        totals["plan_steps"] += metrics.plan_steps
+        totals["act_calls"] += metrics.act_calls
+        totals["sub_steps"] += metrics.sub_steps
+        totals["fallbacks"] += metrics.fallbacks
+        totals["seconds"] += elapsed
+
+
+def get_act_step_stats() -> dict:
+    """Per-run averages with step fusion on and off, for comparing the two (/api/health)."""
+    with _step_stats_lock:
+        snapshot = {key: dict(totals) for key, totals in _step_stats.items()}
+    out: dict[str, Any] = {
+        "fusion_enabled": settings.nova_act_fuse_steps,
+        "fuse_max_steps": settings.nova_act_fuse_max_steps,
+    }
+    for key, totals in snapshot.items():
+        runs = totals["runs"]
+        out[key] = {
+            "runs": runs,
+            "fallbacks": totals["fallbacks"],
+            "avg_act_calls": round(totals["act_calls"] / runs, 2),
+            "avg_sub_steps": round(totals["sub_steps"] / runs, 2),
+            "avg_seconds": round(totals["seconds"] / runs, 2),
+            "act_calls_per_step": round(totals["act_calls"] / totals["plan_steps"], 3)
+            if totals["plan_steps"]
+            else 0.0,
+        }
+    return out
 
 
 class ActClientMock:
@@ -112,8 +325,12 @@ class ActClientMock:
             parameter_schema=_workflow_to_parameter_schema(workflow),
             steps=_workflow_steps_as_dicts(workflow),
         )
+        spec.plan = compile_plan(spec.steps)
         logger.info(
-            "act_agent_created", agent_id=agent_id, session_id=workflow.session_id
+            "act_agent_created",
+            agent_id=agent_id,
+            session_id=workflow.session_id,
+            plan_steps=len(spec.plan.steps),
         )
         return spec
 
@@ -122,8 +339,9 @@ class ActClientMock:
         agent_spec: ActAgentSpec,
         parameters: dict[str, Any],
         simulate_ui_change: bool = False,
+        checkpoint_id: str | None = None,
     ) -> ExecutionResult:
-        """Run the agent mock: run_log and confirmation_id (e.g. EXP-2026-000123)."""
+        """Run the agent mock: run_log and confirmation_id (e.g. EXP-2026-000123). Keeps no checkpoints."""
         run_id = f"run_{uuid.uuid4().hex[:12]}"
         mode = "simulate" if simulate_ui_change else "execute"
         run_log: list[str] = [
@@ -131,16 +349,17 @@ class ActClientMock:
             f"[{mode}] Run ID: {run_id}",
             f"[{mode}] Parameters: {parameters!r}",
         ]
-        steps = sorted(
-            (s for s in agent_spec.steps if isinstance(s, dict) and "order" in s),
-            key=lambda s: s.get("order", 0),
-        )
-        for i, step in enumerate(steps, start=1):
-            intent = step.get("intent", "step")
-            instruction = step.get("instruction", "")
-            run_log.append(f"[{mode}] Step {i}: {intent} – {instruction}")
+        plan = plan_for(agent_spec)
+        for skipped in plan.skipped:
+            run_log.append(
+                f"[{mode}] Step {skipped['index']}: SKIPPED ({skipped['intent']}) – "
+                "browser already on target page"
+            )
+        for step in plan.steps:
+            i = step.index
+            run_log.append(f"[{mode}] Step {i}: {step.intent} – {bind_instruction(step, parameters)}")
 
-            if simulate_ui_change and _is_submit_step(intent, instruction):
+            if simulate_ui_change and _is_submit_step(step.intent, step.instruction):
                 run_log.append(f"[{mode}] Step {i} failed: element not found")
                 run_log.append(
                     "[simulate] UI changed: Submit renamed to Confirm"
@@ -165,6 +384,23 @@ class ActClientMock:
         )
         return result
 
+    def run_agent_batch(
+        self,
+        agent_spec: ActAgentSpec,
+        parameter_sets: list[dict[str, Any]],
+        simulate_ui_change: bool = False,
+        batch_id: str | None = None,
+    ) -> BatchExecutionResult:
+        """Run the agent mock once per parameter set."""
+        batch_id = batch_id or f"batch_{uuid.uuid4().hex[:12]}"
+        mode = "simulate" if simulate_ui_change else "execute"
+        run_log = [f"[{mode}] Batch {batch_id}: {len(parameter_sets)} items for {agent_spec.name}"]
+        results = [
+            self.run_agent(agent_spec, parameters, simulate_ui_change)
+            for parameters in parameter_sets
+        ]
+        return _batch_result(batch_id, results, run_log)
+
 
 class ActClientReal:
     """Real Nova Act client: execute workflow steps in a browser via Nova Act SDK.
@@ -184,22 +420,28 @@ class ActClientReal:
             parameter_schema=_workflow_to_parameter_schema(workflow),
             steps=_workflow_steps_as_dicts(workflow),
         )
+        spec.plan = compile_plan(spec.steps)
         logger.info(
-            "act_agent_created", agent_id=agent_id, session_id=workflow.session_id
+            "act_agent_created",
+            agent_id=agent_id,
+            session_id=workflow.session_id,
+            plan_steps=len(spec.plan.steps),
         )
         return spec
 
-    # Intents that are skipped because the browser already starts on the target page
-    _SKIP_INTENTS = {"navigate", "open_form"}
-
     def run_agent(
         self,
         agent_spec: ActAgentSpec,
         parameters: dict[str, Any],
         simulate_ui_change: bool = False,
+        checkpoint_id: str | None = None,
     ) -> ExecutionResult:
         """Run the agent via Nova Act SDK with Workflow/IAM auth.
 
+        Progress is checkpointed per step under checkpoint_id (default: this run's ID).
+        If that checkpoint already exists, the run resumes it in a fresh session: steps
+        before its first unfinished step are restored on the empty form, then it continues.
+
         Nova Act SDK API (verified):
         - act() returns ActResult with only .metadata (ActMetadata)
         - Success = no exception raised
@@ -214,123 +456,45 @@ class ActClientReal:
             f"[nova-act] Run ID: {run_id}",
             f"[nova-act] Parameters: {parameters!r}",
         ]
-        steps = sorted(
-            (s for s in agent_spec.steps if isinstance(s, dict) and "order" in s),
-            key=lambda s: s.get("order", 0),
-        )
+        plan = plan_for(agent_spec)
 
         # Import nova_act inside method so app works without it installed
         try:
-            from nova_act import NovaAct, Workflow
+            import nova_act  # noqa: F401
         except ImportError:
             logger.warning("nova_act_not_installed_fallback_mock")
             run_log.append("[nova-act] SDK not installed; falling back to mock.")
             return ActClientMock().run_agent(agent_spec, parameters, simulate_ui_change)
 
+        checkpoint = open_checkpoint(checkpoint_id or run_id, agent_spec.agent_id, plan, parameters)
+        if checkpoint.attempts > 1:
+            run_log.append(
+                f"[nova-act] Resuming run {checkpoint.run_id} at step {checkpoint.resume_index()} "
+                f"(attempt {checkpoint.attempts}); earlier steps are restored on the fresh form"
+            )
         try:
-            # Ensure workflow definition exists (idempotent)
-            _ensure_workflow_definition()
-
             run_log.append(f"[nova-act] Using Workflow/IAM auth (definition: {_WORKFLOW_DEFINITION_NAME})")
             run_log.append(f"[nova-act] Starting page: {settings.nova_act_starting_page}")
 
-            with Workflow(
-                workflow_definition_name=_WORKFLOW_DEFINITION_NAME,
-                model_id="nova-act-latest",
-            ) as wf:
-                run_log.append("[nova-act] Workflow run created")
-
-                with NovaAct(
-                    starting_page=settings.nova_act_starting_page,
-                    workflow=wf,
-                    headless=settings.nova_act_headless,
-                    ignore_https_errors=True,
-                ) as nova:
+            with _browser_pool().lease() as session:
+                if session.uses > 1:
+                    run_log.append(f"[nova-act] Reusing warm browser session (run {session.uses} on it)")
+                else:
+                    run_log.append("[nova-act] Workflow run created")
                     run_log.append("[nova-act] Browser session started")
-                    run_log.append(
-                        f"[nova-act] Already on target page: {settings.nova_act_starting_page}"
-                    )
-
-                    for i, step in enumerate(steps, start=1):
-                        intent = step.get("intent", "step")
-                        instruction = step.get("instruction", "")
-                        uses = step.get("uses_parameters") or []
-                        interpolated = _interpolate_instruction(instruction, uses, parameters)
-
-                        # Skip navigate/open_form — browser already starts on target page
-                        if intent in self._SKIP_INTENTS:
-                            run_log.append(
-                                f"[nova-act] Step {i}: SKIPPED ({intent}) – "
-                                "browser already on target page"
-                            )
-                            logger.info(
-                                "nova_act_step_skipped",
-                                step=i,
-                                intent=intent,
-                                reason="browser_already_on_page",
-                            )
-                            continue
-
-                        # Enhance instructions with page-specific context
-                        interpolated = self._enhance_instruction(
-                            intent, interpolated, parameters
-                        )
-                        run_log.append(f"[nova-act] Step {i}: {intent} – {interpolated}")
-
-                        t0 = time.perf_counter()
-                        try:
-                            act_result = nova.act(interpolated)
-                            elapsed = time.perf_counter() - t0
-                            steps_executed = act_result.metadata.num_steps_executed
-                            time_worked = act_result.metadata.time_worked_s or elapsed
-                            run_log.append(
-                                f"[nova-act] Step {i}: completed "
-                                f"({steps_executed} sub-steps, {time_worked:.1f}s)"
-                            )
-                            logger.info(
-                                "nova_act_step_success",
-                                step=i,
-                                intent=intent,
-                                elapsed_sec=round(elapsed, 2),
-                                sub_steps=steps_executed,
-                            )
-                        except Exception as step_err:
-                            elapsed = time.perf_counter() - t0
-                            err_name = type(step_err).__name__
-                            run_log.append(
-                                f"[nova-act] Step {i}: failed – {err_name}: {step_err}"
-                            )
-                            logger.warning(
-                                "nova_act_step_failed",
-                                step=i,
-                                intent=intent,
-                                error=str(step_err),
-                                elapsed_sec=round(elapsed, 2),
-                            )
-
-                            # Retry submit/confirm steps with adapted instruction
-                            if intent in ("submit_form", "confirm_action", "confirmation"):
-                                run_log.append(
-                                    f"[nova-act] Step {i}: retrying with adapted instruction"
-                                )
-                                retry_instruction = (
-                                    f"{interpolated}. The button may have been "
-                                    "renamed. Look for alternative submit or confirm buttons."
-                                )
-                                try:
-                                    retry_result = nova.act(retry_instruction)
-                                    retry_steps = retry_result.metadata.num_steps_executed
-                                    run_log.append(
-                                        f"[nova-act] Step {i}: retry succeeded ({retry_steps} sub-steps)"
-                                    )
-                                except Exception as retry_err:
-                                    run_log.append(
-                                        f"[nova-act] Step {i}: retry failed – {retry_err}"
-                                    )
-
-                    # Extract confirmation ID from the page if visible
-                    confirmation_id = self._extract_confirmation_id(nova, run_log)
+                run_log.append(
+                    f"[nova-act] Already on target page: {settings.nova_act_starting_page}"
+                )
+                confirmation_id = self._run_steps(
+                    session.nova,
+                    plan,
+                    parameters,
+                    run_log,
+                    agent_id=agent_spec.agent_id,
+                    checkpoint=checkpoint,
+                )
 
+            checkpoint.finish("completed", confirmation_id)
             run_log.append("[nova-act] All steps completed.")
             run_log.append(f"[nova-act] Confirmation ID: {confirmation_id}")
             logger.info(
@@ -348,6 +512,9 @@ class ActClientReal:
 
         except Exception as e:
             logger.exception("act_run_exception", error=str(e))
+            if not isinstance(e, LeaseLostError):
+                # After a lost lease the checkpoint belongs to the worker that reclaimed the run
+                checkpoint.finish("failed", error=str(e))
             run_log.append(f"[nova-act] Error: {e!s}")
             return ExecutionResult(
                 status="failed",
@@ -356,55 +523,405 @@ class ActClientReal:
                 run_log=run_log,
             )
 
-    @staticmethod
-    def _enhance_instruction(
-        intent: str, instruction: str, parameters: dict[str, Any]
+    def run_agent_batch(
+        self,
+        agent_spec: ActAgentSpec,
+        parameter_sets: list[dict[str, Any]],
+        simulate_ui_change: bool = False,
+        batch_id: str | None = None,
+    ) -> BatchExecutionResult:
+        """Run the agent once per parameter set, back to back in one browser session.
+
+        The browser returns to the starting page (the empty form) between items. A
+        failing item is recorded and the batch continues; if the browser itself stops
+        responding, the remaining items continue on a fresh session.
+
+        Item run IDs are {batch_id}_{index}, so when the queue delivers the same batch
+        again, items whose checkpoint shows them filed (or possibly filed) are not re-run.
+        """
+        batch_id = batch_id or f"batch_{uuid.uuid4().hex[:12]}"
+        run_log = [
+            f"[nova-act] Batch {batch_id}: {len(parameter_sets)} items for {agent_spec.name}",
+        ]
+        try:
+            import nova_act  # noqa: F401
+        except ImportError:
+            logger.warning("nova_act_not_installed_fallback_mock")
+            return ActClientMock().run_agent_batch(
+                agent_spec, parameter_sets, simulate_ui_change, batch_id=batch_id
+            )
+
+        plan = plan_for(agent_spec)
+        results: list[ExecutionResult] = []
+        pending = list(enumerate(parameter_sets))
+        while pending:
+            try:
+                with _browser_pool().lease() as session:
+                    run_log.append(
+                        f"[nova-act] Browser session {'reused' if session.uses > 1 else 'started'} "
+                        f"for items {pending[0][0] + 1}-{pending[-1][0] + 1}"
+                    )
+                    while pending:
+                        index, parameters = pending[0]
+                        results.append(self._run_batch_item(
+                            session.nova, plan, f"{batch_id}_{index}", index, parameters,
+                            agent_spec.agent_id,
+                        ))
+                        pending.pop(0)
+                        if not pending:
+                            break
+                        try:
+                            session.nova.go_to_url(settings.nova_act_starting_page)
+                        except Exception as e:
+                            run_log.append(f"[nova-act] Browser failed after item {index + 1}: {e}")
+                            session.broken = True
+                            break
+            except Exception as e:
+                if isinstance(e, LeaseLostError):
+                    # Reclaimed by another worker, which runs the remaining items
+                    logger.warning("act_batch_lease_lost", batch_id=batch_id, error=str(e))
+                else:
+                    # No browser could be opened: the remaining items cannot run
+                    logger.exception("act_batch_session_failed", batch_id=batch_id, error=str(e))
+                run_log.append(f"[nova-act] Error: {e!s}")
+                for index, _ in pending:
+                    results.append(
+                        ExecutionResult(
+                            status="failed",
+                            confirmation_id=None,
+                            run_id=f"{batch_id}_{index}",
+                            run_log=[f"[nova-act] Batch item {index + 1}: not run ({e!s})"],
+                        )
+                    )
+                pending = []
+        return _batch_result(batch_id, results, run_log)
+
+    def _run_batch_item(
+        self,
+        nova,
+        plan: ExecutionPlan,
+        run_id: str,
+        index: int,
+        parameters: dict[str, Any],
+        agent_id: str | None = None,
+    ) -> ExecutionResult:
+        """
+        One batch item on an open session; exceptions become a failed result. An item
+        whose checkpoint refuses another run (a redelivered batch) is reported, not re-run.
+        """
+        existing = load_checkpoint(run_id)
+        refusal = resume_refusal(existing) if existing is not None else None
+        if refusal:
+            logger.info("act_batch_item_not_rerun", run_id=run_id, index=index, reason=refusal)
+            return refused_result(existing, run_id, refusal)
+        run_log = [
+            f"[nova-act] Batch item {index + 1}: Run ID {run_id}",
+            f"[nova-act] Parameters: {parameters!r}",
+        ]
+        t0 = time.perf_counter()
+        checkpoint = open_checkpoint(run_id, agent_id or "", plan, parameters)
+        try:
+            confirmation_id = self._run_steps(
+                nova, plan, parameters, run_log, agent_id=agent_id, checkpoint=checkpoint
+            )
+            checkpoint.finish("completed", confirmation_id)
+        except LeaseLostError:
+            raise
+        except Exception as e:
+            logger.warning("act_batch_item_failed", run_id=run_id, index=index, error=str(e))
+            checkpoint.finish("failed", error=str(e))
+            run_log.append(f"[nova-act] Error: {e!s}")
+            return ExecutionResult(status="failed", confirmation_id=None, run_id=run_id, run_log=run_log)
+        run_log.append(f"[nova-act] Confirmation ID: {confirmation_id}")
+        logger.info(
+            "act_batch_item_completed",
+            run_id=run_id,
+            index=index,
+            confirmation_id=confirmation_id,
+            elapsed_sec=round(time.perf_counter() - t0, 2),
+        )
+        return ExecutionResult(
+            status="completed", confirmation_id=confirmation_id, run_id=run_id, run_log=run_log
+        )
+
+    def _run_steps(
+        self,
+        nova,
+        plan: ExecutionPlan,
+        parameters: dict[str, Any],
+        run_log: list[str],
+        agent_id: str | None = None,
+        checkpoint: RunCheckpoint | None = None,
     ) -> str:
-        """Add page-specific context to make Nova Act instructions more precise.
+        """
+        Execute the plan's steps on an open session; returns the confirmation ID. Steps
+        with a usable recording for this agent are replayed, the rest go through act().
+        Each step's outcome goes to the checkpoint; a submit/confirm step is marked
+        started there before it runs. Raises if the last submit/confirm step (the one
+        that files the expense) fails, or before it runs if this queued run lost its lease.
+        """
+        metrics = _StepMetrics(len(plan.steps), fused=settings.nova_act_fuse_steps)
+        replay = None
+        if agent_id and settings.nova_act_replay:
+            replay = ReplayRun(get_replay_store(), agent_id, plan, settings.nova_act_replay_timeout_ms)
+        # navigate/open_form were compiled out — browser already starts on target page
+        for skipped in plan.skipped:
+            run_log.append(
+                f"[nova-act] Step {skipped['index']}: SKIPPED ({skipped['intent']}) – "
+                "browser already on target page"
+            )
+            logger.info(
+                "nova_act_step_skipped",
+                step=skipped["index"],
+                intent=skipped["intent"],
+                reason="browser_already_on_page",
+            )
+        commits = [step for step in plan.steps if step.commit]
+        filing = commits[-1] if commits else None
+        max_steps = settings.nova_act_fuse_max_steps if settings.nova_act_fuse_steps else 1
+        try:
+            for group in fuse_steps(plan.steps, max_steps):
+                pending: list[PlanStep] = []
+                failed: list[int] = []
+                for step in group:
+                    if filing is not None and step.index == filing.index:
+                        ensure_lease()  # a queued run reclaimed elsewhere must not file too
+                    if checkpoint is not None and step.commit:
+                        checkpoint.step_started(step)
+                    if replay is not None and replay.ready(step, parameters):
+                        failed += self._act_steps(
+                            nova, pending, parameters, run_log, metrics, replay, agent_id, checkpoint
+                        )
+                        pending = []
+                        t0 = time.perf_counter()
+                        if replay.replay(nova.page, step, parameters, run_log):
+                            metrics.replayed += 1
+                            if checkpoint is not None:
+                                checkpoint.step_finished(
+                                    step, True, "replay", time.perf_counter() - t0, _page_url(nova)
+                                )
+                            continue
+                    pending.append(step)
+                failed += self._act_steps(
+                    nova, pending, parameters, run_log, metrics, replay, agent_id, checkpoint
+                )
+                if filing is not None and filing.index in failed:
+                    if filing.index in metrics.in_doubt:
+                        raise RuntimeError(
+                            f"Step {filing.index} ({filing.intent}) failed after it started; "
+                            "the expense may have been submitted"
+                        )
+                    raise RuntimeError(
+                        f"Step {filing.index} ({filing.intent}) failed; the expense was not submitted"
+                    )
 
-        The inferred workflow instructions are generic (e.g. "Fill amount, date").
-        We enhance them with specific form field details for the target expense page.
+            # Extract confirmation ID from the page if visible
+            return self._extract_confirmation_id(nova, run_log)
+        finally:
+            if replay is not None:
+                replay.save()
+            _record_step_metrics(metrics, run_log)
+
+    def _act_steps(
+        self,
+        nova,
+        steps: list[PlanStep],
+        parameters: dict[str, Any],
+        run_log: list[str],
+        metrics: _StepMetrics,
+        replay: ReplayRun | None,
+        agent_id: str | None = None,
+        checkpoint: RunCheckpoint | None = None,
+    ) -> list[int]:
         """
-        if intent == "fill_field":
-            # Be explicit about which fields to fill and how
-            parts = [
-                "On this expense form page, fill in the following fields:"
-            ]
-            field_map = {
-                "amount": ("Amount ($)", "number input"),
-                "date": ("Date", "date input"),
-                "category": ("Category", "select dropdown"),
-                "description": ("Description", "textarea"),
-                "merchant": ("Merchant", "text input"),
-            }
-            for param_name, (label, field_type) in field_map.items():
-                val = parameters.get(param_name)
-                if val is not None and val != "":
-                    parts.append(f'Set the "{label}" {field_type} to "{val}".')
-            return " ".join(parts)
-
-        if intent == "upload_receipt":
-            receipt = parameters.get("receipt_file", "")
-            if receipt:
-                return (
-                    f'Click the receipt upload area and upload the file "{receipt}". '
-                    "If the file picker appears, select the file."
+        Steps through act(): one fused call for several, one by one for one or if that
+        fails. Returns the indexes of steps that failed.
+        """
+        if not steps:
+            return []
+        if replay is not None:
+            replay.before_act(nova.page, steps)
+        if len(steps) > 1:
+            seconds = self._act_fused(nova, steps, parameters, run_log, metrics)
+            if seconds is not None:
+                if replay is not None:
+                    replay.record(nova.page, steps, parameters, seconds)
+                if checkpoint is not None:
+                    url = _page_url(nova)
+                    for step in steps:
+                        checkpoint.step_finished(step, True, "fused", seconds / len(steps), url)
+                return []
+        failed = []
+        for step in steps:
+            uncertain = metrics.uncertain_failures
+            seconds = self._act_step(nova, step, parameters, run_log, metrics, agent_id)
+            in_doubt = False
+            if seconds is None:
+                failed.append(step.index)
+                # A submit/confirm attempt may have clicked before failing
+                in_doubt = step.commit and metrics.uncertain_failures > uncertain
+                if in_doubt:
+                    metrics.in_doubt.add(step.index)
+            elif replay is not None:
+                replay.record(nova.page, [step], parameters, seconds)
+            if checkpoint is not None:
+                checkpoint.step_finished(
+                    step, seconds is not None, "act", seconds, _page_url(nova), in_doubt=in_doubt
                 )
-            return instruction
+        return failed
 
-        if intent == "submit_form":
-            return (
-                'Click the "Submit Expense" button at the bottom of the form. '
-                "A confirmation modal will appear."
+    def _act_fused(
+        self,
+        nova,
+        group: list[PlanStep],
+        parameters: dict[str, Any],
+        run_log: list[str],
+        metrics: _StepMetrics,
+    ) -> float | None:
+        """Run several same-page steps as one act() call; its seconds, or None if it failed."""
+        label = f"Steps {group[0].index}-{group[-1].index}"
+        instruction = fused_instruction([bind_instruction(step, parameters) for step in group])
+        run_log.append(
+            f"[nova-act] {label}: fused ({', '.join(step.intent for step in group)}) – {instruction}"
+        )
+        t0 = time.perf_counter()
+        try:
+            act_result = metrics.act(nova, instruction)
+        except Exception as fused_err:
+            metrics.fallbacks += 1
+            run_log.append(
+                f"[nova-act] {label}: fused call failed – {type(fused_err).__name__}: {fused_err}; "
+                "running the steps one by one"
             )
+            logger.warning(
+                "nova_act_fused_failed",
+                first_step=group[0].index,
+                last_step=group[-1].index,
+                error=str(fused_err),
+                elapsed_sec=round(time.perf_counter() - t0, 2),
+            )
+            return None
+        elapsed = time.perf_counter() - t0
+        metrics.fused_calls += 1
+        steps_executed = act_result.metadata.num_steps_executed
+        time_worked = act_result.metadata.time_worked_s or elapsed
+        run_log.append(
+            f"[nova-act] {label}: completed ({steps_executed} sub-steps, {time_worked:.1f}s)"
+        )
+        logger.info(
+            "nova_act_fused_success",
+            first_step=group[0].index,
+            last_step=group[-1].index,
+            steps=len(group),
+            elapsed_sec=round(elapsed, 2),
+            sub_steps=steps_executed,
+        )
+        return elapsed
+
+    def _act_step(
+        self,
+        nova,
+        step: PlanStep,
+        parameters: dict[str, Any],
+        run_log: list[str],
+        metrics: _StepMetrics,
+        agent_id: str | None = None,
+    ) -> float | None:
+        """
+        One step as its own act() call; seconds if it succeeded. A failed submit/confirm is
+        retried once with adapted wording, which is learned for the agent when it works and
+        tried first on later runs.
+        """
+        i, intent = step.index, step.intent
+        interpolated = bind_instruction(step, parameters)
+        cache = key = None
+        if step.commit and agent_id and settings.nova_act_learned_instructions:
+            cache = get_instruction_cache()
+            key = cache.key(agent_id, intent, settings.nova_act_starting_page)
+            adaptation = cache.get(key)
+            if adaptation:
+                learned = learned_instruction(interpolated, adaptation)
+                run_log.append(f"[nova-act] Step {i}: {intent} – {learned} (learned instruction)")
+                t0 = time.perf_counter()
+                try:
+                    act_result = metrics.act(nova, learned)
+                except Exception as learned_err:
+                    demoted = cache.miss(key)
+                    run_log.append(
+                        f"[nova-act] Step {i}: learned instruction failed – {learned_err}"
+                        + ("; demoted" if demoted else "")
+                    )
+                else:
+                    elapsed = time.perf_counter() - t0
+                    saved = cache.hit(key)
+                    run_log.append(
+                        f"[nova-act] Step {i}: completed with learned instruction "
+                        f"({act_result.metadata.num_steps_executed} sub-steps, {elapsed:.1f}s, "
+                        f"~{saved:.1f}s saved)"
+                    )
+                    logger.info(
+                        "nova_act_step_success",
+                        step=i,
+                        intent=intent,
+                        elapsed_sec=round(elapsed, 2),
+                        sub_steps=act_result.metadata.num_steps_executed,
+                        learned=True,
+                    )
+                    return elapsed
+        run_log.append(f"[nova-act] Step {i}: {intent} – {interpolated}")
 
-        if intent == "confirmation":
-            return (
-                'A confirmation modal is showing the expense summary. '
-                'Click the "Confirm" button to finalize the submission.'
+        t0 = time.perf_counter()
+        try:
+            act_result = metrics.act(nova, interpolated)
+            elapsed = time.perf_counter() - t0
+            steps_executed = act_result.metadata.num_steps_executed
+            time_worked = act_result.metadata.time_worked_s or elapsed
+            run_log.append(
+                f"[nova-act] Step {i}: completed "
+                f"({steps_executed} sub-steps, {time_worked:.1f}s)"
+            )
+            logger.info(
+                "nova_act_step_success",
+                step=i,
+                intent=intent,
+                elapsed_sec=round(elapsed, 2),
+                sub_steps=steps_executed,
+            )
+            return elapsed
+        except Exception as step_err:
+            elapsed = time.perf_counter() - t0
+            err_name = type(step_err).__name__
+            run_log.append(
+                f"[nova-act] Step {i}: failed – {err_name}: {step_err}"
+            )
+            logger.warning(
+                "nova_act_step_failed",
+                step=i,
+                intent=intent,
+                error=str(step_err),
+                elapsed_sec=round(elapsed, 2),
             )
 
-        return instruction
+            # Retry submit/confirm steps with adapted instruction
+            if step.commit:
+                run_log.append(
+                    f"[nova-act] Step {i}: retrying with adapted instruction"
+                )
+                retry_instruction = learned_instruction(interpolated, _RETRY_ADAPTATION)
+                try:
+                    retry_result = metrics.act(nova, retry_instruction)
+                    retry_steps = retry_result.metadata.num_steps_executed
+                    run_log.append(
+                        f"[nova-act] Step {i}: retry succeeded ({retry_steps} sub-steps)"
+                    )
+                    if cache is not None:
+                        cache.learn(key, _RETRY_ADAPTATION, failed_seconds=elapsed)
+                    return time.perf_counter() - t0
+                except Exception as retry_err:
+                    run_log.append(
+                        f"[nova-act] Step {i}: retry failed – {retry_err}"
+                    )
+        return None
 
     @staticmethod
     def _extract_confirmation_id(nova, run_log: list[str]) -> str:
@@ -434,5 +951,9 @@ def get_act_client() -> ActClientMock | ActClientReal:
     """Return ActClientReal if nova_act_mode=real, else ActClientMock."""
     mode = (settings.nova_act_mode or "mock").strip().lower()
     if mode == "real":
+        if settings.nova_act_session_pool and importlib.util.find_spec("nova_act"):
+            # Each run worker opens its browser session when it starts and closes it on exit
+            set_worker_init(lambda: _browser_pool().warm())
+            set_worker_teardown(lambda: _browser_pool().close_own())
         return ActClientReal()
     return ActClientMock()
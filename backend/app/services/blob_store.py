@@ -0,0 +1,181 @@
+"""Content-addressed store for receipt files.
+
+Blobs live under demo/blobs/{sha[:2]}/{sha} with a JSON sidecar holding size, media
+type, the set of referencing sessions and last access time. Identical uploads share
+one blob; the reference count is the number of sessions pointing at it. When the store
+grows past BLOB_STORE_BUDGET_BYTES, least recently used unreferenced blobs are deleted
+first. If that is not enough, the files of least recently used referenced blobs are
+deleted too, but their sidecars stay (marked evicted) so sessions keep the hash: the
+file is served as 404 until the same receipt is uploaded again, which restores it.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services.storage import blobs_dir, ensure_dir
+
+logger = get_logger(__name__)
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_sha256(value: str) -> bool:
+    return bool(_SHA256_RE.match(value or ""))
+
+
+class BlobStore:
+    """Deduplicating blob store with reference counts and budget-based LRU eviction."""
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._meta: dict[str, dict] = {}
+        self._total = 0
+        self._evictions = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.root.exists():
+            return
+        for sidecar in self.root.glob("*/*.json"):
+            try:
+                meta = json.loads(sidecar.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            stored = self.path(meta["sha256"]).exists()
+            if stored or meta.get("refs"):
+                meta["evicted"] = not stored
+                self._meta[meta["sha256"]] = meta
+                self._total += meta["size"] if stored else 0
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def _sidecar(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}.json"
+
+    def _save_meta(self, meta: dict) -> None:
+        self._sidecar(meta["sha256"]).write_text(json.dumps(meta), encoding="utf-8")
+
+    def put(self, sha256: str, body: bytes, media_type: str, ref: str | None = None) -> bool:
+        """
+        Store body under its hash (no-op if present) and add ref to its references.
+        An evicted file is written back. Returns True if the file was newly written.
+        """
+        if not is_sha256(sha256):
+            raise ValueError("sha256 must be 64 lowercase hex characters")
+        with self._lock:
+            meta = self._meta.get(sha256)
+            created = meta is None or meta["evicted"]
+            if created:
+                target = self.path(sha256)
+                ensure_dir(target.parent)
+                # Write to a temp file in the same directory, then rename: readers never
+                # see a partial blob and concurrent writers of the same hash are harmless
+                fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, target)
+                if meta is None:
+                    meta = {"sha256": sha256, "size": len(body), "media_type": media_type, "refs": []}
+                    self._meta[sha256] = meta
+                meta["evicted"] = False
+                self._total += len(body)
+            if ref and ref not in meta["refs"]:
+                meta["refs"].append(ref)
+            meta["last_access"] = time.time()
+            self._save_meta(meta)
+            if created:
+                self._evict_over_budget(keep=sha256)
+        if created:
+            logger.info("blob_stored", sha256=sha256, size=len(body), media_type=media_type)
+        return created
+
+    def release(self, sha256: str, ref: str) -> None:
+        """Drop one reference; the blob stays until eviction needs the space."""
+        with self._lock:
+            meta = self._meta.get(sha256)
+            if meta and ref in meta["refs"]:
+                meta["refs"].remove(ref)
+                if meta["evicted"] and not meta["refs"]:
+                    self._sidecar(sha256).unlink(missing_ok=True)
+                    del self._meta[sha256]
+                else:
+                    self._save_meta(meta)
+
+    def get(self, sha256: str) -> dict | None:
+        """
+        Metadata (size, media_type, refs, evicted) for a known blob, touching its LRU
+        time. A blob whose file was evicted has evicted=True and nothing to serve.
+        """
+        with self._lock:
+            meta = self._meta.get(sha256)
+            if meta is None:
+                return None
+            meta["last_access"] = time.time()
+            return dict(meta, refs=list(meta["refs"]))
+
+    def _over_budget(self) -> bool:
+        return self.budget_bytes > 0 and self._total > self.budget_bytes
+
+    def _evict_over_budget(self, keep: str) -> None:
+        """
+        Free space until the total fits the budget: delete LRU unreferenced blobs, then
+        the files (not the sidecars) of LRU referenced ones. Lock held.
+        """
+        if not self._over_budget():
+            return
+        candidates = sorted(
+            (m for sha, m in self._meta.items() if sha != keep and not m["evicted"]),
+            key=lambda m: (bool(m["refs"]), m.get("last_access", 0)),
+        )
+        for meta in candidates:
+            if not self._over_budget():
+                break
+            sha256 = meta["sha256"]
+            self.path(sha256).unlink(missing_ok=True)
+            if meta["refs"]:
+                meta["evicted"] = True
+                self._save_meta(meta)
+            else:
+                self._sidecar(sha256).unlink(missing_ok=True)
+                del self._meta[sha256]
+            self._total -= meta["size"]
+            self._evictions += 1
+            logger.info("blob_evicted", sha256=sha256, size=meta["size"], refs=len(meta["refs"]))
+        if self._over_budget():
+            logger.warning("blob_store_over_budget", total_bytes=self._total, budget_bytes=self.budget_bytes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "blobs": sum(1 for m in self._meta.values() if not m["evicted"]),
+                "evicted_files": sum(1 for m in self._meta.values() if m["evicted"]),
+                "total_bytes": self._total,
+                "budget_bytes": self.budget_bytes,
+                "unreferenced": sum(1 for m in self._meta.values() if not m["refs"]),
+                "evictions": self._evictions,
+                "over_budget": self._over_budget(),
+            }
+
+
+_store_lock = threading.Lock()
+_store: BlobStore | None = None
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store for the current storage root (reloaded if the root changes)."""
+    global _store
+    root = blobs_dir()
+    with _store_lock:
+        if _store is None or _store.root != root:
+            _store = BlobStore(root, settings.blob_store_budget_bytes)
+        return _store
@@ -0,0 +1,222 @@
+"""Warm Nova Act browser sessions for real agent runs.
+
+Opening a Workflow run and a NovaAct browser, then loading the starting page, is a large
+share of a run's latency. The pool keeps sessions open between runs, parked on the
+starting page: a run leases one, and on return it is navigated back to the starting page
+for the next run. A session is health-checked before each lease and recycled after
+NOVA_ACT_SESSION_MAX_USES runs or NOVA_ACT_SESSION_MAX_AGE_SECONDS, or if a run broke it.
+
+NovaAct drives Playwright's sync API, whose objects must stay on the thread that created
+them, so each run worker thread owns at most one session. The scheduler's workers warm
+their session when they start, so the first run on a worker is warm too, and close it
+themselves when they stop.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class PooledSession:
+    """An open NovaAct browser (nova) plus the callable that tears it down."""
+
+    def __init__(self, nova: Any, close: Callable[[], None]):
+        self.nova = nova
+        self._close = close
+        self.created = time.monotonic()
+        self.uses = 0
+        self.broken = False
+
+    def close(self) -> None:
+        try:
+            self._close()
+        except Exception as e:
+            logger.warning("browser_session_close_failed", error=str(e))
+
+
+class BrowserPool:
+    """One reusable session per worker thread, with health checks, recycling and metrics."""
+
+    def __init__(
+        self,
+        opener: Callable[[], PooledSession],
+        starting_page: str,
+        max_uses: int,
+        max_age_seconds: float,
+        enabled: bool = True,
+    ):
+        self._opener = opener
+        self.starting_page = starting_page
+        self.max_uses = max(1, max_uses)
+        self.max_age_seconds = max_age_seconds
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live: dict[int, PooledSession] = {}
+        self._stats = {
+            "opened": 0,
+            "leases": 0,
+            "warm_leases": 0,
+            "open_failures": 0,
+            "recycled_max_uses": 0,
+            "recycled_max_age": 0,
+            "recycled_unhealthy": 0,
+            "recycled_broken": 0,
+        }
+        self._open_seconds = 0.0
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _open(self) -> PooledSession:
+        t0 = time.perf_counter()
+        try:
+            session = self._opener()
+        except Exception:
+            self._count("open_failures")
+            raise
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._stats["opened"] += 1
+            self._open_seconds += elapsed
+        logger.info("browser_session_opened", open_sec=round(elapsed, 2), pooled=self.enabled)
+        return session
+
+    def _discard(self, session: PooledSession, reason: str | None) -> None:
+        """Close a session owned by the current thread and forget it."""
+        if getattr(self._local, "session", None) is session:
+            self._local.session = None
+            with self._lock:
+                self._live.pop(threading.get_ident(), None)
+        if reason:
+            self._count(f"recycled_{reason}")
+            logger.info("browser_session_recycled", reason=reason, uses=session.uses)
+        session.close()
+
+    def _expired(self, session: PooledSession) -> str | None:
+        if session.uses >= self.max_uses:
+            return "max_uses"
+        if self.max_age_seconds > 0 and time.monotonic() - session.created >= self.max_age_seconds:
+            return "max_age"
+        return None
+
+    def _healthy(self, session: PooledSession) -> bool:
+        """The browser still responds (the page can run a script)."""
+        try:
+            session.nova.page.evaluate("document.readyState")
+            return True
+        except Exception as e:
+            logger.info("browser_session_unhealthy", error=str(e))
+            return False
+
+    def _reset(self, session: PooledSession) -> bool:
+        """Navigate back to the starting page (drops form state); False if the browser failed."""
+        try:
+            session.nova.go_to_url(self.starting_page)
+            return True
+        except Exception as e:
+            logger.info("browser_session_reset_failed", error=str(e))
+            return False
+
+    def warm(self) -> None:
+        """Open this thread's session ahead of its first run (errors are logged, not raised)."""
+        if not self.enabled or getattr(self._local, "session", None) is not None:
+            return
+        try:
+            self._park(self._open())
+        except Exception as e:
+            logger.warning("browser_session_warm_failed", error=str(e))
+
+    def _park(self, session: PooledSession) -> None:
+        self._local.session = session
+        with self._lock:
+            self._live[threading.get_ident()] = session
+
+    @contextmanager
+    def lease(self) -> Iterator[PooledSession]:
+        """
+        This thread's warm session (opened if missing, expired or unhealthy). A session
+        the caller marks broken, or one whose block raised, is closed instead of reused.
+        """
+        session = getattr(self._local, "session", None) if self.enabled else None
+        if session is not None:
+            reason = self._expired(session) or (None if self._healthy(session) else "unhealthy")
+            if reason:
+                self._discard(session, reason)
+                session = None
+        warm = session is not None
+        if session is None:
+            session = self._open()
+            if self.enabled:
+                self._park(session)
+        session.uses += 1
+        with self._lock:
+            self._stats["leases"] += 1
+            self._stats["warm_leases"] += int(warm)
+        try:
+            yield session
+        except BaseException:
+            session.broken = True
+            raise
+        finally:
+            if not self.enabled:
+                session.close()
+            elif session.broken:
+                self._discard(session, "broken")
+            elif reason := self._expired(session):
+                self._discard(session, reason)
+            elif not self._reset(session):
+                self._discard(session, "broken")
+
+    def close_own(self) -> None:
+        """Close this thread's parked session, if any (worker shutdown)."""
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            self._discard(session, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            live = len(self._live)
+            open_seconds = self._open_seconds
+        return {
+            "enabled": self.enabled,
+            "live_sessions": live,
+            **stats,
+            "warm_hit_rate": round(stats["warm_leases"] / stats["leases"], 3) if stats["leases"] else 0.0,
+            "avg_open_seconds": round(open_seconds / stats["opened"], 2) if stats["opened"] else 0.0,
+            "max_uses": self.max_uses,
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+
+_pool_lock = threading.Lock()
+_pool: BrowserPool | None = None
+
+
+def get_browser_pool(opener: Callable[[], PooledSession] | None = None) -> BrowserPool | None:
+    """Process-wide pool; created on the first call that supplies an opener."""
+    global _pool
+    with _pool_lock:
+        if _pool is None and opener is not None:
+            _pool = BrowserPool(
+                opener,
+                settings.nova_act_starting_page,
+                settings.nova_act_session_max_uses,
+                settings.nova_act_session_max_age_seconds,
+                enabled=settings.nova_act_session_pool,
+            )
+        return _pool
+
+
+def get_browser_pool_stats() -> dict:
+    """Pool metrics for /api/health (empty until a real run or worker has used the pool)."""
+    pool = get_browser_pool()
+    return pool.stats() if pool is not None else {"enabled": settings.nova_act_session_pool, "live_sessions": 0}
@@ -0,0 +1,183 @@
+"""Bulk receipt ingestion: many files (or a zip of receipts) in one request.
+
+Each file is handed to a shared, bounded worker pool as soon as its multipart part
+has been received, so extraction and inference overlap the rest of the upload. Results
+are streamed back as NDJSON, one line per file in completion order, followed by a
+summary line. A failing file produces an error line and never fails the batch.
+"""
+
+import asyncio
+import json
+import mimetypes
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services.upload_stream import ReceiptUpload, UploadSink
+
+logger = get_logger(__name__)
+
+_ZIP_CHUNK_BYTES = 64 * 1024
+
+_executor_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.bulk_receipt_workers),
+                thread_name_prefix="receipt-bulk",
+            )
+        return _executor
+
+
+def expand_zip(
+    upload: ReceiptUpload, allowed_types: set[str], max_bytes: int, max_total_bytes: int
+) -> list[tuple[str, ReceiptUpload | HTTPException]]:
+    """
+    Receipts inside a zip archive as (name, upload-or-error) pairs.
+
+    Entries are streamed through UploadSink, so per-entry size and signature checks
+    apply to the uncompressed bytes and a zip bomb is cut off at the limit.
+    max_total_bytes is what is left of the request's size budget: uncompressed entries
+    past it are rejected. Directories and hidden / macOS metadata entries are skipped.
+    Closes the archive upload.
+    """
+    items: list[tuple[str, ReceiptUpload | HTTPException]] = []
+    total = 0
+    try:
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            return [("archive.zip", HTTPException(status_code=400, detail="Invalid zip archive."))]
+        with archive:
+            for info in archive.infolist():
+                base = info.filename.rsplit("/", 1)[-1]
+                if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                declared = mimetypes.guess_type(base)[0] or ""
+                sink = UploadSink(declared, allowed_types, max_bytes)
+                try:
+                    with archive.open(info) as entry:
+                        while chunk := entry.read(_ZIP_CHUNK_BYTES):
+                            total += len(chunk)
+                            if total > max_total_bytes:
+                                raise HTTPException(
+                                    status_code=400,
+                                    detail=(
+                                        "Archive too large. Remaining request size: "
+                                        f"{max(0, max_total_bytes) // (1024 * 1024)}MB"
+                                    ),
+                                )
+                            sink.write(chunk)
+                    items.append((info.filename, sink.finish()))
+                except HTTPException as e:
+                    sink.discard()
+                    items.append((info.filename, e))
+                    if total > max_total_bytes:
+                        break
+                except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                    # Corrupt, encrypted or unsupported-compression entry
+                    sink.discard()
+                    logger.warning("bulk_zip_entry_unreadable", entry=info.filename, error=str(e))
+                    items.append(
+                        (info.filename, HTTPException(status_code=400, detail="Unreadable zip entry."))
+                    )
+    finally:
+        upload.close()
+    return items
+
+
+class BulkIngest:
+    """One bulk request: submitted files, their futures, and streamed results."""
+
+    def __init__(self, process: Callable[[bytes, str, int, str], dict]):
+        self._process = process
+        self._started = time.monotonic()
+        self._immediate: list[dict] = []
+        self._futures: list[tuple[int, str, Future]] = []
+        self.count = 0
+
+    def _run(self, upload: ReceiptUpload) -> dict:
+        try:
+            body = upload.read()
+        finally:
+            upload.close()
+        return self._process(body, upload.media_type, upload.size, upload.sha256)
+
+    def submit(self, filename: str, item: ReceiptUpload | HTTPException) -> None:
+        """Queue one file (or record its validation error) without waiting for it."""
+        index = self.count
+        self.count += 1
+        if isinstance(item, HTTPException):
+            self._immediate.append(_error_line(index, filename, item.status_code, item.detail))
+            return
+        self._futures.append((index, filename, _pool().submit(self._run, item)))
+
+    def cancel(self) -> None:
+        """Cancel files that have not started (the request itself was rejected)."""
+        for _, _, future in self._futures:
+            future.cancel()
+
+    async def results(self) -> AsyncIterator[dict]:
+        """Per-file result dicts in completion order, then {"summary": {...}}."""
+        succeeded = 0
+        for line in self._immediate:
+            yield line
+        waiting = {
+            asyncio.wrap_future(future): (index, filename)
+            for index, filename, future in self._futures
+        }
+        while waiting:
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, filename = waiting.pop(task)
+                try:
+                    result = task.result()
+                except HTTPException as e:
+                    yield _error_line(index, filename, e.status_code, e.detail)
+                    continue
+                except Exception as e:
+                    logger.error("bulk_receipt_failed", filename=filename, error=str(e))
+                    yield _error_line(index, filename, 500, "Receipt processing failed.")
+                    continue
+                succeeded += 1
+                yield {"index": index, "filename": filename, "status": "ok", **result}
+        elapsed = time.monotonic() - self._started
+        logger.info(
+            "bulk_receipt_complete",
+            files=self.count,
+            succeeded=succeeded,
+            elapsed_sec=round(elapsed, 2),
+        )
+        yield {
+            "summary": {
+                "files": self.count,
+                "succeeded": succeeded,
+                "failed": self.count - succeeded,
+                "elapsed_seconds": round(elapsed, 3),
+            }
+        }
+
+    async def ndjson(self) -> AsyncIterator[bytes]:
+        async for line in self.results():
+            yield (json.dumps(line) + "\n").encode("utf-8")
+
+
+def _error_line(index: int, filename: str, status_code: int, detail) -> dict:
+    return {
+        "index": index,
+        "filename": filename,
+        "status": "error",
+        "status_code": status_code,
+        "error": detail,
+    }
@@ -0,0 +1,231 @@
+"""Per-step checkpoints for real Nova Act runs, and the rules for resuming them.
+
+A real run writes demo/checkpoints/{run_id}.json as it goes: every step's outcome
+(completed or failed, how it ran, seconds, the page URL afterwards) and, at the end,
+the run status and confirmation ID. A run that died (browser crash, exception, process
+restart) can then be resumed in a fresh session from its first unfinished step. The
+fresh browser starts on an empty form, so completed same-page steps before that point
+are restored first (by replay where recorded).
+
+Resuming must never file an expense twice. The last submit/confirm step of the plan is
+the one that files it; it is marked "started" before it runs. A run whose filing step
+completed is never resumed, and neither is one whose filing step started but never
+finished, or failed in a way that may have come after a click (it may have been filed).
+Only a failure that reports no browser actions at all leaves the expense unfiled. Runs
+re-delivered by the queue after a worker died go through the same check.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+from app.logging_config import get_logger
+from app.models import ExecutionPlan, ExecutionResult, PlanStep
+from app.services.storage import checkpoints_dir, read_json, write_json
+
+logger = get_logger(__name__)
+
+
+class RunCheckpoint:
+    """Progress of one run, saved after every change."""
+
+    def __init__(self, path: Path, data: dict[str, Any]):
+        self.path = path
+        self.data = data
+
+    @property
+    def run_id(self) -> str:
+        return self.data["run_id"]
+
+    @property
+    def status(self) -> str:
+        return self.data["status"]
+
+    @property
+    def attempts(self) -> int:
+        return self.data["attempts"]
+
+    def _save(self, strict: bool = False) -> None:
+        """Write the checkpoint; best effort unless strict (then write errors propagate)."""
+        self.data["updated_at"] = time.time()
+        try:
+            write_json(self.path, self.data)
+        except Exception as e:
+            logger.warning("run_checkpoint_save_failed", run_id=self.run_id, error=str(e))
+            if strict:
+                raise
+
+    def step(self, index: int) -> dict | None:
+        return self.data["steps"].get(str(index))
+
+    def step_started(self, step: PlanStep) -> None:
+        """
+        Write-ahead mark for a submit/confirm step, saved before the step runs. Raises if
+        it cannot be saved, so the step does not run without a record.
+        """
+        self.data["steps"][str(step.index)] = {"intent": step.intent, "status": "started", "at": time.time()}
+        try:
+            self._save(strict=True)
+        except Exception:
+            del self.data["steps"][str(step.index)]
+            raise
+
+    def step_finished(
+        self,
+        step: PlanStep,
+        ok: bool,
+        how: str,
+        seconds: float | None,
+        page_url: str | None,
+        in_doubt: bool = False,
+    ) -> None:
+        """Record a step's outcome; in_doubt marks a failure that may have come after a click."""
+        status = "completed" if ok else "failed_after_start" if in_doubt else "failed"
+        self.data["steps"][str(step.index)] = {
+            "intent": step.intent,
+            "status": status,
+            "how": how,
+            "seconds": round(seconds, 2) if seconds is not None else None,
+            "page_url": page_url,
+            "at": time.time(),
+        }
+        self._save()
+
+    def finish(self, status: str, confirmation_id: str | None = None, error: str | None = None) -> None:
+        self.data["status"] = status
+        self.data["confirmation_id"] = confirmation_id
+        self.data["error"] = error
+        self._save()
+
+    def mark_resumed(self, run_id: str) -> None:
+        """Record the run that resumes this one (its progress keeps going into this file)."""
+        self.data["resumed_by"] = run_id
+        self._save(strict=True)
+
+    def resume_index(self) -> int | None:
+        """Index of the first plan step that did not complete, or None if all did."""
+        for index in self.data["plan_steps"]:
+            entry = self.step(index)
+            if not entry or entry["status"] != "completed":
+                return index
+        return None
+
+    def filing_state(self) -> str:
+        """
+        not_started, in_doubt (started and never finished, or failed after it may have
+        clicked) or filed, for the filing step.
+        """
+        filing = self.data.get("filing_step")
+        entry = self.step(filing) if filing is not None else None
+        if not entry:
+            return "not_started"
+        states = {"completed": "filed", "started": "in_doubt", "failed_after_start": "in_doubt"}
+        return states.get(entry["status"], "not_started")
+
+    def summary(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "resume_from_step": self.resume_index(),
+            "filing": self.filing_state(),
+            "confirmation_id": self.data.get("confirmation_id"),
+            "steps": self.data["steps"],
+        }
+
+
+_resume_locks_guard = threading.Lock()
+_resume_locks: dict[str, threading.Lock] = {}
+
+
+@contextmanager
+def resume_lock(run_id: str) -> Iterator[None]:
+    """Serialize resume requests for one run, so only one of them can claim its checkpoint."""
+    with _resume_locks_guard:
+        lock = _resume_locks.setdefault(run_id, threading.Lock())
+    with lock:
+        yield
+
+
+def _path(run_id: str) -> Path:
+    return checkpoints_dir() / f"{run_id}.json"
+
+
+def load_checkpoint(run_id: str) -> RunCheckpoint | None:
+    path = _path(run_id)
+    if not path.exists():
+        return None
+    return RunCheckpoint(path, read_json(path))
+
+
+def open_checkpoint(
+    run_id: str, agent_id: str, plan: ExecutionPlan, parameters: dict[str, Any]
+) -> RunCheckpoint:
+    """The run's checkpoint: a new one, or the existing one with another attempt started."""
+    checkpoint = load_checkpoint(run_id)
+    if checkpoint is not None:
+        checkpoint.data["attempts"] += 1
+        checkpoint.data["status"] = "running"
+        checkpoint._save()
+        return checkpoint
+    commits = [step.index for step in plan.steps if step.commit]
+    checkpoint = RunCheckpoint(
+        _path(run_id),
+        {
+            "run_id": run_id,
+            "agent_id": agent_id,
+            "parameters": parameters,
+            "plan_steps": [step.index for step in plan.steps],
+            "filing_step": commits[-1] if commits else None,
+            "status": "running",
+            "attempts": 1,
+            "steps": {},
+            "confirmation_id": None,
+            "error": None,
+            "created_at": time.time(),
+        },
+    )
+    checkpoint._save()
+    return checkpoint
+
+
+def resume_refusal(checkpoint: RunCheckpoint) -> str | None:
+    """Why the run must not be run again (duplicate filing risk), or None if it may resume."""
+    filing = checkpoint.filing_state()
+    if filing == "filed":
+        confirmation = checkpoint.data.get("confirmation_id")
+        return f"the expense was already submitted (confirmation {confirmation or 'unknown'})"
+    if filing == "in_doubt":
+        return (
+            f"step {checkpoint.data['filing_step']} (submit/confirm) started but did not complete, "
+            "so the expense may already be filed; check the expense system and start a new run"
+        )
+    if checkpoint.resume_index() is None:
+        return "all steps completed"
+    return None
+
+
+def refused_result(checkpoint: RunCheckpoint, run_id: str, refusal: str) -> ExecutionResult:
+    """
+    The result of a run that is not run again: completed if its expense was filed (or all
+    its steps completed) on an earlier attempt, else failed with the refusal reason.
+    """
+    if checkpoint.filing_state() == "filed" or checkpoint.resume_index() is None:
+        confirmation_id = checkpoint.data.get("confirmation_id")
+        return ExecutionResult(
+            status="completed",
+            confirmation_id=confirmation_id,
+            run_id=run_id,
+            run_log=[
+                f"[nova-act] Run {checkpoint.run_id} already completed on an earlier attempt "
+                f"(confirmation {confirmation_id or 'unknown'}); not re-run"
+            ],
+        )
+    return ExecutionResult(
+        status="failed",
+        confirmation_id=None,
+        run_id=run_id,
+        run_log=[f"[nova-act] Not re-run: {refusal}"],
+    )
@@ -0,0 +1,151 @@
+"""Duplicate-expense index over processed receipts.
+
+Every processed receipt is indexed by its content hash (identical file) and by a
+fingerprint of the extracted fields (normalized merchant, date, amount, currency:
+the same expense photographed twice or received as both e-mail and PDF). Both are
+dict lookups, so duplicates are flagged at upload time in constant time. Completed
+agent runs are recorded against the session so a duplicate of an already submitted
+expense can be refused (BLOCK_DUPLICATE_RUNS).
+
+The index is an append-only JSONL log under demo/index/, replayed on first use.
+"""
+
+import json
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from app.logging_config import get_logger
+from app.services.storage import ensure_dir, index_dir
+
+logger = get_logger(__name__)
+
+_LOG_NAME = "receipts.jsonl"
+
+
+def fingerprint(extracted: dict) -> str | None:
+    """Normalized merchant|date|amount|currency, or None without merchant, date and amount."""
+    merchant = re.sub(r"[^0-9a-z]", "", str(extracted.get("merchant") or "").casefold())
+    date = str(extracted.get("date") or "").strip()[:10]
+    try:
+        amount = f"{Decimal(str(extracted.get('amount')).replace(',', '').strip()):.2f}"
+    except (InvalidOperation, ValueError):
+        amount = ""
+    if not (merchant and date and amount):
+        return None
+    currency = str(extracted.get("currency") or "").strip().upper()
+    return f"{merchant}|{date}|{amount}|{currency}"
+
+
+class DuplicateIndex:
+    """In-memory hash and fingerprint maps backed by an append-only log."""
+
+    def __init__(self, log_path: Path):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._by_hash: dict[str, list[str]] = {}
+        self._by_fingerprint: dict[str, list[str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.log_path.exists():
+            return
+        with self.log_path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line
+                self._apply(record)
+        logger.info("duplicate_index_loaded", receipts=len(self._entries))
+
+    def _apply(self, record: dict) -> None:
+        session_id = record["session_id"]
+        if record["op"] == "add":
+            entry = {
+                "sha256": record["sha256"],
+                "fingerprint": record.get("fingerprint"),
+                "extracted": record.get("extracted") or {},
+                "run_id": None,
+            }
+            self._entries[session_id] = entry
+            self._by_hash.setdefault(entry["sha256"], []).append(session_id)
+            if entry["fingerprint"]:
+                self._by_fingerprint.setdefault(entry["fingerprint"], []).append(session_id)
+        elif record["op"] == "run" and session_id in self._entries:
+            self._entries[session_id]["run_id"] = record["run_id"]
+
+    def _append(self, record: dict) -> None:
+        ensure_dir(self.log_path.parent)
+        with self.log_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self._apply(record)
+
+    def extracted_for_hash(self, sha256: str) -> dict | None:
+        """Fields already extracted from an identical file, if any."""
+        with self._lock:
+            for session_id in self._by_hash.get(sha256, []):
+                extracted = self._entries[session_id]["extracted"]
+                if extracted:
+                    return dict(extracted)
+        return None
+
+    def find(self, sha256: str, extracted: dict) -> tuple[list[str], str | None]:
+        """(earlier session ids, "image" | "fields" | None) for a receipt about to be stored."""
+        with self._lock:
+            same_image = list(self._by_hash.get(sha256, []))
+            if same_image:
+                return same_image, "image"
+            fp = fingerprint(extracted)
+            same_fields = list(self._by_fingerprint.get(fp, [])) if fp else []
+        return same_fields, "fields" if same_fields else None
+
+    def add(self, session_id: str, sha256: str, extracted: dict) -> None:
+        with self._lock:
+            self._append(
+                {
+                    "op": "add",
+                    "session_id": session_id,
+                    "sha256": sha256,
+                    "fingerprint": fingerprint(extracted),
+                    "extracted": extracted,
+                }
+            )
+
+    def record_run(self, session_id: str, run_id: str) -> None:
+        """Mark the receipt session as submitted by a completed agent run (no-op if unknown)."""
+        with self._lock:
+            if session_id in self._entries:
+                self._append({"op": "run", "session_id": session_id, "run_id": run_id})
+
+    def executed_duplicates(self, session_id: str) -> list[tuple[str, str]]:
+        """(session_id, run_id) of other sessions for the same expense that already ran."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return []
+            group = set(self._by_hash.get(entry["sha256"], []))
+            if entry["fingerprint"]:
+                group.update(self._by_fingerprint.get(entry["fingerprint"], []))
+            group.discard(session_id)
+            return sorted(
+                (other, self._entries[other]["run_id"])
+                for other in group
+                if self._entries[other]["run_id"]
+            )
+
+
+_index_lock = threading.Lock()
+_index: DuplicateIndex | None = None
+
+
+def get_duplicate_index() -> DuplicateIndex:
+    """Process-wide index for the current storage root (reloaded if the root changes)."""
+    global _index
+    log_path = index_dir() / _LOG_NAME
+    with _index_lock:
+        if _index is None or _index.log_path != log_path:
+            _index = DuplicateIndex(log_path)
+        return _index
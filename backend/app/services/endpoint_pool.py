@@ -0,0 +1,154 @@
+"""Region/model endpoint pool for Bedrock with live latency and error tracking.
+
+Each endpoint (region + model id) keeps an EWMA of successful-call latency, an EWMA
+error rate and its own circuit breaker. choose() returns the healthiest endpoint
+whose breaker admits calls; nova_client fails over to the next one when a call hits
+a throttle / timeout / 5xx. With a single configured endpoint this reduces to the
+previous behaviour (settings.aws_region + settings.nova_model_id_lite).
+"""
+
+import threading
+import time
+from typing import Callable
+
+from app.logging_config import get_logger
+from app.services.resilience import CircuitBreaker, CircuitOpenError
+
+logger = get_logger(__name__)
+
+# Weight of the newest sample in the latency / error EWMAs
+_EWMA_ALPHA = 0.2
+# Each unit of error rate multiplies the latency score by (1 + _ERROR_WEIGHT)
+_ERROR_WEIGHT = 4.0
+# Endpoints later in the configured order are slightly penalised so the primary
+# region wins ties and keeps traffic while it is healthy.
+_ORDER_PENALTY = 0.1
+
+
+class Endpoint:
+    """One Bedrock region/model pair with health statistics."""
+
+    def __init__(
+        self,
+        region: str,
+        model_id: str,
+        index: int,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.region = region
+        self.model_id = model_id
+        self.index = index
+        self.breaker = CircuitBreaker(
+            f"bedrock:{region}",
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout,
+            clock=clock,
+        )
+        self._lock = threading.Lock()
+        self.latency_ewma: float | None = None
+        self.error_ewma = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.region}/{self.model_id}"
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self.calls += 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += _EWMA_ALPHA * (latency - self.latency_ewma)
+            self.error_ewma *= 1 - _EWMA_ALPHA
+        self.breaker.record_success()
+
+    def record_failure(self, counts_for_breaker: bool = True) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += 1
+            self.error_ewma += _EWMA_ALPHA * (1 - self.error_ewma)
+        if counts_for_breaker:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def score(self, default_latency: float) -> float:
+        """Lower is better: latency scaled by error rate and configured order."""
+        with self._lock:
+            latency = self.latency_ewma if self.latency_ewma is not None else default_latency
+            error = self.error_ewma
+        return latency * (1 + _ERROR_WEIGHT * error) * (1 + _ORDER_PENALTY * self.index)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = {
+                "region": self.region,
+                "model_id": self.model_id,
+                "latency_ewma_seconds": (
+                    round(self.latency_ewma, 3) if self.latency_ewma is not None else None
+                ),
+                "error_rate_ewma": round(self.error_ewma, 3),
+                "calls": self.calls,
+                "errors": self.errors,
+            }
+        data["circuit"] = self.breaker.snapshot()
+        return data
+
+
+class EndpointPool:
+    """Healthiest-first routing across configured Bedrock endpoints."""
+
+    def __init__(self, endpoints: list[Endpoint]):
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = endpoints
+
+    def _default_latency(self) -> float:
+        """Latency assumed for endpoints without samples: the slowest known, else 1s."""
+        known = [e.latency_ewma for e in self.endpoints if e.latency_ewma is not None]
+        return max(known) if known else 1.0
+
+    def ranked(self, exclude: set[str] | None = None) -> list[Endpoint]:
+        """Endpoints not in exclude, best score first."""
+        exclude = exclude or set()
+        default = self._default_latency()
+        candidates = [e for e in self.endpoints if e.name not in exclude]
+        return sorted(candidates, key=lambda e: (e.score(default), e.index))
+
+    def acquire(self, exclude: set[str] | None = None) -> Endpoint:
+        """
+        Return the best endpoint whose circuit admits a call (claims a half-open probe).
+        Raises CircuitOpenError (shortest retry_after) when every candidate is open.
+        """
+        retry_after: float | None = None
+        last_name = "bedrock"
+        for endpoint in self.ranked(exclude):
+            try:
+                endpoint.breaker.before_call()
+            except CircuitOpenError as e:
+                retry_after = e.retry_after if retry_after is None else min(retry_after, e.retry_after)
+                last_name = e.name
+                continue
+            return endpoint
+        raise CircuitOpenError(last_name, retry_after or 0.0)
+
+    def snapshot(self) -> list[dict]:
+        return [e.snapshot() for e in self.endpoints]
+
+
+def build_pool(
+    endpoints: list[tuple[str, str]],
+    failure_threshold: int,
+    reset_timeout: float,
+) -> EndpointPool:
+    """Create a pool from (region, model_id) pairs in priority order."""
+    return EndpointPool(
+        [
+            Endpoint(region, model_id, i, failure_threshold, reset_timeout)
+            for i, (region, model_id) in enumerate(endpoints)
+        ]
+    )
@@ -0,0 +1,328 @@
+"""Deterministic extraction for machine-generated receipts (PDF text layer, HTML email, JSON).
+
+These receipts already carry their data as text, so amount, merchant, date, category
+and currency are read locally with regexes and key lookups instead of paying for a
+multimodal Nova call. Nova 2 Lite (text-only) is consulted only when required fields
+are still missing after local parsing, and only in real mode.
+"""
+
+import json
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+from io import BytesIO
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services import nova_client
+from app.services.receipt_parser import (
+    RECEIPT_PROMPT_PATH,
+    normalize_receipt_fields,
+    parse_receipt_model_output,
+)
+
+logger = get_logger(__name__)
+
+STRUCTURED_CONTENT_TYPES = {"application/pdf", "text/html", "application/json", "text/plain"}
+
+# Receipt text sent to the model for disambiguation is clipped to this many chars
+_MAX_MODEL_TEXT_CHARS = 8000
+_REQUIRED_FIELDS = ("amount", "merchant", "date")
+
+_CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+_CURRENCY_CODES = {"USD", "EUR", "GBP", "JPY", "INR", "CAD", "AUD", "CHF", "SGD", "NZD"}
+_CATEGORY_KEYWORDS = [
+    ("Travel", ("hotel", "inn", "resort", "airline", "airways", "flight", "folio", "lodging")),
+    ("Transport", ("uber", "lyft", "taxi", "cab", "train", "rail", "parking", "fuel", "transit")),
+    ("Meals", ("restaurant", "cafe", "coffee", "bistro", "grill", "pizza", "bar", "kitchen")),
+    ("Office", ("office", "staples", "stationery", "printer", "supplies", "software")),
+]
+# Total lines, strongest first; subtotal / tax lines are never the total
+_TOTAL_LABELS = (
+    r"grand\s+total",
+    r"total\s+(?:due|paid|charged|amount)",
+    r"amount\s+(?:due|paid|charged)",
+    r"balance\s+due",
+    r"total",
+)
+_AMOUNT_RE = (
+    r"([$€£¥₹]|[A-Z]{3})?\s*(-?\d{1,3}(?:,\d{3})+(?:\.\d{2})?|-?\d+(?:\.\d{2})?)\s*([A-Z]{3})?"
+)
+_DATE_PATTERNS = (
+    (re.compile(r"\b(\d{4}-\d{2}-\d{2})\b"), ("%Y-%m-%d",)),
+    (re.compile(r"\b(\d{1,2}/\d{1,2}/\d{4})\b"), ("%m/%d/%Y", "%d/%m/%Y")),
+    (
+        re.compile(r"\b([A-Z][a-z]{2,8}\.? \d{1,2},? \d{4})\b"),
+        ("%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y", "%b. %d, %Y"),
+    ),
+    (re.compile(r"\b(\d{1,2} [A-Z][a-z]{2,8} \d{4})\b"), ("%d %B %Y", "%d %b %Y")),
+)
+_MERCHANT_LABEL_RE = re.compile(
+    r"^\s*(?:merchant|vendor|seller|store|sold by|from|billed by)\s*[:\-]\s*(.+)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_JSON_KEYS = {
+    "amount": ("total", "amount", "grand_total", "total_amount", "amount_total", "total_paid"),
+    "merchant": ("merchant", "merchant_name", "vendor", "vendor_name", "store", "seller", "payee"),
+    "date": ("date", "transaction_date", "purchase_date", "receipt_date", "issued_at", "created_at"),
+    "category": ("category", "expense_category"),
+    "currency": ("currency", "currency_code"),
+}
+
+
+class _TextExtractor(HTMLParser):
+    """Collect visible text from HTML, one line per block element."""
+
+    _BLOCK_TAGS = {"p", "div", "tr", "br", "li", "h1", "h2", "h3", "h4", "table", "td", "th"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts: list[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag in self._BLOCK_TAGS:
+            self.parts.append("\n" if tag != "td" and tag != "th" else " ")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def is_structured(media_type: str) -> bool:
+    """True if the upload is a text-bearing receipt format handled by this module."""
+    return (media_type or "").split(";")[0].strip().lower() in STRUCTURED_CONTENT_TYPES
+
+
+def pdf_text(body: bytes) -> str:
+    """Text layer of a PDF (all pages), or "" when the PDF has none."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf_not_installed")
+        raise HTTPException(status_code=400, detail="PDF receipts are not supported on this server.")
+    try:
+        reader = PdfReader(BytesIO(body))
+        return "\n".join((page.extract_text() or "") for page in reader.pages)
+    except Exception as e:
+        logger.warning("pdf_text_extraction_failed", error=str(e))
+        raise HTTPException(status_code=400, detail="Could not read PDF.") from e
+
+
+def html_text(body: bytes) -> str:
+    """Visible text of an HTML document (e-mail receipt)."""
+    parser = _TextExtractor()
+    parser.feed(body.decode("utf-8", errors="replace"))
+    text = "".join(parser.parts)
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def _normalize_amount(raw: str) -> str | None:
+    cleaned = re.sub(r"[,\s]", "", raw)
+    try:
+        return f"{float(cleaned):.2f}"
+    except ValueError:
+        return None
+
+
+def _normalize_date(raw: str) -> str | None:
+    raw = raw.strip()
+    if re.match(r"^\d{4}-\d{2}-\d{2}", raw):
+        return raw[:10]
+    for _, formats in _DATE_PATTERNS:
+        for fmt in formats:
+            try:
+                return datetime.strptime(raw, fmt).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def _find_total(text: str) -> tuple[str | None, str | None]:
+    """(amount, currency) from the strongest total line; the last such line wins."""
+    for label in _TOTAL_LABELS:
+        pattern = re.compile(rf"(?i:\b{label}\b)[^\d]{{0,25}}?{_AMOUNT_RE}")
+        matches = [
+            m for m in pattern.finditer(text)
+            if not re.search(r"sub[\s-]*$", text[: m.start()].lower())
+        ]
+        for m in reversed(matches):
+            amount = _normalize_amount(m.group(2))
+            if amount is None:
+                continue
+            prefix, suffix = m.group(1), m.group(3)
+            currency = _CURRENCY_SYMBOLS.get(prefix or "") or next(
+                (c for c in (prefix, suffix) if c in _CURRENCY_CODES), None
+            )
+            return amount, currency
+    return None, None
+
+
+def _find_currency(text: str) -> str | None:
+    codes = re.findall(r"\b([A-Z]{3})\b", text)
+    for code in codes:
+        if code in _CURRENCY_CODES:
+            return code
+    for symbol, code in _CURRENCY_SYMBOLS.items():
+        if symbol in text:
+            return code
+    return None
+
+
+def _find_date(text: str) -> str | None:
+    for pattern, _ in _DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            value = _normalize_date(match.group(1))
+            if value:
+                return value
+    return None
+
+
+def _find_merchant(text: str) -> str | None:
+    match = _MERCHANT_LABEL_RE.search(text)
+    if match:
+        return match.group(1).strip()[:100]
+    for line in text.splitlines():
+        line = line.strip()
+        # First line with letters that is not a receipt heading or a date/amount
+        if not re.search(r"[A-Za-z]{2}", line):
+            continue
+        if re.match(r"^(receipt|invoice|order|tax invoice|thank you|date|total)\b", line, re.I):
+            continue
+        return line[:100]
+    return None
+
+
+def _guess_category(text: str, merchant: str | None) -> str | None:
+    haystack = f"{merchant or ''}\n{text}".lower()
+    for category, keywords in _CATEGORY_KEYWORDS:
+        if any(re.search(rf"\b{k}\b", haystack) for k in keywords):
+            return category
+    return None
+
+
+def _confidence(fields: dict) -> float:
+    """Deterministic confidence: required fields dominate, optional ones add a little."""
+    required = sum(1 for k in _REQUIRED_FIELDS if fields.get(k))
+    optional = sum(1 for k in ("category", "currency") if fields.get(k))
+    return round(0.3 * required + 0.05 * optional, 2)
+
+
+def parse_receipt_text(text: str) -> dict:
+    """Extract receipt fields from plain text (PDF text layer, e-mail body)."""
+    amount, currency = _find_total(text)
+    merchant = _find_merchant(text)
+    fields = {
+        "amount": amount,
+        "merchant": merchant,
+        "date": _find_date(text),
+        "category": _guess_category(text, merchant),
+        "currency": currency or _find_currency(text),
+    }
+    fields["confidence"] = _confidence(fields)
+    return fields
+
+
+def _lookup(obj: dict, keys: tuple[str, ...]):
+    """First non-empty value for any key, searching one level of nested objects too."""
+    lowered = {str(k).lower(): v for k, v in obj.items()}
+    for key in keys:
+        value = lowered.get(key)
+        if isinstance(value, dict):
+            value = value.get("name") or value.get("value") or value.get("amount")
+        if value not in (None, ""):
+            return value
+    for value in obj.values():
+        if isinstance(value, dict):
+            found = _lookup(value, keys)
+            if found not in (None, ""):
+                return found
+    return None
+
+
+def parse_receipt_json(obj: dict) -> dict:
+    """Map a vendor JSON receipt onto receipt fields by common key names."""
+    amount = _lookup(obj, _JSON_KEYS["amount"])
+    date = _lookup(obj, _JSON_KEYS["date"])
+    merchant = _lookup(obj, _JSON_KEYS["merchant"])
+    currency = _lookup(obj, _JSON_KEYS["currency"])
+    fields = {
+        "amount": _normalize_amount(str(amount)) if amount is not None else None,
+        "merchant": str(merchant).strip()[:100] if merchant is not None else None,
+        "date": _normalize_date(str(date)) if date is not None else None,
+        "category": _lookup(obj, _JSON_KEYS["category"]),
+        "currency": str(currency).upper() if currency else None,
+    }
+    if fields["category"] is None:
+        fields["category"] = _guess_category(json.dumps(obj), fields["merchant"])
+    fields["confidence"] = _confidence(fields)
+    return fields
+
+
+def _disambiguate_with_model(text: str, fields: dict, prompt: str) -> dict:
+    """Ask Nova 2 Lite (text only) to fill missing fields; local values take precedence."""
+    known = {k: v for k, v in fields.items() if v and k != "confidence"}
+    request = (
+        "The receipt is provided as text instead of an image. "
+        f"Fields already extracted (keep them): {json.dumps(known)}\n"
+        f"Receipt text:\n{text[:_MAX_MODEL_TEXT_CHARS]}"
+    )
+    try:
+        raw = nova_client.call_nova_2_lite(request, cacheable_prefix=prompt)
+        model_fields = normalize_receipt_fields(parse_receipt_model_output(raw))
+    except Exception as e:
+        logger.warning("ereceipt_disambiguation_failed", error=str(e))
+        return fields
+    merged = {k: fields.get(k) or model_fields.get(k) for k in _JSON_KEYS}
+    merged["confidence"] = max(_confidence(merged), min(model_fields["confidence"], 0.9))
+    return merged
+
+
+def parse_structured_receipt(body: bytes, media_type: str) -> dict:
+    """
+    Extract receipt fields from a PDF (text layer), HTML, JSON or plain-text receipt.
+
+    Returns the same keys as receipt_parser.parse_receipt. Parsing is local and
+    deterministic; only when a required field (amount, merchant, date) is still
+    missing and NOVA_MODE=real is Nova 2 Lite asked to fill the gaps from the text.
+    PDFs without a text layer (scans) go to pdf_receipt.parse_pdf_receipt instead.
+    Raises HTTPException(400) for unreadable input.
+    """
+    kind = (media_type or "").split(";")[0].strip().lower()
+    if kind == "application/json":
+        try:
+            obj = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HTTPException(status_code=400, detail="Invalid JSON receipt.") from e
+        if not isinstance(obj, dict):
+            raise HTTPException(status_code=400, detail="JSON receipt must be an object.")
+        fields = parse_receipt_json(obj)
+        text = json.dumps(obj)
+    else:
+        if kind == "application/pdf":
+            text = pdf_text(body)
+            if not text.strip():
+                # Scanned PDF: rasterize pages and extract them with the multimodal model
+                from app.services.pdf_receipt import parse_pdf_receipt
+
+                return parse_pdf_receipt(body)
+        elif kind == "text/html":
+            text = html_text(body)
+        else:
+            text = body.decode("utf-8", errors="replace")
+        fields = parse_receipt_text(text)
+
+    missing = [k for k in _REQUIRED_FIELDS if not fields.get(k)]
+    logger.info("ereceipt_parsed", media_type=kind, missing=missing, confidence=fields["confidence"])
+    if missing and settings.nova_mode == "real" and RECEIPT_PROMPT_PATH.exists():
+        prompt = RECEIPT_PROMPT_PATH.read_text(encoding="utf-8").strip()
+        fields = _disambiguate_with_model(text, fields, prompt)
+    return fields
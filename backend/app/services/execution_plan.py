@@ -0,0 +1,184 @@
+"""Execution plans: agent steps compiled once at agent creation, bound per run.
+
+Every run used to re-sort the spec's steps, filter the skipped intents and rebuild each
+instruction (page-specific wording for the expense form plus parameter values). The
+compiler does that work once: a plan is the ordered, skip-filtered steps with their
+instruction templates, where each template part is either literal text or a slot for a
+parameter. Running an agent only binds parameter values into the plan.
+
+Consecutive steps on the same page can be fused into one act() call (fuse_steps): one
+model planning loop instead of one per step. Submit/confirm steps change the page (a
+modal, then the success banner) and are retried on their own, so they are never fused.
+
+Plans are persisted with the agent spec. A spec saved before plans existed, or by an
+older compiler (PLAN_VERSION), is compiled on first use.
+"""
+
+from typing import Any
+
+from app.logging_config import get_logger
+from app.models import ActAgentSpec, ExecutionPlan, PlanPart, PlanStep
+
+logger = get_logger(__name__)
+
+# Bump when compile_plan output changes so persisted plans are recompiled
+PLAN_VERSION = 1
+
+# Intents that are skipped because the browser already starts on the target page
+SKIP_INTENTS = frozenset({"navigate", "open_form"})
+
+# Submit/confirm intents: they file the expense and are retried with adapted wording
+COMMIT_INTENTS = frozenset({"submit_form", "confirm_action", "confirmation"})
+
+# Expense form fields set by fill_field steps: parameter -> (label, field type)
+FIELD_MAP = {
+    "amount": ("Amount ($)", "number input"),
+    "date": ("Date", "date input"),
+    "category": ("Category", "select dropdown"),
+    "description": ("Description", "textarea"),
+    "merchant": ("Merchant", "text input"),
+}
+
+_FIXED_INSTRUCTIONS = {
+    "submit_form": (
+        'Click the "Submit Expense" button at the bottom of the form. '
+        "A confirmation modal will appear."
+    ),
+    "confirmation": (
+        "A confirmation modal is showing the expense summary. "
+        'Click the "Confirm" button to finalize the submission.'
+    ),
+}
+
+
+def _ordered(steps: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Steps that have an order, sorted by it."""
+    return sorted(
+        (s for s in steps if isinstance(s, dict) and "order" in s),
+        key=lambda s: s.get("order", 0),
+    )
+
+
+def _interpolated_parts(instruction: str, uses_parameters: list[str]) -> list[PlanPart]:
+    """The instruction followed by a "name: value" slot per used parameter."""
+    if not uses_parameters:
+        return [PlanPart(text=instruction)]
+    return [PlanPart(text=instruction.strip())] + [
+        PlanPart(text=f"{name}: {{value}}", param=name) for name in uses_parameters
+    ]
+
+
+def _compile_step(index: int, step: dict[str, Any]) -> PlanStep:
+    """
+    Instruction template for one step. Generic workflow wording is replaced with
+    page-specific instructions for the expense form where the intent is known.
+    """
+    intent = step.get("intent", "step")
+    instruction = step.get("instruction", "")
+    interpolated = _interpolated_parts(instruction, step.get("uses_parameters") or [])
+    requires = None
+    fallback: list[PlanPart] = []
+    if intent == "fill_field":
+        parts = [PlanPart(text="On this expense form page, fill in the following fields:")] + [
+            PlanPart(text=f'Set the "{label}" {field_type} to "{{value}}".', param=name)
+            for name, (label, field_type) in FIELD_MAP.items()
+        ]
+    elif intent == "upload_receipt":
+        parts = [
+            PlanPart(
+                text=(
+                    'Click the receipt upload area and upload the file "{value}". '
+                    "If the file picker appears, select the file."
+                ),
+                param="receipt_file",
+            )
+        ]
+        requires, fallback = "receipt_file", interpolated
+    elif intent in _FIXED_INSTRUCTIONS:
+        parts = [PlanPart(text=_FIXED_INSTRUCTIONS[intent])]
+    else:
+        parts = interpolated
+    return PlanStep(
+        index=index,
+        order=step.get("order", 0),
+        intent=intent,
+        instruction=instruction,
+        parts=parts,
+        requires=requires,
+        fallback_parts=fallback,
+        commit=intent in COMMIT_INTENTS,
+        selector_hint=step.get("selector_hint"),
+    )
+
+
+def compile_plan(steps: list[dict[str, Any]]) -> ExecutionPlan:
+    """Compile an agent's workflow steps into an execution plan."""
+    plan = ExecutionPlan(version=PLAN_VERSION)
+    for index, step in enumerate(_ordered(steps), start=1):
+        intent = step.get("intent", "step")
+        if intent in SKIP_INTENTS:
+            plan.skipped.append({"index": index, "intent": intent})
+        else:
+            plan.steps.append(_compile_step(index, step))
+    return plan
+
+
+def plan_for(agent_spec: ActAgentSpec) -> ExecutionPlan:
+    """The spec's persisted plan, or a freshly compiled one if missing or outdated."""
+    plan = agent_spec.plan
+    if plan is None or plan.version != PLAN_VERSION:
+        logger.info(
+            "execution_plan_compiled",
+            agent_id=agent_spec.agent_id,
+            previous_version=plan.version if plan else None,
+        )
+        plan = compile_plan(agent_spec.steps)
+    return plan
+
+
+def has_value(value: Any) -> bool:
+    """A parameter value counts as set unless it is None or an empty string."""
+    return value is not None and value != ""
+
+
+def _render(parts: list[PlanPart], parameters: dict[str, Any]) -> str:
+    out = []
+    for part in parts:
+        if part.param is None:
+            out.append(part.text)
+        elif has_value(value := parameters.get(part.param)):
+            out.append(part.text.replace("{value}", str(value)))
+    return " ".join(out)
+
+
+def bind_instruction(step: PlanStep, parameters: dict[str, Any]) -> str:
+    """The step's act() instruction for this run's parameter values."""
+    if step.requires and not parameters.get(step.requires):
+        return _render(step.fallback_parts, parameters)
+    return _render(step.parts, parameters)
+
+
+def fuse_steps(steps: list[PlanStep], max_steps: int) -> list[list[PlanStep]]:
+    """
+    Group consecutive plan steps into act() calls of up to max_steps steps (1 disables
+    fusion). A commit step always forms its own group and ends the current one.
+    """
+    groups: list[list[PlanStep]] = []
+    for step in steps:
+        current = groups[-1] if groups else None
+        if (
+            current is not None
+            and not step.commit
+            and not current[-1].commit
+            and len(current) < max(1, max_steps)
+        ):
+            current.append(step)
+        else:
+            groups.append([step])
+    return groups
+
+
+def fused_instruction(instructions: list[str]) -> str:
+    """One act() instruction performing several bound step instructions in order."""
+    numbered = [f"{n}) {text.strip()}" for n, text in enumerate((t for t in instructions if t.strip()), start=1)]
+    return "On this page, do the following in order, then stop: " + " ".join(numbered)
@@ -0,0 +1,208 @@
+"""Opt-in hedged requests for Nova calls (tail-latency reduction).
+
+A call runs normally; if it has not returned within the configured percentile of
+recent latencies for that operation, a second request is fired (nova_client sends it
+to the next endpoint in the pool) and the first successful response wins. The loser
+is cancelled if it has not started, and otherwise abandoned (boto cannot abort an
+in-flight HTTP request; its result is discarded). Every request that succeeds, loser
+included, adds its own latency to the percentile, so slow requests keep the hedge
+delay honest. Hedges are capped at a fraction of calls so cost stays bounded.
+
+Abandoned losers hold a worker until their read timeout, so the request pool doubles
+whenever all its workers are busy instead of queueing new calls behind them, up to
+NOVA_HEDGE_MAX_WORKERS. A full pool fires no hedges (counted as budget denied) and runs
+new calls on the caller's thread, so a brownout cannot pile up threads or Bedrock calls.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, TypeVar
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class _ElasticExecutor:
+    """Thread pool that doubles in size whenever every worker is busy, up to max_workers."""
+
+    def __init__(self, workers: int, max_workers: int):
+        self._lock = threading.Lock()
+        self.max_workers = max(1, max_workers)
+        self.workers = min(max(1, workers), self.max_workers)
+        self._in_flight = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nova-hedge")
+
+    def submit(self, fn: Callable[[], T]) -> Future | None:
+        """Run fn on the pool; None if all max_workers are busy."""
+        with self._lock:
+            if self._in_flight >= self.workers:
+                if self.workers >= self.max_workers:
+                    return None
+                # Running calls finish on the old pool; its threads exit once idle
+                self._pool.shutdown(wait=False)
+                self.workers = min(2 * self.workers, self.max_workers)
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nova-hedge")
+                logger.info("nova_hedge_pool_grown", workers=self.workers, in_flight=self._in_flight)
+            self._in_flight += 1
+            future = self._pool.submit(fn)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, _future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+
+_executor = _ElasticExecutor(workers=16, max_workers=settings.nova_hedge_max_workers)
+
+
+class HedgePolicy:
+    """Latency tracker and hedge budget for one operation (e.g. receipt_extraction)."""
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float,
+        min_delay: float,
+        budget_ratio: float,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._budget_denied = 0
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _take_budget(self) -> bool:
+        """Reserve one hedge if hedges stay within budget_ratio of calls."""
+        with self._lock:
+            if self._hedged + 1 > self.budget_ratio * self._calls:
+                self._budget_denied += 1
+                return False
+            self._hedged += 1
+            return True
+
+    def _pool_full(self) -> None:
+        """Give back a reserved hedge that the full request pool cannot run."""
+        with self._lock:
+            self._hedged -= 1
+            self._budget_denied += 1
+        logger.info("nova_hedge_pool_full", operation=self.name, workers=_executor.workers)
+
+    def _submit(self, fn: Callable[[], T]) -> Future | None:
+        """
+        Run fn on the request pool, recording its latency if it succeeds (win or lose).
+        None if the pool is at NOVA_HEDGE_MAX_WORKERS and busy.
+        """
+        start = time.monotonic()
+
+        def finished(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                self.record_latency(time.monotonic() - start)
+
+        future = _executor.submit(fn)
+        if future is not None:
+            future.add_done_callback(finished)
+        return future
+
+    def run(
+        self,
+        fn: Callable[[], T],
+        timeout: float | None = None,
+        hedge_fn: Callable[[], T] | None = None,
+    ) -> T:
+        """
+        Call fn, hedging with hedge_fn() (default: fn again) if fn is slower than
+        hedge_delay(). timeout bounds the total wait (the operation deadline); fn is
+        expected to enforce its own I/O timeout, so this is only a safety net.
+        """
+        with self._lock:
+            self._calls += 1
+        start = time.monotonic()
+        primary = self._submit(fn)
+        if primary is None:
+            # Pool full: run unhedged on the caller's thread rather than queue
+            result = fn()
+            self.record_latency(time.monotonic() - start)
+            return result
+        delay = self.hedge_delay()
+        if delay is not None and (timeout is None or delay < timeout):
+            done, _ = wait([primary], timeout=delay)
+            if not done and self._take_budget():
+                hedge = self._submit(hedge_fn or fn)
+                if hedge is None:
+                    self._pool_full()
+                else:
+                    logger.info("nova_hedge_fired", operation=self.name, delay_sec=round(delay, 2))
+                    return self._first_success(primary, hedge, start, timeout)
+        return primary.result(timeout=timeout)
+
+    def _first_success(
+        self, primary: Future, hedge: Future, start: float, timeout: float | None
+    ) -> T:
+        pending = {primary, hedge}
+        first_error: BaseException | None = None
+        while pending:
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                if error is not None:
+                    first_error = first_error or error
+                    continue
+                for other in pending:
+                    other.cancel()
+                if future is hedge:
+                    with self._lock:
+                        self._hedge_wins += 1
+                logger.info("nova_hedge_resolved", operation=self.name, hedge_won=future is hedge)
+                return future.result()
+        if first_error is not None:
+            raise first_error
+        raise TimeoutError(f"{self.name} hedged call timed out")
+
+    def stats(self) -> dict:
+        """Hedge rate (hedges / calls) and win rate (hedge wins / hedges)."""
+        with self._lock:
+            calls, hedged, wins = self._calls, self._hedged, self._hedge_wins
+            samples = len(self._latencies)
+            denied = self._budget_denied
+        delay = self.hedge_delay()
+        return {
+            "calls": calls,
+            "hedged": hedged,
+            "hedge_wins": wins,
+            "budget_denied": denied,
+            "hedge_rate": round(hedged / calls, 4) if calls else 0.0,
+            "win_rate": round(wins / hedged, 4) if hedged else 0.0,
+            "latency_samples": samples,
+            "hedge_delay_seconds": round(delay, 3) if delay is not None else None,
+        }
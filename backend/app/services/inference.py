@@ -8,11 +8,14 @@ from fastapi import HTTPException
 from app.config import settings
 from app.logging_config import get_logger
 from app.models import (
+    BatchInferenceResult,
     CaptureSession,
     InferredWorkflow,
     WorkflowParameter,
     WorkflowStep,
 )
+from app.services.resilience import CircuitOpenError
+from app.services.session_encoding import PROMPT_LEGEND, encode_session, estimate_tokens
 
 logger = get_logger(__name__)
 
@@ -20,6 +23,13 @@ logger = get_logger(__name__)
 _BACKEND_ROOT = Path(__file__).resolve().parent.parent.parent
 _INFERENCE_PROMPT_PATH = _BACKEND_ROOT / "prompts" / "inference_prompt.txt"
 _MAX_SAFE_PREVIEW_CHARS = 300
+BATCH_PROMPT_HEADER = (
+    "You are given several capture sessions. Infer one workflow per session, following the "
+    "schema above for each. Return ONLY a raw JSON object of the form "
+    '{"workflows": [<workflow>, ...]} with exactly one workflow per input session, '
+    "each with session_id copied from its input session."
+)
+_SERVICE_UNAVAILABLE_DETAIL = "Inference service unavailable."
 STRICT_PROMPT_SUFFIX = (
     "Return ONLY raw JSON, no markdown, no code fences, no commentary. "
     "First char { last char }."
@@ -186,20 +196,29 @@ def _parse_workflow_json(raw_text: str) -> dict:
     )
 
 
-def _try_infer_once(prompt: str, session: CaptureSession) -> InferredWorkflow:
+def _try_infer_once(
+    prompt: str, session: CaptureSession, instruction: str | None = None
+) -> InferredWorkflow:
     """
     One attempt: call Nova, parse JSON, validate to InferredWorkflow.
+    instruction is the static prompt prefix (sent as a cacheable block ahead of prompt).
     Raises HTTPException(502) on any failure (service, parse, or validation).
     """
     from app.services import nova_client
 
     try:
-        raw = nova_client.call_nova_2_lite(prompt)
+        raw = nova_client.call_nova_2_lite(prompt, cacheable_prefix=instruction)
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Inference service temporarily unavailable; try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        ) from e
     except Exception as e:
         logger.warning("nova_inference_failed", error=str(e))
         raise HTTPException(
             status_code=502,
-            detail="Inference service unavailable.",
+            detail=_SERVICE_UNAVAILABLE_DETAIL,
         ) from e
 
     try:
@@ -223,21 +242,35 @@ def _try_infer_once(prompt: str, session: CaptureSession) -> InferredWorkflow:
         ) from e
 
 
-def _infer_workflow_real(session: CaptureSession) -> InferredWorkflow:
-    """Call Nova 2 Lite to infer workflow; on parse/validation failure retry once with stricter prompt."""
+def _load_instruction() -> str:
+    """Read the static inference instruction; HTTPException(502) if the prompt file is missing."""
     if not _INFERENCE_PROMPT_PATH.exists():
         raise HTTPException(
             status_code=502,
             detail="Inference prompt file not found.",
         )
-    instruction = _INFERENCE_PROMPT_PATH.read_text(encoding="utf-8").strip()
-    session_json = session.model_dump_json(exclude_none=False)
-    prompt = f"{instruction}\n\nInput capture session (JSON):\n{session_json}"
+    return _INFERENCE_PROMPT_PATH.read_text(encoding="utf-8").strip()
+
+
+def _infer_workflow_real(session: CaptureSession) -> InferredWorkflow:
+    """Call Nova 2 Lite to infer workflow; on parse/validation failure retry once with stricter prompt."""
+    instruction = _load_instruction()
+    session_json = encode_session(session, settings.inference_session_token_budget)
+    logger.info(
+        "inference_prompt_encoded",
+        session_id=session.session_id,
+        steps=len(session.steps),
+        session_tokens_est=estimate_tokens(session_json),
+    )
+    # Instruction is static across calls; it goes first so Bedrock can cache it.
+    prompt = f"Input capture session (compact JSON). {PROMPT_LEGEND}\n{session_json}"
 
     try:
-        return _try_infer_once(prompt, session)
+        return _try_infer_once(prompt, session, instruction)
     except HTTPException as e:
-        if e.status_code != 502:
+        # Only bad model output is worth a stricter prompt; service errors were
+        # already retried with backoff in nova_client.
+        if e.status_code != 502 or e.detail == _SERVICE_UNAVAILABLE_DETAIL:
             raise
         logger.info(
             "inference_retry_with_strict_prompt",
@@ -245,7 +278,7 @@ def _infer_workflow_real(session: CaptureSession) -> InferredWorkflow:
         )
         retry_prompt = f"{prompt}\n\n{STRICT_PROMPT_SUFFIX}"
         try:
-            return _try_infer_once(retry_prompt, session)
+            return _try_infer_once(retry_prompt, session, instruction)
         except HTTPException:
             raise
 
@@ -265,3 +298,121 @@ def infer_workflow(session: CaptureSession) -> InferredWorkflow:
         return _infer_workflow_real(session)
     logger.info("inference_mode_mock", session_id=session.session_id)
     return _infer_workflow_mock(session)
+
+
+def _pack_batches(sessions: list[CaptureSession]) -> list[list[tuple[CaptureSession, str]]]:
+    """
+    Group sessions (with their compact encodings) into batches of at most
+    INFERENCE_BATCH_SIZE sessions and INFERENCE_BATCH_TOKEN_BUDGET estimated tokens.
+    A session larger than the token budget gets a batch of its own.
+    """
+    batches: list[list[tuple[CaptureSession, str]]] = []
+    current: list[tuple[CaptureSession, str]] = []
+    current_tokens = 0
+    max_size = max(1, settings.inference_batch_size)
+    for session in sessions:
+        encoded = encode_session(session, settings.inference_session_token_budget)
+        tokens = estimate_tokens(encoded)
+        if current and (
+            len(current) >= max_size
+            or current_tokens + tokens > settings.inference_batch_token_budget
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append((session, encoded))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _infer_batch_once(
+    batch: list[tuple[CaptureSession, str]], instruction: str
+) -> dict[str, InferredWorkflow]:
+    """
+    One multi-session call: returns the workflows that came back valid, keyed by session_id.
+    Sessions missing from the output or failing validation are simply absent.
+    Raises HTTPException(502) if the call itself fails or the output is not parseable.
+    """
+    from app.services import nova_client
+
+    blocks = [
+        f"Session {i} (compact JSON):\n{encoded}" for i, (_, encoded) in enumerate(batch, start=1)
+    ]
+    prompt = f"{BATCH_PROMPT_HEADER} {PROMPT_LEGEND}\n\n" + "\n\n".join(blocks)
+    try:
+        raw = nova_client.call_nova_2_lite(prompt, cacheable_prefix=instruction)
+    except Exception as e:
+        logger.warning("nova_batch_inference_failed", error=str(e), sessions=len(batch))
+        raise HTTPException(status_code=502, detail=_SERVICE_UNAVAILABLE_DETAIL) from e
+
+    parsed = _parse_workflow_json(raw)
+    items = parsed.get("workflows") if isinstance(parsed, dict) else None
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=502,
+            detail="Batch inference output did not contain a workflows array.",
+        )
+    wanted = {session.session_id for session, _ in batch}
+    workflows: dict[str, InferredWorkflow] = {}
+    for item in items:
+        if not isinstance(item, dict) or item.get("session_id") not in wanted:
+            continue
+        try:
+            workflow = InferredWorkflow.model_validate(item)
+        except Exception as e:
+            logger.warning(
+                "batch_workflow_validation_failed",
+                session_id=item.get("session_id"),
+                error=str(e),
+            )
+            continue
+        workflows.setdefault(workflow.session_id, workflow)
+    return workflows
+
+
+def infer_workflows_batch(sessions: list[CaptureSession]) -> BatchInferenceResult:
+    """
+    Infer workflows for many sessions, packing several sessions into each Nova call.
+
+    Intended for bulk backfills. In real mode, sessions are grouped by
+    _pack_batches and sent as one prompt per group; the response is split back
+    into per-session InferredWorkflow objects and validated individually. Any
+    session missing or invalid in the batch output (or in a batch whose call
+    failed) is retried on its own via the single-session path. Failures never
+    abort the whole run; they are reported in errors.
+    Mock mode returns the deterministic workflow for each session.
+    """
+    result = BatchInferenceResult()
+    mode = (settings.nova_mode or "mock").strip().lower()
+    if mode != "real":
+        for session in sessions:
+            result.workflows[session.session_id] = _infer_workflow_mock(session)
+        return result
+
+    instruction = _load_instruction()
+    for batch in _pack_batches(sessions):
+        try:
+            workflows = _infer_batch_once(batch, instruction)
+        except HTTPException as e:
+            logger.warning("batch_inference_call_failed", sessions=len(batch), detail=e.detail)
+            workflows = {}
+        logger.info("batch_inference_split", sessions=len(batch), valid=len(workflows))
+        for session, _ in batch:
+            workflow = workflows.get(session.session_id)
+            if workflow is None:
+                result.retried.append(session.session_id)
+                try:
+                    workflow = _infer_workflow_real(session)
+                except HTTPException as e:
+                    result.errors[session.session_id] = str(e.detail)
+                    continue
+            result.workflows[session.session_id] = workflow
+    logger.info(
+        "batch_inference_complete",
+        sessions=len(sessions),
+        succeeded=len(result.workflows),
+        retried=len(result.retried),
+        failed=len(result.errors),
+    )
+    return result
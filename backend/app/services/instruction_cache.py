@@ -0,0 +1,147 @@
+"""Learned instructions for submit/confirm steps (self-healing after a UI change).
+
+When a submit or confirm step fails, the real client retries it with adapted wording
+("the button may have been renamed ..."). When that retry succeeds, the adaptation is
+remembered for the agent, intent and starting page, and later runs use the adapted
+instruction first instead of paying for the failed attempt again. A learned
+instruction that fails NOVA_ACT_LEARNED_MAX_FAILURES times in a row is demoted
+(forgotten) and the step goes back to the workflow's own wording.
+
+Only the adaptation is stored, not the bound instruction, so parameter values never
+end up in the cache. Entries live in demo/learned/instructions.json.
+"""
+
+import threading
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services.storage import learned_dir, read_json, write_json
+
+logger = get_logger(__name__)
+
+
+def learned_instruction(instruction: str, adaptation: str) -> str:
+    """The step instruction with a learned adaptation applied."""
+    return f"{instruction}. {adaptation}"
+
+
+class InstructionCache:
+    """Adaptations keyed by (agent, intent, starting page), persisted as JSON, with metrics."""
+
+    def __init__(self, path: Path, max_failures: int):
+        self.path = path
+        self.max_failures = max(1, max_failures)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        if path.exists():
+            try:
+                self._entries = read_json(path)
+            except Exception as e:
+                logger.warning("learned_instructions_unreadable", path=str(path), error=str(e))
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "learned": 0,
+            "demoted": 0,
+            "seconds_saved": 0.0,
+        }
+
+    @staticmethod
+    def key(agent_id: str, intent: str, starting_page: str) -> str:
+        return f"{agent_id}|{intent}|{starting_page}"
+
+    def _save(self) -> None:
+        """Write entries (lock held); best effort."""
+        try:
+            write_json(self.path, self._entries)
+        except Exception as e:
+            logger.warning("learned_instructions_save_failed", error=str(e))
+
+    def get(self, key: str) -> str | None:
+        """The learned adaptation for key, if any (counts a lookup)."""
+        with self._lock:
+            self._stats["lookups"] += 1
+            entry = self._entries.get(key)
+            return entry["adaptation"] if entry else None
+
+    def learn(self, key: str, adaptation: str, failed_seconds: float) -> None:
+        """Remember an adaptation that succeeded after the original instruction failed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["adaptation"] == adaptation:
+                return  # already learned; only hits clear its failure count
+            self._entries[key] = {
+                "adaptation": adaptation,
+                "hits": 0,
+                "failures": 0,
+                "failed_seconds": round(failed_seconds, 2),
+                "learned_at": time.time(),
+            }
+            self._stats["learned"] += 1
+            self._save()
+        logger.info("learned_instruction_stored", key=key)
+
+    def hit(self, key: str) -> float:
+        """The learned adaptation worked; returns the seconds the avoided failure would have cost."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0.0
+            entry["hits"] += 1
+            entry["failures"] = 0
+            saved = entry["failed_seconds"]
+            self._stats["hits"] += 1
+            self._stats["seconds_saved"] += saved
+            self._save()
+        return saved
+
+    def miss(self, key: str) -> bool:
+        """The learned adaptation failed; returns True if it was demoted."""
+        with self._lock:
+            self._stats["misses"] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry["failures"] += 1
+            demoted = entry["failures"] >= self.max_failures
+            if demoted:
+                del self._entries[key]
+                self._stats["demoted"] += 1
+            self._save()
+        if demoted:
+            logger.warning("learned_instruction_demoted", key=key)
+        return demoted
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        return {
+            "enabled": settings.nova_act_learned_instructions,
+            "entries": entries,
+            **{k: v for k, v in stats.items() if k != "seconds_saved"},
+            "hit_rate": round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0,
+            "seconds_saved": round(stats["seconds_saved"], 2),
+        }
+
+
+_cache_lock = threading.Lock()
+_cache: InstructionCache | None = None
+
+
+def get_instruction_cache() -> InstructionCache:
+    """Process-wide cache for the current storage location (reloaded if it changes)."""
+    global _cache
+    path = learned_dir() / "instructions.json"
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            _cache = InstructionCache(path, settings.nova_act_learned_max_failures)
+        return _cache
+
+
+def get_instruction_cache_stats() -> dict:
+    """Learned-instruction hit rate and time saved (/api/health)."""
+    return get_instruction_cache().stats()
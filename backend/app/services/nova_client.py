@@ -1,51 +1,161 @@
 """Bedrock runtime client for Amazon Nova 2 Lite (real inference)."""
 
 import json
+import threading
+import time
+from typing import Callable
 
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from app.config import settings
 from app.logging_config import get_logger
+from app.services.endpoint_pool import Endpoint, build_pool
+from app.services.hedging import HedgePolicy
+from app.services.resilience import (
+    RETRYABLE_KINDS,
+    AdaptiveBackoff,
+    CircuitBreaker,
+    CircuitOpenError,
+    call_with_retry,
+    classify_error,
+)
 
 logger = get_logger(__name__)
 
-# Reasonable timeouts for inference (Nova can take a few minutes for long outputs)
-CONNECT_TIMEOUT = 120
+# Connect should be fast; the read timeout is further capped by the per-operation deadline.
+CONNECT_TIMEOUT = 10
 READ_TIMEOUT = 300
 
+# Region/model endpoints, healthiest first with per-endpoint breakers (BEDROCK_ENDPOINTS)
+_pool = build_pool(
+    settings.get_bedrock_endpoints(),
+    failure_threshold=settings.bedrock_circuit_failure_threshold,
+    reset_timeout=settings.bedrock_circuit_reset_seconds,
+)
 
-def get_bedrock_runtime_client():
-    """Return boto3 bedrock-runtime client for settings.aws_region."""
+# Retries are handled by resilience.call_with_retry (classified, jittered, deadline-aware);
+# this breaker trips when whole failover sweeps across the pool keep failing.
+_breaker = CircuitBreaker(
+    "bedrock",
+    failure_threshold=settings.bedrock_circuit_failure_threshold,
+    reset_timeout=settings.bedrock_circuit_reset_seconds,
+)
+_backoff = AdaptiveBackoff(
+    base=settings.bedrock_backoff_base_seconds,
+    cap=settings.bedrock_backoff_max_seconds,
+)
+
+# Latency tracking and opt-in hedging, per operation (text and multimodal differ a lot)
+_hedge_policies = {
+    operation: HedgePolicy(
+        operation,
+        percentile=settings.nova_hedge_percentile,
+        min_delay=settings.nova_hedge_min_delay_seconds,
+        budget_ratio=settings.nova_hedge_budget_ratio,
+    )
+    for operation in ("inference", "receipt_extraction")
+}
+
+# Bedrock prompt-cache checkpoint: everything before it in the message is cacheable.
+_CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+# Model IDs that rejected a cachePoint block; they get plain requests from then on.
+_cache_unsupported_models: set[str] = set()
+_cache_stats_lock = threading.Lock()
+_cache_stats = {
+    "requests": 0,
+    "cached_requests": 0,
+    "cache_read_tokens": 0,
+    "cache_write_tokens": 0,
+    "input_tokens": 0,
+}
+
+
+def get_bedrock_runtime_client(read_timeout: float = READ_TIMEOUT, region: str | None = None):
+    """Return boto3 bedrock-runtime client for region (default settings.aws_region).
+
+    botocore retries are disabled; resilience.call_with_retry handles them.
+    """
     config = Config(
-        connect_timeout=CONNECT_TIMEOUT,
-        read_timeout=READ_TIMEOUT,
-        retries={"max_attempts": 2, "mode": "standard"},
+        connect_timeout=min(CONNECT_TIMEOUT, read_timeout),
+        read_timeout=read_timeout,
+        retries={"max_attempts": 1, "mode": "standard"},
     )
     return boto3.client(
         "bedrock-runtime",
-        region_name=settings.aws_region,
+        region_name=region or settings.aws_region,
         config=config,
     )
 
 
-def call_nova_2_lite(prompt: str) -> str:
-    """
-    Invoke Nova 2 Lite via Bedrock Messages API; return only the model text output.
+def get_circuit_state() -> dict:
+    """Bedrock circuit breaker state for /api/health."""
+    return _breaker.snapshot()
 
-    Uses settings.nova_model_id_lite and settings.aws_region.
-    On-demand serverless invocation; no inference profile required.
-    Raises on AWS/boto errors; does not log prompt or response content.
-    """
-    client = get_bedrock_runtime_client()
-    model_id = settings.nova_model_id_lite
-    payload = {
-        "messages": [
-            {"role": "user", "content": [{"text": prompt}]},
-        ],
+
+def get_endpoint_stats() -> list[dict]:
+    """Per-endpoint latency, error rate and circuit state for /api/health."""
+    return _pool.snapshot()
+
+
+def get_hedging_stats() -> dict:
+    """Per-operation hedge rate, win rate and current hedge delay."""
+    return {
+        "enabled": settings.nova_hedging_enabled,
+        **{name: policy.stats() for name, policy in _hedge_policies.items()},
     }
+
+
+def get_prompt_cache_stats() -> dict:
+    """Cumulative prompt-cache counters for this process (token counts from Bedrock usage)."""
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    stats["unsupported_models"] = sorted(_cache_unsupported_models)
+    return stats
+
+
+def reset_prompt_cache_stats() -> None:
+    """Clear prompt-cache counters and the unsupported-model list (tests)."""
+    with _cache_stats_lock:
+        for key in _cache_stats:
+            _cache_stats[key] = 0
+        _cache_unsupported_models.clear()
+
+
+def _record_usage(usage: dict, cached: bool) -> tuple[int, int]:
+    """Add response usage to counters; return (cache_read, cache_write) token counts."""
+    cache_read = int(usage.get("cacheReadInputTokenCount") or 0)
+    cache_write = int(usage.get("cacheWriteInputTokenCount") or 0)
+    with _cache_stats_lock:
+        _cache_stats["requests"] += 1
+        _cache_stats["cached_requests"] += int(cached)
+        _cache_stats["cache_read_tokens"] += cache_read
+        _cache_stats["cache_write_tokens"] += cache_write
+        _cache_stats["input_tokens"] += int(usage.get("inputTokens") or 0)
+    return cache_read, cache_write
+
+
+def _use_cache(model_id: str, cacheable_prefix: str | None) -> bool:
+    return bool(
+        cacheable_prefix
+        and settings.nova_prompt_cache_enabled
+        and model_id not in _cache_unsupported_models
+    )
+
+
+def _is_cache_rejection(err: ClientError) -> bool:
+    """True if Bedrock rejected the request because of the cachePoint block."""
+    error = err.response.get("Error", {})
+    message = (error.get("Message") or "").lower()
+    return error.get("Code") == "ValidationException" and "cache" in message
+
+
+def _invoke(client, model_id: str, content: list[dict]) -> tuple[str, dict]:
+    """Invoke the model with one user message; return (text, usage)."""
+    payload = {"messages": [{"role": "user", "content": content}]}
     body = json.dumps(payload).encode("utf-8")
-    logger.info("nova_invoke_start", model_id=model_id, region=settings.aws_region)
     response = client.invoke_model(
         modelId=model_id,
         contentType="application/json",
@@ -57,18 +167,216 @@ def call_nova_2_lite(prompt: str) -> str:
         text = response_json["output"]["message"]["content"][0]["text"]
     except (KeyError, IndexError, TypeError):
         text = ""
+    usage = response_json.get("usage") if isinstance(response_json, dict) else None
+    return text, usage if isinstance(usage, dict) else {}
+
+
+def _invoke_endpoint(
+    endpoint: Endpoint,
+    cached_content: list[dict],
+    plain_content: list[dict],
+    cacheable_prefix: str | None,
+    read_timeout: float,
+    model_id: str | None = None,
+) -> tuple[str, dict, bool]:
+    """
+    Invoke one endpoint with the cache-checkpointed content when its model supports it.
+
+    model_id overrides the endpoint's model (same region), e.g. for tiered extraction.
+    If the model rejects the cachePoint (ValidationException mentioning cache), the model
+    is remembered as unsupported and the call is repeated once without it.
+    Returns (text, usage, cached).
+    """
+    model_id = model_id or endpoint.model_id
+    client = get_bedrock_runtime_client(read_timeout=read_timeout, region=endpoint.region)
+    cached = _use_cache(model_id, cacheable_prefix)
+    try:
+        text, usage = _invoke(client, model_id, cached_content if cached else plain_content)
+    except ClientError as e:
+        if not cached or not _is_cache_rejection(e):
+            raise
+        _cache_unsupported_models.add(model_id)
+        logger.warning("nova_prompt_cache_unsupported", model_id=model_id)
+        cached = False
+        text, usage = _invoke(client, model_id, plain_content)
+    return text, usage, cached
+
+
+def _attempt(
+    call: Callable[[Endpoint, float], tuple[str, dict, bool]], endpoint: Endpoint, read_timeout: float
+) -> tuple[str, dict, bool]:
+    """call(endpoint), recording its latency or failure on the endpoint."""
+    t0 = time.monotonic()
+    try:
+        result = call(endpoint, read_timeout)
+    except Exception as exc:
+        endpoint.record_failure(counts_for_breaker=classify_error(exc) in RETRYABLE_KINDS)
+        raise
+    endpoint.record_success(time.monotonic() - t0)
+    return result
+
+
+def _hedge_attempt(
+    call: Callable[[Endpoint, float], tuple[str, dict, bool]],
+    endpoint: Endpoint,
+    exclude: set[str],
+    read_timeout: float,
+) -> tuple[str, dict, bool]:
+    """The hedge goes to the next healthiest endpoint, or to the same one if no other admits calls."""
+    try:
+        target = _pool.acquire(exclude=exclude)
+    except CircuitOpenError:
+        target = endpoint
+    logger.info("nova_hedge_endpoint", region=target.region, model_id=target.model_id)
+    return _attempt(call, target, read_timeout)
+
+
+def _invoke_with_failover(
+    call: Callable[[Endpoint, float], tuple[str, dict, bool]],
+    operation: str,
+    remaining: float,
+) -> tuple[str, dict, bool]:
+    """
+    One resilience attempt: try endpoints healthiest-first, failing over immediately to
+    the next endpoint on a throttle / timeout / 5xx. Raises the last endpoint error once
+    every endpoint has been tried (or is open), so call_with_retry can back off.
+    """
+    policy = _hedge_policies[operation]
+    start = time.monotonic()
+    tried: set[str] = set()
+    last_error: Exception | None = None
+    while True:
+        try:
+            endpoint = _pool.acquire(exclude=tried)
+        except CircuitOpenError:
+            if last_error is not None:
+                raise last_error
+            raise
+        tried.add(endpoint.name)
+        time_left = remaining - (time.monotonic() - start)
+        if time_left <= 0 and last_error is not None:
+            endpoint.breaker.release_probe()
+            raise last_error
+        read_timeout = max(1.0, min(READ_TIMEOUT, time_left))
+        t0 = time.monotonic()
+        try:
+            if settings.nova_hedging_enabled:
+                exclude = set(tried)
+                result = policy.run(
+                    lambda: _attempt(call, endpoint, read_timeout),
+                    timeout=time_left,
+                    hedge_fn=lambda: _hedge_attempt(call, endpoint, exclude, read_timeout),
+                )
+            else:
+                result = _attempt(call, endpoint, read_timeout)
+        except Exception as exc:
+            kind = classify_error(exc)
+            if kind not in RETRYABLE_KINDS:
+                raise
+            logger.warning(
+                "bedrock_endpoint_failed",
+                operation=operation,
+                region=endpoint.region,
+                model_id=endpoint.model_id,
+                kind=kind,
+            )
+            last_error = exc
+            continue
+        if not settings.nova_hedging_enabled:
+            policy.record_latency(time.monotonic() - t0)
+        if endpoint.index > 0:
+            logger.info(
+                "bedrock_endpoint_secondary_used", operation=operation, region=endpoint.region
+            )
+        return result
+
+
+def _invoke_with_cache(
+    cached_content: list[dict],
+    plain_content: list[dict],
+    cacheable_prefix: str | None,
+    operation: str,
+    deadline: float,
+    model_id: str | None = None,
+    usage_out: dict | None = None,
+) -> tuple[str, int, int]:
+    """
+    Invoke via the endpoint pool under the shared circuit breaker, adaptive backoff,
+    operation deadline and (opt-in) hedging.
+    usage_out, if given, is updated with the response usage (token counts).
+    Returns (text, cache_read_tokens, cache_write_tokens).
+    """
+
+    def call(endpoint: Endpoint, read_timeout: float) -> tuple[str, dict, bool]:
+        return _invoke_endpoint(
+            endpoint, cached_content, plain_content, cacheable_prefix, read_timeout, model_id
+        )
+
+    text, usage, cached = call_with_retry(
+        lambda remaining: _invoke_with_failover(call, operation, remaining),
+        operation=operation,
+        breaker=_breaker,
+        backoff=_backoff,
+        max_attempts=settings.bedrock_max_attempts,
+        deadline_seconds=deadline,
+    )
+    if usage_out is not None:
+        usage_out.update(usage)
+    cache_read, cache_write = _record_usage(usage, cached)
+    return text, cache_read, cache_write
+
+
+def call_nova_2_lite(prompt: str, cacheable_prefix: str | None = None) -> str:
+    """
+    Invoke Nova 2 Lite via Bedrock Messages API; return only the model text output.
+
+    Routed to the healthiest endpoint of the pool (BEDROCK_ENDPOINTS, default
+    settings.aws_region + settings.nova_model_id_lite) with failover to the others.
+    cacheable_prefix: static instruction text sent before prompt and marked with a
+    Bedrock prompt-cache checkpoint (NOVA_PROMPT_CACHE_ENABLED); sent inline otherwise.
+    Throttles, timeouts and 5xx are retried with adaptive backoff (see resilience).
+    Raises on AWS/boto errors, CircuitOpenError when failing fast, DeadlineExceededError
+    when the inference deadline runs out; does not log prompt or response content.
+    """
+    if cacheable_prefix:
+        plain = [{"text": f"{cacheable_prefix}\n\n{prompt}"}]
+        cached = [{"text": cacheable_prefix}, _CACHE_POINT, {"text": prompt}]
+    else:
+        plain = cached = [{"text": prompt}]
+    logger.info("nova_invoke_start", endpoints=len(_pool.endpoints))
+    text, cache_read, cache_write = _invoke_with_cache(
+        cached,
+        plain,
+        cacheable_prefix,
+        "inference",
+        settings.bedrock_inference_deadline_seconds,
+    )
     if not text.strip():
         logger.warning("nova_invoke_empty_output")
     else:
-        logger.info("nova_invoke_success", output_length=len(text))
+        logger.info(
+            "nova_invoke_success",
+            output_length=len(text),
+            cache_read_tokens=cache_read,
+            cache_write_tokens=cache_write,
+        )
     return text
 
 
-def call_nova_2_lite_multimodal(prompt: str, image_bytes: bytes, media_type: str) -> str:
+def call_nova_2_lite_multimodal(
+    prompt: str,
+    image_bytes: bytes,
+    media_type: str,
+    model_id: str | None = None,
+    usage_out: dict | None = None,
+) -> str:
     """
     Invoke Nova 2 Lite with image + text (receipt extraction).
     media_type e.g. image/jpeg; image bytes are base64-encoded in the payload.
-    Returns model text output. Does not log image or base64 content.
+    The prompt is static, so when prompt caching is enabled it is sent first with a
+    cache checkpoint before the image. Returns model text output.
+    model_id overrides the pool endpoint's model (tiered extraction); usage_out, if
+    given, receives the response token usage. Does not log image or base64 content.
     """
     import base64
 
@@ -80,43 +388,31 @@ def call_nova_2_lite_multimodal(prompt: str, image_bytes: bytes, media_type: str
     }
     fmt = format_map.get(media_type.lower() if media_type else "", "jpeg")
     b64 = base64.b64encode(image_bytes).decode("ascii")
-    payload = {
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "image": {
-                            "format": fmt,
-                            "source": {"bytes": b64},
-                        },
-                    },
-                    {"text": prompt},
-                ],
-            },
-        ],
-    }
-    client = get_bedrock_runtime_client()
-    model_id = settings.nova_model_id_lite
-    body = json.dumps(payload).encode("utf-8")
+    image = {"image": {"format": fmt, "source": {"bytes": b64}}}
+    plain = [image, {"text": prompt}]
+    cached = [{"text": prompt}, _CACHE_POINT, image]
     logger.info(
         "receipt_extraction_start",
         image_size_bytes=len(image_bytes),
         media_type=media_type,
+        model_id=model_id,
     )
-    response = client.invoke_model(
-        modelId=model_id,
-        contentType="application/json",
-        accept="application/json",
-        body=body,
+    text, cache_read, cache_write = _invoke_with_cache(
+        cached,
+        plain,
+        prompt,
+        "receipt_extraction",
+        settings.bedrock_receipt_deadline_seconds,
+        model_id=model_id,
+        usage_out=usage_out,
     )
-    response_json = json.loads(response["body"].read().decode("utf-8"))
-    try:
-        text = response_json["output"]["message"]["content"][0]["text"]
-    except (KeyError, IndexError, TypeError):
-        text = ""
     if not text.strip():
         logger.warning("receipt_extraction_empty_output")
     else:
-        logger.info("receipt_extraction_success", output_length=len(text))
+        logger.info(
+            "receipt_extraction_success",
+            output_length=len(text),
+            cache_read_tokens=cache_read,
+            cache_write_tokens=cache_write,
+        )
     return text
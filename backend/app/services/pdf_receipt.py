@@ -0,0 +1,260 @@
+"""Multi-page scanned PDF receipts (hotel folios, travel invoices).
+
+PDFs without a text layer are rasterized page by page in a process pool (rendering is
+CPU-bound). The document is written once to a temporary file and workers open it by
+path, so the PDF bytes are not pickled for every page. Each page image is sent to the
+multimodal receipt extractor as soon as it is rendered. Page extractions share one
+bounded thread pool so concurrent uploads cannot exceed RECEIPT_PDF_PAGE_CONCURRENCY
+in-flight Nova calls. The per-page results are merged into one set of receipt fields
+plus a line-item total.
+"""
+
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services.receipt_parser import parse_receipt
+
+logger = get_logger(__name__)
+
+# Appended to the receipt prompt for every page; constant so the prompt prefix stays cacheable
+PAGE_INSTRUCTIONS = (
+    "This image is ONE PAGE of a multi-page receipt or folio. Set amount to the grand "
+    "total / balance only if it is printed on this page, otherwise null. Also return "
+    "line_items_total: the sum of the itemized charges listed on this page as a string "
+    "(e.g. \"312.40\"), or null if the page has no itemized charges."
+)
+
+_executor_lock = threading.Lock()
+_render_pool: ProcessPoolExecutor | None = None
+_extract_pool: ThreadPoolExecutor | None = None
+
+_stats_lock = threading.Lock()
+_stats = {"documents": 0, "pages": 0, "wall_seconds": 0.0, "sequential_seconds": 0.0}
+
+
+def _encode_png(width: int, height: int, stride: int, channels: int, buffer) -> bytes:
+    """Minimal PNG encoder (8-bit gray or RGB, filter 0) so no imaging library is needed."""
+    color_type = 0 if channels == 1 else 2
+    raw = bytearray()
+    view = memoryview(buffer).cast("B")
+    row_bytes = width * channels
+    for y in range(height):
+        raw.append(0)
+        raw += view[y * stride : y * stride + row_bytes]
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(bytes(raw), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _render_page(path: str, index: int, scale: float) -> tuple[int, bytes, float]:
+    """Process-pool worker: (index, PNG bytes, render seconds) for one page of the PDF at path."""
+    import pypdfium2 as pdfium
+
+    t0 = time.perf_counter()
+    doc = pdfium.PdfDocument(path)
+    try:
+        page = doc[index]
+        bitmap = page.render(scale=scale, grayscale=True)
+        png = _encode_png(bitmap.width, bitmap.height, bitmap.stride, bitmap.n_channels, bitmap.buffer)
+    finally:
+        doc.close()
+    return index, png, time.perf_counter() - t0
+
+
+def _extract_page(index: int, png: bytes) -> tuple[int, dict, float]:
+    """Thread-pool worker: (index, extracted fields, extraction seconds) for one page image."""
+    t0 = time.perf_counter()
+    fields = parse_receipt(png, "image/png", extra_instructions=PAGE_INSTRUCTIONS)
+    return index, fields, time.perf_counter() - t0
+
+
+def _pools() -> tuple[ProcessPoolExecutor, ThreadPoolExecutor]:
+    global _render_pool, _extract_pool
+    with _executor_lock:
+        if _render_pool is None:
+            # spawn, not fork: the server process is multi-threaded
+            _render_pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.receipt_pdf_render_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        if _extract_pool is None:
+            _extract_pool = ThreadPoolExecutor(
+                max_workers=max(1, settings.receipt_pdf_page_concurrency),
+                thread_name_prefix="receipt-page",
+            )
+        return _render_pool, _extract_pool
+
+
+def page_count(body: bytes) -> int:
+    """Number of pages in the PDF; HTTPException(400) if it cannot be opened."""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        logger.warning("pypdfium2_not_installed")
+        raise HTTPException(
+            status_code=400,
+            detail="Scanned PDF receipts are not supported on this server; upload an image.",
+        )
+    try:
+        doc = pdfium.PdfDocument(body)
+    except Exception as e:
+        logger.warning("pdf_open_failed", error=str(e))
+        raise HTTPException(status_code=400, detail="Could not read PDF.") from e
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def _to_decimal(value) -> Decimal | None:
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+
+
+def merge_page_results(pages: list[dict]) -> dict:
+    """
+    Merge per-page fields (in page order) into one receipt.
+
+    amount is the grand total from the last page that shows one (folios print it at the
+    end), falling back to the sum of line items; merchant/date/category/currency come
+    from the most confident page that has them. Confidence is the lowest confidence of
+    the pages that supplied amount, merchant and date.
+    """
+    line_items = [d for d in (_to_decimal(p.get("line_items_total")) for p in pages) if d is not None]
+    line_items_total = f"{sum(line_items):.2f}" if line_items else None
+
+    merged: dict = {}
+    sources: dict[str, int] = {}
+    for i in reversed(range(len(pages))):
+        if _to_decimal(pages[i].get("amount")) is not None:
+            merged["amount"] = f"{_to_decimal(pages[i]['amount']):.2f}"
+            sources["amount"] = i
+            break
+    else:
+        merged["amount"] = line_items_total
+
+    by_confidence = sorted(range(len(pages)), key=lambda i: (-pages[i]["confidence"], i))
+    for key in ("merchant", "date", "category", "currency"):
+        merged[key] = None
+        for i in by_confidence:
+            if pages[i].get(key) not in (None, ""):
+                merged[key] = pages[i][key]
+                sources[key] = i
+                break
+
+    supplying = {sources[k] for k in ("amount", "merchant", "date") if k in sources}
+    merged["confidence"] = (
+        min(pages[i]["confidence"] for i in supplying) if supplying else 0.0
+    )
+    merged["line_items_total"] = line_items_total
+    merged["pages"] = len(pages)
+    return merged
+
+
+def parse_pdf_receipt(body: bytes) -> dict:
+    """
+    Extract receipt fields from a scanned (image-only) PDF, one model call per page.
+
+    Pages are rendered in the process pool and handed to the bounded extraction pool
+    as they finish, so rendering of later pages overlaps extraction of earlier ones.
+    Returns the receipt keys plus line_items_total and pages. Raises HTTPException
+    (400 unreadable / too many pages; 502/503 from page extraction).
+    """
+    count = page_count(body)
+    if count == 0:
+        raise HTTPException(status_code=400, detail="PDF has no pages.")
+    if count > settings.receipt_pdf_max_pages:
+        raise HTTPException(
+            status_code=400,
+            detail=f"PDF has {count} pages. Max pages: {settings.receipt_pdf_max_pages}",
+        )
+    render_pool, extract_pool = _pools()
+    t0 = time.perf_counter()
+    fd, path = tempfile.mkstemp(prefix="receipt-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(body)
+    results: dict[int, dict] = {}
+    busy_seconds = 0.0
+    try:
+        rendering: set[Future] = {
+            render_pool.submit(_render_page, path, i, settings.receipt_pdf_render_scale)
+            for i in range(count)
+        }
+        pending: set[Future] = set(rendering)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in rendering:
+                        index, png, seconds = future.result()
+                        pending.add(extract_pool.submit(_extract_page, index, png))
+                    else:
+                        index, results[index], seconds = future.result()
+                    busy_seconds += seconds
+        except Exception:
+            for future in pending:
+                future.cancel()
+            # Let renders already running finish before their file is removed
+            wait(f for f in rendering if not f.cancelled())
+            raise
+    finally:
+        os.unlink(path)
+    wall = time.perf_counter() - t0
+
+    merged = merge_page_results([results[i] for i in range(count)])
+    with _stats_lock:
+        _stats["documents"] += 1
+        _stats["pages"] += count
+        _stats["wall_seconds"] += wall
+        _stats["sequential_seconds"] += busy_seconds
+    logger.info(
+        "pdf_receipt_extracted",
+        pages=count,
+        wall_sec=round(wall, 2),
+        sequential_sec=round(busy_seconds, 2),
+        confidence=merged["confidence"],
+    )
+    return merged
+
+
+def get_pdf_receipt_stats() -> dict:
+    """Documents/pages processed and wall-clock time vs. summed per-page (sequential) time."""
+    with _stats_lock:
+        stats = dict(_stats)
+    wall = stats["wall_seconds"]
+    return {
+        "documents": stats["documents"],
+        "pages": stats["pages"],
+        "wall_seconds": round(wall, 3),
+        "sequential_seconds": round(stats["sequential_seconds"], 3),
+        "speedup": round(stats["sequential_seconds"] / wall, 2) if wall else 0.0,
+    }
+
+
+def reset_pdf_receipt_stats() -> None:
+    """Clear counters (tests)."""
+    with _stats_lock:
+        _stats.update(documents=0, pages=0, wall_seconds=0.0, sequential_seconds=0.0)
@@ -1,6 +1,8 @@
 """Receipt image parsing via Nova 2 Lite multimodal or mock."""
 
 import json
+import threading
+import time
 from pathlib import Path
 
 from fastapi import HTTPException
@@ -9,16 +11,22 @@ from app.config import settings
 from app.logging_config import get_logger
 from app.services.inference import extract_json_object, normalize_model_output
 from app.services import nova_client
+from app.services.resilience import CircuitOpenError
 
 logger = get_logger(__name__)
 
 # Backend root (backend/ when local, /app in Docker) so prompts are inside the image
 _BACKEND_ROOT = Path(__file__).resolve().parent.parent.parent
-_RECEIPT_PROMPT_PATH = _BACKEND_ROOT / "prompts" / "receipt_extraction_prompt.txt"
+RECEIPT_PROMPT_PATH = _BACKEND_ROOT / "prompts" / "receipt_extraction_prompt.txt"
 _MAX_SAFE_PREVIEW_CHARS = 300
+# A result missing any of these is escalated to the next model tier
+_REQUIRED_FIELDS = ("amount", "merchant", "date")
 
+_tier_stats_lock = threading.Lock()
+_tier_stats: dict[str, dict] = {}
 
-def _parse_receipt_json(raw_text: str) -> dict:
+
+def parse_receipt_model_output(raw_text: str) -> dict:
     """Parse model output to dict with amount, merchant, date, category, currency, confidence."""
     raw_text = (raw_text or "").strip()
     cleaned = normalize_model_output(raw_text)
@@ -39,33 +47,11 @@ def _parse_receipt_json(raw_text: str) -> dict:
     return obj
 
 
-def parse_receipt(image_bytes: bytes, media_type: str) -> dict:
+def normalize_receipt_fields(obj: dict) -> dict:
     """
-    Extract receipt fields from image. Returns dict with keys:
-    amount, merchant, date, category, currency, confidence.
-    Missing fields default to null; confidence defaults to 0.0.
+    Keep the six receipt keys; confidence coerced to a number (default 0.0).
+    line_items_total is kept only when the model returned it (multi-page PDF pages).
     """
-    if settings.nova_mode == "mock":
-        return {
-            "amount": "45.50",
-            "merchant": "Demo Cafe",
-            "date": "2025-02-20",
-            "category": "Meals",
-            "currency": "USD",
-            "confidence": 0.95,
-        }
-    if not _RECEIPT_PROMPT_PATH.exists():
-        raise HTTPException(status_code=502, detail="Receipt extraction prompt not found.")
-    prompt = _RECEIPT_PROMPT_PATH.read_text(encoding="utf-8").strip()
-    try:
-        raw = nova_client.call_nova_2_lite_multimodal(prompt, image_bytes, media_type)
-    except Exception as e:
-        logger.warning("receipt_extraction_failed", error=str(e))
-        raise HTTPException(status_code=502, detail="Receipt extraction service unavailable.") from e
-    try:
-        obj = _parse_receipt_json(raw)
-    except HTTPException:
-        raise
     out = {
         "amount": obj.get("amount"),
         "merchant": obj.get("merchant"),
@@ -78,4 +64,148 @@ def parse_receipt(image_bytes: bytes, media_type: str) -> dict:
         out["confidence"] = 0.0
     elif out["confidence"] is None:
         out["confidence"] = 0.0
+    if "line_items_total" in obj:
+        out["line_items_total"] = obj["line_items_total"]
     return out
+
+
+def _needs_escalation(out: dict) -> bool:
+    """True if confidence is below threshold or a required field is missing."""
+    if out["confidence"] < settings.receipt_escalation_confidence:
+        return True
+    return any(out.get(key) in (None, "") for key in _REQUIRED_FIELDS)
+
+
+def _record_tier(model_id: str, latency: float, cost: float, escalated: bool, failed: bool) -> None:
+    with _tier_stats_lock:
+        stats = _tier_stats.setdefault(
+            model_id,
+            {"calls": 0, "escalated": 0, "failed": 0, "total_latency": 0.0, "total_cost_usd": 0.0},
+        )
+        stats["calls"] += 1
+        stats["escalated"] += int(escalated)
+        stats["failed"] += int(failed)
+        stats["total_latency"] += latency
+        stats["total_cost_usd"] += cost
+
+
+def get_receipt_routing_stats() -> dict:
+    """Per-tier calls, escalation rate, mean latency and cost for tiered extraction."""
+    with _tier_stats_lock:
+        snapshot = {model: dict(stats) for model, stats in _tier_stats.items()}
+    tiers = {}
+    for model_id, stats in snapshot.items():
+        calls = stats["calls"]
+        tiers[model_id] = {
+            "calls": calls,
+            "escalated": stats["escalated"],
+            "failed": stats["failed"],
+            "escalation_rate": round(stats["escalated"] / calls, 4) if calls else 0.0,
+            "mean_latency_seconds": round(stats["total_latency"] / calls, 3) if calls else 0.0,
+            "total_cost_usd": round(stats["total_cost_usd"], 6),
+        }
+    return {"threshold": settings.receipt_escalation_confidence, "tiers": tiers}
+
+
+def reset_receipt_routing_stats() -> None:
+    """Clear tier counters (tests)."""
+    with _tier_stats_lock:
+        _tier_stats.clear()
+
+
+def _extract_with_tier(
+    prompt: str,
+    image_bytes: bytes,
+    media_type: str,
+    tier: tuple[str, float, float],
+    is_last: bool,
+) -> dict:
+    """
+    One extraction with the tier's model; records latency/cost/escalation for the tier.
+    Raises HTTPException (503 circuit open, 502 service or parse failure).
+    """
+    model_id, price_in, price_out = tier
+    usage: dict = {}
+    t0 = time.perf_counter()
+    try:
+        raw = nova_client.call_nova_2_lite_multimodal(
+            prompt, image_bytes, media_type, model_id=model_id, usage_out=usage
+        )
+        out = normalize_receipt_fields(parse_receipt_model_output(raw))
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Receipt extraction temporarily unavailable; try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after)))},
+        ) from e
+    except HTTPException:
+        _record_tier(model_id, time.perf_counter() - t0, 0.0, escalated=not is_last, failed=True)
+        raise
+    except Exception as e:
+        logger.warning("receipt_extraction_failed", error=str(e), model_id=model_id)
+        _record_tier(model_id, time.perf_counter() - t0, 0.0, escalated=not is_last, failed=True)
+        raise HTTPException(status_code=502, detail="Receipt extraction service unavailable.") from e
+    latency = time.perf_counter() - t0
+    cost = (
+        int(usage.get("inputTokens") or 0) * price_in
+        + int(usage.get("outputTokens") or 0) * price_out
+    ) / 1000
+    escalate = not is_last and _needs_escalation(out)
+    _record_tier(model_id, latency, cost, escalated=escalate, failed=False)
+    logger.info(
+        "receipt_tier_result",
+        model_id=model_id,
+        confidence=out["confidence"],
+        escalate=escalate,
+        latency_sec=round(latency, 2),
+        cost_usd=round(cost, 6),
+    )
+    return out
+
+
+def parse_receipt(image_bytes: bytes, media_type: str, extra_instructions: str | None = None) -> dict:
+    """
+    Extract receipt fields from image. Returns dict with keys:
+    amount, merchant, date, category, currency, confidence.
+    Missing fields default to null; confidence defaults to 0.0.
+
+    Real mode tries the configured model tiers cheapest first (RECEIPT_MODEL_TIERS) and
+    escalates when confidence is below RECEIPT_ESCALATION_CONFIDENCE, a required field is
+    missing, or the tier fails. The last successful result is returned if no tier passes.
+    extra_instructions is appended to the receipt prompt (keep it constant across calls
+    so the prompt prefix stays cacheable).
+    """
+    if settings.nova_mode == "mock":
+        return {
+            "amount": "45.50",
+            "merchant": "Demo Cafe",
+            "date": "2025-02-20",
+            "category": "Meals",
+            "currency": "USD",
+            "confidence": 0.95,
+        }
+    if not RECEIPT_PROMPT_PATH.exists():
+        raise HTTPException(status_code=502, detail="Receipt extraction prompt not found.")
+    prompt = RECEIPT_PROMPT_PATH.read_text(encoding="utf-8").strip()
+    if extra_instructions:
+        prompt = f"{prompt}\n\n{extra_instructions}"
+
+    tiers = settings.get_receipt_model_tiers()
+    best: dict | None = None
+    last_error: HTTPException | None = None
+    for level, tier in enumerate(tiers):
+        is_last = level == len(tiers) - 1
+        try:
+            out = _extract_with_tier(prompt, image_bytes, media_type, tier, is_last)
+        except HTTPException as e:
+            if e.status_code == 503:
+                raise
+            last_error = e
+            continue
+        if best is None or out["confidence"] >= best["confidence"]:
+            best = out
+        if is_last or not _needs_escalation(out):
+            return out
+    if best is not None:
+        return best
+    raise last_error
@@ -0,0 +1,160 @@
+"""Receipt pipeline shared by the upload endpoints and offline backfills.
+
+Bytes → extracted fields → synthetic CaptureSession → inferred workflow, with the
+session and workflow persisted through the storage layer and the receipt file kept in
+the content-addressed blob store (the session references it by content_sha256).
+"""
+
+import uuid
+
+from app.logging_config import get_logger
+from app.models import CaptureSession, CaptureStep
+from app.services.blob_store import get_blob_store
+from app.services.duplicate_index import get_duplicate_index
+from app.services.ereceipt_parser import (
+    STRUCTURED_CONTENT_TYPES,
+    is_structured,
+    parse_structured_receipt,
+)
+from app.services.inference import infer_workflow
+from app.services.receipt_parser import parse_receipt
+from app.services.storage import sessions_dir, workflows_dir, write_json
+
+logger = get_logger(__name__)
+
+IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+# Images go to multimodal extraction; PDF/HTML/JSON/text receipts are parsed locally
+ALLOWED_CONTENT_TYPES = IMAGE_CONTENT_TYPES | STRUCTURED_CONTENT_TYPES
+MAX_FILE_BYTES = 10 * 1024 * 1024  # 10MB
+
+
+def synthetic_steps(extracted: dict) -> list[dict]:
+    """Build CaptureStep-like dicts from extracted receipt fields."""
+    return [
+        {
+            "step_index": 0,
+            "url": "/expense/dashboard",
+            "action": "navigate",
+            "element_text": None,
+            "field_label": None,
+            "value_redacted": None,
+            "screenshot_path": None,
+            "timestamp": None,
+        },
+        {
+            "step_index": 1,
+            "url": "/expense/new",
+            "action": "type",
+            "element_text": None,
+            "field_label": "amount",
+            "value_redacted": str(extracted.get("amount") or ""),
+            "screenshot_path": None,
+            "timestamp": None,
+        },
+        {
+            "step_index": 2,
+            "url": "/expense/new",
+            "action": "type",
+            "element_text": None,
+            "field_label": "merchant",
+            "value_redacted": str(extracted.get("merchant") or ""),
+            "screenshot_path": None,
+            "timestamp": None,
+        },
+        {
+            "step_index": 3,
+            "url": "/expense/new",
+            "action": "type",
+            "element_text": None,
+            "field_label": "date",
+            "value_redacted": str(extracted.get("date") or ""),
+            "screenshot_path": None,
+            "timestamp": None,
+        },
+        {
+            "step_index": 4,
+            "url": "/expense/new",
+            "action": "select",
+            "element_text": None,
+            "field_label": "category",
+            "value_redacted": str(extracted.get("category") or ""),
+            "screenshot_path": None,
+            "timestamp": None,
+        },
+    ]
+
+
+def extract_fields(body: bytes, media_type: str) -> dict:
+    """Receipt fields: local parser for PDF/HTML/JSON/text, multimodal model for images."""
+    if is_structured(media_type):
+        return parse_structured_receipt(body, media_type)
+    return parse_receipt(body, media_type)
+
+
+def process_receipt(
+    body: bytes, media_type: str, size: int, sha256: str, source: str = "receipt_upload"
+) -> dict:
+    """
+    Extract fields, store the receipt session and its inferred workflow.
+    Returns session_id, extracted, workflow_inferred (the POST /capture/receipt response)
+    plus duplicate_of / duplicate_reason from the duplicate index. Fields already
+    extracted from an identical file are reused instead of calling the model again.
+    """
+    logger.info(
+        "receipt_upload_received",
+        source=source,
+        file_size=size,
+        media_type=media_type,
+        sha256=sha256,
+    )
+    index = get_duplicate_index()
+    extracted = index.extracted_for_hash(sha256)
+    if extracted is None:
+        extracted = extract_fields(body, media_type)
+    else:
+        logger.info("receipt_extraction_reused", sha256=sha256)
+    duplicate_of, duplicate_reason = index.find(sha256, extracted)
+    if duplicate_of:
+        logger.warning(
+            "receipt_duplicate_detected",
+            reason=duplicate_reason,
+            duplicate_of=duplicate_of[:5],
+        )
+    session_id = f"receipt_{uuid.uuid4().hex[:12]}"
+    steps_data = synthetic_steps(extracted)
+    steps = [CaptureStep.model_validate(s) for s in steps_data]
+    session = CaptureSession(
+        session_id=session_id,
+        steps=steps,
+        metadata={
+            "source": source,
+            "content_sha256": sha256,
+            "receipt_media_type": media_type,
+            "duplicate_of": duplicate_of,
+            "duplicate_reason": duplicate_reason,
+        },
+    )
+    store = get_blob_store()
+    store.put(sha256, body, media_type, ref=session_id)
+    session_path = sessions_dir() / f"{session_id}.json"
+    try:
+        write_json(session_path, session.model_dump(mode="json"))
+    except Exception:
+        store.release(sha256, session_id)  # no session will ever point at the blob
+        raise
+    index.add(session_id, sha256, extracted)
+    workflow = infer_workflow(session)
+    workflow_path = workflows_dir() / f"{session_id}.workflow.json"
+    write_json(workflow_path, workflow.model_dump(mode="json"))
+    logger.info(
+        "receipt_pipeline_complete",
+        session_id=session_id,
+        workflow_inferred=True,
+    )
+    return {
+        "session_id": session_id,
+        "extracted": extracted,
+        "workflow_inferred": True,
+        "duplicate_of": duplicate_of,
+        "duplicate_reason": duplicate_reason,
+    }
@@ -0,0 +1,293 @@
+"""Record-and-replay fast path for real Nova Act runs.
+
+Every act() call makes Nova Act plan the same clicks and keystrokes on the same form
+again. After a step succeeds through act(), its effect is recorded as concrete browser
+actions: the form fields now holding the run's values (found in the DOM, or through the
+step's selector_hint) and the upload input holding the receipt, each with a unique
+selector, and the click target for steps that only have a selector_hint. The actions
+keep the parameter name rather than the value, so later runs replay them with their own
+values directly through Playwright (nova.page). A step whose replay fails, or that sets
+a parameter the recording did not cover, falls back to act() and is recorded again.
+
+Scripts are stored per agent under demo/replay and tied to the compiled plan they were
+recorded for (a recompiled plan starts a new script).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.models import ExecutionPlan, PlanStep, ReplayAction, ReplayScript, ReplayStep
+from app.services.execution_plan import has_value
+from app.services.storage import read_json, replay_dir, write_json
+
+logger = get_logger(__name__)
+
+# Finds the unique form control holding each value, and the file input holding the file
+_FIND_CONTROLS_JS = """
+(args) => {
+  const unique = (sel) => {
+    try { return document.querySelectorAll(sel).length === 1; } catch (e) { return false; }
+  };
+  const selectorFor = (el) => {
+    if (el.id && unique('#' + CSS.escape(el.id))) return '#' + CSS.escape(el.id);
+    const name = el.getAttribute('name');
+    if (name) {
+      const sel = el.tagName.toLowerCase() + '[name="' + name.replace(/"/g, '\\\\"') + '"]';
+      if (unique(sel)) return sel;
+    }
+    return null;
+  };
+  const controls = Array.from(
+    document.querySelectorAll('input:not([type=file]):not([type=hidden]), select, textarea')
+  );
+  const fields = {};
+  for (const [param, want] of Object.entries(args.values)) {
+    const matches = controls.filter((el) =>
+      el.value === want ||
+      (el.tagName === 'SELECT' && el.selectedOptions.length > 0 &&
+       el.selectedOptions[0].text.trim() === want));
+    const selector = matches.length === 1 ? selectorFor(matches[0]) : null;
+    if (selector) fields[param] = { selector: selector, tag: matches[0].tagName.toLowerCase() };
+  }
+  let file = null;
+  if (args.file) {
+    const inputs = Array.from(document.querySelectorAll('input[type=file]')).filter((el) =>
+      Array.from(el.files || []).some((f) => f.name === args.file));
+    if (inputs.length === 1) file = selectorFor(inputs[0]);
+  }
+  return { fields: fields, file: file };
+}
+"""
+
+
+def _step_params(step: PlanStep) -> list[str]:
+    return [part.param for part in step.parts if part.param]
+
+
+def _file_param(step: PlanStep) -> str | None:
+    """The parameter holding a file path (upload steps)."""
+    return step.requires if step.intent == "upload_receipt" else None
+
+
+def plan_fingerprint(plan: ExecutionPlan) -> str:
+    return hashlib.sha256(plan.model_dump_json().encode()).hexdigest()[:16]
+
+
+class ReplayStore:
+    """Replay scripts per agent (JSON files), plus hit/miss metrics since process start."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "failed": 0,
+            "unrecorded": 0,
+            "recorded": 0,
+            "record_skipped": 0,
+            "seconds_saved": 0.0,
+        }
+
+    def _path(self, agent_id: str):
+        return replay_dir() / f"{agent_id}.json"
+
+    def load(self, agent_id: str, plan: ExecutionPlan) -> ReplayScript:
+        """The agent's script for this plan (empty if none, or recorded for another plan)."""
+        fingerprint = plan_fingerprint(plan)
+        path = self._path(agent_id)
+        if path.exists():
+            try:
+                script = ReplayScript.model_validate(read_json(path))
+                if script.plan_fingerprint == fingerprint:
+                    return script
+            except Exception as e:
+                logger.warning("replay_script_unreadable", agent_id=agent_id, error=str(e))
+        return ReplayScript(agent_id=agent_id, plan_fingerprint=fingerprint)
+
+    def save(self, script: ReplayScript) -> None:
+        write_json(self._path(script.agent_id), script.model_dump(mode="json"))
+
+    def count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        attempts = stats["hits"] + stats["failed"] + stats["unrecorded"]
+        return {
+            "enabled": settings.nova_act_replay,
+            **{k: v for k, v in stats.items() if k != "seconds_saved"},
+            "hit_rate": round(stats["hits"] / attempts, 3) if attempts else 0.0,
+            "seconds_saved": round(stats["seconds_saved"], 2),
+            "avg_seconds_saved_per_hit": round(stats["seconds_saved"] / stats["hits"], 2)
+            if stats["hits"]
+            else 0.0,
+        }
+
+
+class ReplayRun:
+    """Replay and recording for one run of one agent; save() persists changes."""
+
+    def __init__(self, store: ReplayStore, agent_id: str, plan: ExecutionPlan, timeout_ms: int):
+        self.store = store
+        self.script = store.load(agent_id, plan)
+        self.timeout_ms = timeout_ms
+        self._steps = {s.index: s for s in self.script.steps}
+        self._clickable: set[int] = set()
+        self._dirty = False
+
+    def ready(self, step: PlanStep, parameters: dict[str, Any]) -> bool:
+        """A recording exists that covers every parameter this run sets for the step."""
+        recorded = self._steps.get(step.index)
+        if recorded is None:
+            self.store.count("unrecorded")
+            return False
+        wanted = {p for p in _step_params(step) if has_value(parameters.get(p))}
+        if not wanted <= set(recorded.params) or (step.requires and step.requires not in wanted):
+            self.store.count("unrecorded")
+            return False
+        return True
+
+    def replay(self, page: Any, step: PlanStep, parameters: dict[str, Any], run_log: list[str]) -> bool:
+        """Perform the step's recorded actions; False (recording dropped) if any failed."""
+        recorded = self._steps[step.index]
+        t0 = time.perf_counter()
+        try:
+            for action in recorded.actions:
+                value = parameters.get(action.param) if action.param else None
+                if action.param and not has_value(value):
+                    continue
+                locator = page.locator(action.selector)
+                found = locator.count()
+                if found != 1:
+                    raise RuntimeError(f"{action.selector} matched {found} elements")
+                if action.kind == "fill":
+                    locator.fill(str(value), timeout=self.timeout_ms)
+                elif action.kind == "select":
+                    locator.select_option(str(value), timeout=self.timeout_ms)
+                elif action.kind == "upload":
+                    locator.set_input_files(str(value), timeout=self.timeout_ms)
+                else:
+                    locator.click(timeout=self.timeout_ms)
+        except Exception as e:
+            self.store.count("failed")
+            del self._steps[step.index]
+            self._dirty = True
+            run_log.append(f"[nova-act] Step {step.index}: replay failed – {e}; falling back to act()")
+            logger.info("replay_step_failed", step=step.index, intent=step.intent, error=str(e))
+            return False
+        elapsed = time.perf_counter() - t0
+        saved = max(0.0, recorded.act_seconds - elapsed)
+        self.store.count("hits")
+        self.store.count("seconds_saved", saved)
+        run_log.append(
+            f"[nova-act] Step {step.index}: {step.intent} – replayed {len(recorded.actions)} "
+            f"recorded actions ({elapsed:.1f}s, ~{saved:.1f}s saved)"
+        )
+        logger.info(
+            "replay_step_hit", step=step.index, intent=step.intent, elapsed_sec=round(elapsed, 2)
+        )
+        return True
+
+    def before_act(self, page: Any, steps: list[PlanStep]) -> None:
+        """Note which selector hints resolve before act() runs (click targets may go away)."""
+        self._clickable = set()
+        for step in steps:
+            if step.selector_hint and not _step_params(step):
+                try:
+                    if page.locator(step.selector_hint).count() == 1:
+                        self._clickable.add(step.index)
+                except Exception:
+                    pass
+
+    def record(
+        self, page: Any, steps: list[PlanStep], parameters: dict[str, Any], act_seconds: float
+    ) -> None:
+        """Record steps that just succeeded through one act() call (its time split evenly)."""
+        for step in steps:
+            try:
+                actions = self._observe(page, step, parameters)
+            except Exception as e:
+                logger.info("replay_record_failed", step=step.index, error=str(e))
+                actions = None
+            if actions is None:
+                self.store.count("record_skipped")
+                if self._steps.pop(step.index, None) is not None:
+                    self._dirty = True
+                continue
+            self._steps[step.index] = ReplayStep(
+                index=step.index,
+                intent=step.intent,
+                params=[a.param for a in actions if a.param],
+                actions=actions,
+                act_seconds=round(act_seconds / len(steps), 3),
+            )
+            self._dirty = True
+            self.store.count("recorded")
+
+    def _observe(self, page: Any, step: PlanStep, parameters: dict[str, Any]) -> list[ReplayAction] | None:
+        """The concrete actions that reproduce the step's effect, or None if not recordable."""
+        if step.requires and not has_value(parameters.get(step.requires)):
+            return None  # ran the generic fallback instruction
+        params = [p for p in _step_params(step) if has_value(parameters.get(p))]
+        if not _step_params(step):
+            if step.index in self._clickable:
+                return [ReplayAction(kind="click", selector=step.selector_hint)]
+            return None
+        if not params:
+            return None
+        file_param = _file_param(step)
+        values = {p: str(parameters[p]) for p in params if p != file_param}
+        actions: list[ReplayAction] = []
+        if step.selector_hint and len(values) == 1:
+            # The workflow's own locator for a single-field step, if it holds the value
+            (param, value), = values.items()
+            locator = page.locator(step.selector_hint)
+            if locator.count() == 1 and locator.input_value() == value:
+                actions.append(ReplayAction(kind="fill", selector=step.selector_hint, param=param))
+                values = {}
+        file_name = os.path.basename(str(parameters[file_param])) if file_param in params else None
+        found = page.evaluate(_FIND_CONTROLS_JS, {"values": values, "file": file_name})
+        for param in values:
+            field = (found.get("fields") or {}).get(param)
+            if not field:
+                return None
+            kind = "select" if field["tag"] == "select" else "fill"
+            actions.append(ReplayAction(kind=kind, selector=field["selector"], param=param))
+        if file_name is not None:
+            if not found.get("file"):
+                return None
+            actions.append(ReplayAction(kind="upload", selector=found["file"], param=file_param))
+        return actions
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.script.steps = sorted(self._steps.values(), key=lambda s: s.index)
+        try:
+            self.store.save(self.script)
+        except Exception as e:
+            logger.warning("replay_script_save_failed", agent_id=self.script.agent_id, error=str(e))
+        self._dirty = False
+
+
+_store_lock = threading.Lock()
+_store: ReplayStore | None = None
+
+
+def get_replay_store() -> ReplayStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ReplayStore()
+        return _store
+
+
+def get_replay_stats() -> dict:
+    """Replay hit rate and latency saved (/api/health)."""
+    return get_replay_store().stats()
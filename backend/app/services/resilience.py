@@ -0,0 +1,276 @@
+"""Resilience for Bedrock calls: error classification, adaptive jittered backoff, circuit breaker.
+
+nova_client routes every invoke_model through call_with_retry so that:
+- validation errors fail immediately (retrying cannot help),
+- throttles / timeouts / 5xx are retried with full-jitter exponential backoff whose
+  base grows while the service keeps throttling and decays after successes,
+- each operation has a deadline; no retry is started that could not finish in time,
+- a circuit breaker fails fast after repeated failures and probes again after a cool-down.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionError as BotoConnectionError,
+    ConnectTimeoutError,
+    ReadTimeoutError,
+)
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+THROTTLE = "throttle"
+TIMEOUT = "timeout"
+SERVER = "server"
+VALIDATION = "validation"
+OTHER = "other"
+
+# Kinds worth retrying and counted as failures by the circuit breaker
+RETRYABLE_KINDS = {THROTTLE, TIMEOUT, SERVER}
+
+_THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "RequestLimitExceeded",
+}
+_TIMEOUT_CODES = {"ModelTimeoutException", "RequestTimeout", "RequestTimeoutException"}
+_SERVER_CODES = {
+    "InternalServerException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelErrorException",
+}
+_VALIDATION_CODES = {
+    "ValidationException",
+    "AccessDeniedException",
+    "ResourceNotFoundException",
+    "UnrecognizedClientException",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the service while the circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry after {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the operation deadline leaves no time for another attempt."""
+
+
+def classify_error(exc: BaseException) -> str:
+    """Map an exception from a Bedrock call to throttle / timeout / server / validation / other."""
+    if isinstance(exc, ClientError):
+        error = exc.response.get("Error", {})
+        code = error.get("Code", "")
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        if code in _THROTTLE_CODES or status == 429:
+            return THROTTLE
+        if code in _TIMEOUT_CODES or status == 408:
+            return TIMEOUT
+        if code in _VALIDATION_CODES:
+            return VALIDATION
+        if code in _SERVER_CODES or status >= 500:
+            return SERVER
+        if 400 <= status < 500:
+            return VALIDATION
+        return OTHER
+    if isinstance(exc, (ReadTimeoutError, ConnectTimeoutError, TimeoutError)):
+        return TIMEOUT
+    if isinstance(exc, BotoConnectionError):
+        return SERVER
+    return OTHER
+
+
+class AdaptiveBackoff:
+    """
+    Full-jitter exponential backoff with an adaptive multiplier.
+
+    Each throttle doubles the multiplier (up to max_penalty) so concurrent callers
+    spread out while the service is saturated; each success halves it back toward 1.
+    """
+
+    def __init__(self, base: float, cap: float, max_penalty: float = 8.0):
+        self.base = base
+        self.cap = cap
+        self.max_penalty = max_penalty
+        self.penalty = 1.0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt: int, rng: Callable[[float, float], float] = random.uniform) -> float:
+        """Sleep time before retry number ``attempt`` (1-based)."""
+        with self._lock:
+            penalty = self.penalty
+        ceiling = min(self.cap, self.base * penalty * (2 ** (attempt - 1)))
+        return rng(0.0, ceiling)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.penalty = min(self.max_penalty, self.penalty * 2)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.penalty = max(1.0, self.penalty / 2)
+
+
+class CircuitBreaker:
+    """
+    Classic closed → open → half-open breaker.
+
+    Opens after failure_threshold consecutive retryable failures; while open, calls fail
+    fast with CircuitOpenError. After reset_timeout one probe call is let through
+    (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not proceed."""
+        with self._lock:
+            if self._state == self.OPEN:
+                waited = self._clock() - self._opened_at
+                if waited < self.reset_timeout:
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+                logger.info("circuit_half_open", circuit=self.name)
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("circuit_closed", circuit=self.name)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._times_opened += 1
+                    logger.warning("circuit_opened", circuit=self.name, failures=self._failures)
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Let another half-open probe through (the last one ended in a non-counted error)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        """State for /api/health."""
+        with self._lock:
+            state = self._state
+            retry_after = 0.0
+            if state == self.OPEN:
+                retry_after = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "retry_after_seconds": round(retry_after, 1),
+            }
+
+
+def call_with_retry(
+    fn: Callable[[float], T],
+    *,
+    operation: str,
+    breaker: CircuitBreaker,
+    backoff: AdaptiveBackoff,
+    max_attempts: int,
+    deadline_seconds: float,
+    sleep: Callable[[float], None] = time.sleep,
+    clock: Callable[[], float] = time.monotonic,
+) -> T:
+    """
+    Call fn(remaining_seconds) with classification-driven retries under a deadline.
+
+    fn receives the time left before the deadline so it can bound its own I/O timeout.
+    Raises CircuitOpenError when the breaker is open, the original exception for
+    non-retryable errors or exhausted attempts, and DeadlineExceededError when the
+    deadline leaves no room for another attempt.
+    """
+    start = clock()
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline_seconds - (clock() - start)
+        if remaining <= 0:
+            raise DeadlineExceededError(f"{operation} exceeded {deadline_seconds:.0f}s deadline")
+        breaker.before_call()
+        try:
+            result = fn(remaining)
+        except Exception as exc:
+            kind = classify_error(exc)
+            if kind not in RETRYABLE_KINDS:
+                breaker.release_probe()
+                logger.warning("bedrock_call_not_retryable", operation=operation, kind=kind)
+                raise
+            breaker.record_failure()
+            if kind == THROTTLE:
+                backoff.on_throttle()
+            if attempt >= max_attempts:
+                logger.warning(
+                    "bedrock_call_attempts_exhausted",
+                    operation=operation,
+                    kind=kind,
+                    attempts=attempt,
+                )
+                raise
+            delay = backoff.delay(attempt)
+            remaining = deadline_seconds - (clock() - start)
+            if delay >= remaining:
+                logger.warning("bedrock_call_deadline_exhausted", operation=operation, kind=kind)
+                raise DeadlineExceededError(
+                    f"{operation} exceeded {deadline_seconds:.0f}s deadline"
+                ) from exc
+            logger.info(
+                "bedrock_call_retry",
+                operation=operation,
+                kind=kind,
+                attempt=attempt,
+                delay_sec=round(delay, 2),
+            )
+            sleep(delay)
+            continue
+        breaker.record_success()
+        backoff.on_success()
+        return result
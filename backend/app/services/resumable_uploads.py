@@ -0,0 +1,251 @@
+"""Resumable receipt uploads for slow or flaky clients.
+
+A client creates an upload (declared size and content type), sends byte ranges with
+PUT, asks for the received offset after a dropped connection, and finalizes the upload
+into the normal receipt pipeline. Received bytes live in demo/uploads/{id}.part next
+to a small JSON record; whatever arrived before a connection dropped is kept, so the
+client resumes from the last byte the server has. Uploads untouched for
+RESUMABLE_UPLOAD_TTL_SECONDS expire and are purged.
+"""
+
+import asyncio
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services.storage import ensure_dir, read_json, uploads_dir, write_json
+from app.services.upload_stream import ReceiptUpload, UploadSink, check_media_type
+
+logger = get_logger(__name__)
+
+_UPLOAD_ID_RE = re.compile(r"^up_[0-9a-f]{16}$")
+_SNIFF_BYTES = 16
+_ASSEMBLE_CHUNK_BYTES = 64 * 1024
+
+# One request (PUT, complete or delete) per upload at a time; a concurrent one gets 409
+_active: set[str] = set()
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def claim(upload_id: str) -> Iterator[None]:
+    """Hold an upload for the current request; 409 if another request holds it."""
+    with _active_lock:
+        if upload_id in _active:
+            raise HTTPException(status_code=409, detail="Another request for this upload is in progress.")
+        _active.add(upload_id)
+    try:
+        yield
+    finally:
+        with _active_lock:
+            _active.discard(upload_id)
+
+
+def _meta_path(upload_id: str) -> Path:
+    return uploads_dir() / f"{upload_id}.json"
+
+
+def _part_path(upload_id: str) -> Path:
+    return uploads_dir() / f"{upload_id}.part"
+
+
+def _offset(upload_id: str) -> int:
+    path = _part_path(upload_id)
+    return path.stat().st_size if path.exists() else 0
+
+
+def _status(meta: dict) -> dict:
+    return {
+        "upload_id": meta["upload_id"],
+        "offset": _offset(meta["upload_id"]),
+        "size": meta["size"],
+        "content_type": meta["content_type"],
+        "expires_at": meta["expires_at"],
+    }
+
+
+def _touch(meta: dict) -> None:
+    meta["expires_at"] = time.time() + settings.resumable_upload_ttl_seconds
+    write_json(_meta_path(meta["upload_id"]), meta)
+
+
+def delete_upload(upload_id: str) -> None:
+    """Remove an upload's data and record (missing files are ignored)."""
+    for path in (_part_path(upload_id), _meta_path(upload_id)):
+        path.unlink(missing_ok=True)
+
+
+def purge_expired(now: float | None = None) -> int:
+    """Delete uploads past their expiry; returns how many were removed."""
+    directory = uploads_dir()
+    if not directory.exists():
+        return 0
+    now = time.time() if now is None else now
+    removed = 0
+    for path in directory.glob("up_*.json"):
+        upload_id = path.stem
+        try:
+            with claim(upload_id):
+                try:
+                    expired = read_json(path).get("expires_at", 0) <= now
+                except (OSError, ValueError):
+                    expired = True
+                if expired:
+                    delete_upload(upload_id)
+                    removed += 1
+        except HTTPException:
+            continue  # in use by a request
+    if removed:
+        logger.info("resumable_uploads_purged", count=removed)
+    return removed
+
+
+def _load(upload_id: str) -> dict:
+    """Upload record, or 404 if unknown or expired (expired uploads are deleted)."""
+    if not _UPLOAD_ID_RE.match(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found or expired.")
+    path = _meta_path(upload_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Upload not found or expired.")
+    meta = read_json(path)
+    if meta["expires_at"] <= time.time() and upload_id not in _active:
+        delete_upload(upload_id)
+        logger.info("resumable_upload_expired", upload_id=upload_id)
+        raise HTTPException(status_code=404, detail="Upload not found or expired.")
+    return meta
+
+
+def create_upload(size: int, content_type: str, allowed_types: set[str], max_bytes: int) -> dict:
+    """Start an upload of size bytes; 400 if the size or declared type is not acceptable."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in allowed_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid content type. Allowed: {', '.join(sorted(allowed_types))}",
+        )
+    if size <= 0 or size > max_bytes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid size. Max size: {max_bytes // (1024 * 1024)}MB",
+        )
+    purge_expired()
+    upload_id = f"up_{uuid.uuid4().hex[:16]}"
+    ensure_dir(uploads_dir())
+    _part_path(upload_id).touch()
+    meta = {"upload_id": upload_id, "size": size, "content_type": content_type}
+    _touch(meta)
+    logger.info("resumable_upload_created", upload_id=upload_id, size=size, content_type=content_type)
+    return _status(meta)
+
+
+def get_upload(upload_id: str) -> dict:
+    """Offset received so far, declared size and expiry."""
+    return _status(_load(upload_id))
+
+
+def parse_content_range(header: str | None) -> tuple[int, int | None, int | None]:
+    """(start, end_inclusive, total) from "bytes start-end/total"; 400 if malformed."""
+    match = re.match(r"^bytes (\d+)-(\d+)?/(\d+|\*)$", (header or "").strip())
+    if not match:
+        raise HTTPException(
+            status_code=400, detail="Content-Range header required: bytes <start>-<end>/<total>"
+        )
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) is not None else None
+    total = int(match.group(3)) if match.group(3) != "*" else None
+    if end is not None and end < start:
+        raise HTTPException(status_code=400, detail="Invalid Content-Range.")
+    return start, end, total
+
+
+async def append_range(
+    upload_id: str,
+    start: int,
+    chunks: AsyncIterator[bytes],
+    allowed_types: set[str],
+) -> dict:
+    """
+    Append a byte range starting at start, streaming chunks to disk as they arrive.
+
+    Bytes the server already has (start < offset) are skipped, so a client may resend
+    a range whose response it never saw. start beyond the offset is 409. If the
+    stream ends early (dropped connection) the bytes received so far are kept.
+    """
+    meta = _load(upload_id)
+    with claim(upload_id):
+        offset = _offset(upload_id)
+        if start > offset:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Range starts at {start} but only {offset} bytes received.",
+                headers={"Upload-Offset": str(offset)},
+            )
+        skip = offset - start
+        received = 0
+        with _part_path(upload_id).open("ab") as out:
+            try:
+                async for chunk in chunks:
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk = chunk[dropped:]
+                        skip -= dropped
+                    if not chunk:
+                        continue
+                    if offset + len(chunk) > meta["size"]:
+                        raise HTTPException(status_code=400, detail="Range exceeds declared upload size.")
+                    out.write(chunk)
+                    out.flush()
+                    offset += len(chunk)
+                    received += len(chunk)
+                    # Yield so other uploads progress between chunks of a fast sender
+                    await asyncio.sleep(0)
+            except (HTTPException, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                # Client went away mid-range: keep what arrived, client resumes from offset
+                logger.info("resumable_upload_interrupted", upload_id=upload_id, offset=offset, error=str(e))
+        head_end = min(_SNIFF_BYTES, meta["size"])
+        if offset >= head_end and offset - received < head_end:
+            with _part_path(upload_id).open("rb") as f:
+                head = f.read(_SNIFF_BYTES)
+            try:
+                check_media_type(head, meta["content_type"], allowed_types)
+            except HTTPException:
+                delete_upload(upload_id)
+                raise
+        _touch(meta)
+    logger.info("resumable_upload_range", upload_id=upload_id, received=received, offset=offset)
+    return _status(meta)
+
+
+def open_completed(upload_id: str, allowed_types: set[str], max_bytes: int) -> ReceiptUpload:
+    """
+    Verified, hashed ReceiptUpload for a fully received upload; 409 if bytes are missing.
+    The caller holds claim(upload_id), closes the result and deletes the upload once it
+    has been processed.
+    """
+    meta = _load(upload_id)
+    offset = _offset(upload_id)
+    if offset != meta["size"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {offset} of {meta['size']} bytes received.",
+            headers={"Upload-Offset": str(offset)},
+        )
+    sink = UploadSink(meta["content_type"], allowed_types, max_bytes)
+    try:
+        with _part_path(upload_id).open("rb") as f:
+            while chunk := f.read(_ASSEMBLE_CHUNK_BYTES):
+                sink.write(chunk)
+        return sink.finish()
+    except Exception:
+        sink.discard()
+        raise
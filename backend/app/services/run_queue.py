@@ -0,0 +1,238 @@
+"""Durable agent-run queue shared by every worker process.
+
+Runs are rows in a SQLite database (demo/queue/runs.sqlite3, or AGENT_RUN_QUEUE_DB),
+so they survive restarts and any uvicorn worker can answer a poll for any run. A worker
+claims the oldest queued run of the highest-priority lane it may take and holds a lease
+on it, renewed by heartbeats while the run executes. If the process dies the lease
+expires and the run is re-queued (up to AGENT_RUN_MAX_ATTEMPTS claims, then failed), so
+delivery is at-least-once. Claims and reaping run in IMMEDIATE transactions; WAL mode
+keeps polls from blocking writers.
+"""
+
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from app.logging_config import get_logger
+from app.services.storage import ensure_dir
+
+logger = get_logger(__name__)
+
+# Finished rows are kept this long for polls and metrics, then pruned
+_FINISHED_RETENTION_SECONDS = 7 * 24 * 3600
+_RECENT_RUNS = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    heartbeat_at REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS runs_status_lane ON runs (status, lane, enqueued_at);
+"""
+
+_COLUMNS = (
+    "run_id", "session_id", "lane", "status", "payload", "result", "attempts",
+    "lease_owner", "lease_expires", "heartbeat_at", "enqueued_at", "started_at", "finished_at",
+)
+
+
+def _row(values: tuple | None) -> dict | None:
+    if values is None:
+        return None
+    run = dict(zip(_COLUMNS, values))
+    run["payload"] = json.loads(run["payload"])
+    run["result"] = json.loads(run["result"]) if run["result"] else None
+    return run
+
+
+class RunQueue:
+    """Run state, leases and heartbeats in one SQLite file."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._ready = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A short-lived autocommit connection per call: safe across threads and processes
+        if not self._ready:
+            ensure_dir(self.db_path.parent)
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        if not self._ready:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._ready = True
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def enqueue(self, run_id: str, session_id: str, lane: str, payload: dict) -> None:
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO runs (run_id, session_id, lane, status, payload, enqueued_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (run_id, session_id, lane, json.dumps(payload), time.time()),
+            )
+
+    def get(self, run_id: str) -> dict | None:
+        if not self.db_path.exists():
+            return None
+        with self._connect() as db:
+            values = db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return _row(values)
+
+    def claim(
+        self, owner: str, lanes: tuple[str, ...], lease_seconds: float, max_attempts: int
+    ) -> dict | None:
+        """Lease the oldest queued run of the first lane in lanes that has one, or None."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._reap(db, now, max_attempts)
+                for lane in lanes:
+                    values = db.execute(
+                        f"SELECT {', '.join(_COLUMNS)} FROM runs WHERE status = 'queued' AND lane = ? "
+                        "ORDER BY enqueued_at LIMIT 1",
+                        (lane,),
+                    ).fetchone()
+                    if values is None:
+                        continue
+                    run = _row(values)
+                    db.execute(
+                        "UPDATE runs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                        "lease_expires = ?, heartbeat_at = ?, started_at = ? WHERE run_id = ?",
+                        (owner, now + lease_seconds, now, now, run["run_id"]),
+                    )
+                    db.execute("COMMIT")
+                    run.update(
+                        status="running",
+                        attempts=run["attempts"] + 1,
+                        lease_owner=owner,
+                        started_at=now,
+                    )
+                    return run
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return None
+
+    def _reap(self, db: sqlite3.Connection, now: float, max_attempts: int) -> None:
+        """Re-queue (or fail, after max_attempts) runs whose lease expired. Transaction held."""
+        expired = db.execute(
+            "SELECT run_id, attempts, lease_owner FROM runs WHERE status = 'running' AND lease_expires < ?",
+            (now,),
+        ).fetchall()
+        for run_id, attempts, owner in expired:
+            if attempts >= max_attempts:
+                result = {
+                    "status": "failed",
+                    "confirmation_id": None,
+                    "run_id": run_id,
+                    "run_log": [f"[queue] Run abandoned after {attempts} attempts (worker lease expired)"],
+                }
+                db.execute(
+                    "UPDATE runs SET status = 'failed', result = ?, lease_owner = NULL, "
+                    "lease_expires = NULL, finished_at = ? WHERE run_id = ?",
+                    (json.dumps(result), now, run_id),
+                )
+                logger.warning("agent_run_lease_expired_failed", run_id=run_id, owner=owner, attempts=attempts)
+            else:
+                db.execute(
+                    "UPDATE runs SET status = 'queued', lease_owner = NULL, lease_expires = NULL "
+                    "WHERE run_id = ?",
+                    (run_id,),
+                )
+                logger.warning("agent_run_requeued", run_id=run_id, owner=owner, attempts=attempts)
+        db.execute(
+            "DELETE FROM runs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (now - _FINISHED_RETENTION_SECONDS,),
+        )
+
+    def heartbeat(self, run_ids: list[str], owner: str, lease_seconds: float) -> list[str]:
+        """Extend leases still held by owner; returns the run ids whose lease was lost."""
+        now = time.time()
+        lost = []
+        with self._connect() as db:
+            for run_id in run_ids:
+                cursor = db.execute(
+                    "UPDATE runs SET lease_expires = ?, heartbeat_at = ? "
+                    "WHERE run_id = ? AND status = 'running' AND lease_owner = ?",
+                    (now + lease_seconds, now, run_id, owner),
+                )
+                if cursor.rowcount == 0:
+                    lost.append(run_id)
+        return lost
+
+    def finish(self, run_id: str, owner: str, result: dict) -> bool:
+        """Record the result of a leased run; False if the lease was lost to another worker."""
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE runs SET status = ?, result = ?, lease_owner = NULL, lease_expires = NULL, "
+                "finished_at = ? WHERE run_id = ? AND status = 'running' AND lease_owner = ?",
+                (result.get("status") or "failed", json.dumps(result), time.time(), run_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def position(self, run_id: str) -> int | None:
+        """1-based position among queued runs of the same lane; 0 if running; None otherwise."""
+        if not self.db_path.exists():
+            return None
+        with self._connect() as db:
+            row = db.execute("SELECT status, lane, enqueued_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None or row[0] not in ("queued", "running"):
+                return None
+            if row[0] == "running":
+                return 0
+            (ahead,) = db.execute(
+                "SELECT COUNT(*) FROM runs WHERE status = 'queued' AND lane = ? AND enqueued_at <= ?",
+                (row[1], row[2]),
+            ).fetchone()
+        return ahead
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        """{status: {lane: count}} over all rows."""
+        counts: dict[str, dict[str, int]] = {}
+        if not self.db_path.exists():
+            return counts
+        with self._connect() as db:
+            for status, lane, n in db.execute("SELECT status, lane, COUNT(*) FROM runs GROUP BY status, lane"):
+                counts.setdefault(status, {})[lane] = n
+        return counts
+
+    def running_started(self) -> list[float]:
+        """Start times of runs currently leased by any worker."""
+        if not self.db_path.exists():
+            return []
+        with self._connect() as db:
+            return [r[0] for r in db.execute("SELECT started_at FROM runs WHERE status = 'running'")]
+
+    def recent_timings(self) -> list[tuple[str, float, float | None]]:
+        """(lane, queue wait, run duration or None) for the most recently started runs."""
+        if not self.db_path.exists():
+            return []
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT lane, started_at - enqueued_at, finished_at - started_at FROM runs "
+                "WHERE started_at IS NOT NULL ORDER BY started_at DESC LIMIT ?",
+                (_RECENT_RUNS,),
+            ).fetchall()
+        return [(lane, wait, duration) for lane, wait, duration in rows]
@@ -0,0 +1,410 @@
+"""Bounded scheduler for background agent runs.
+
+A real Nova Act run holds a browser session for minutes, so runs are executed by a
+fixed number of worker threads per process (AGENT_RUN_WORKERS) claiming from the
+durable run queue (app.services.run_queue). Two lanes share it: "interactive" (a user
+waiting in the UI) is always claimed first, "bulk" (batch and backfill submissions) only
+when no interactive run is waiting and never on a process's last free worker, so a burst
+of bulk runs cannot lock users out. When a lane already has its maximum of queued runs
+the submission is refused with 429 and a Retry-After estimated from recent run durations
+and how long the running runs have already taken.
+
+While a run executes its lease is renewed by a heartbeat thread; on shutdown workers
+finish their current run and queued runs stay in the queue for the next process. A run
+whose lease was lost may already be running on another worker, so before irreversible
+work (filing the expense) the handler calls ensure_lease(), which aborts it.
+"""
+
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.services.run_queue import RunQueue
+from app.services.storage import queue_dir
+
+logger = get_logger(__name__)
+
+LANES = ("interactive", "bulk")
+
+# Executes one claimed run (dict from RunQueue.claim) and returns its result dict
+RunHandler = Callable[[dict], dict]
+
+_handler: RunHandler | None = None
+_worker_init: Callable[[], None] | None = None
+_worker_teardown: Callable[[], None] | None = None
+# (scheduler, run_id) of the queued run executing on this worker thread
+_current = threading.local()
+
+
+class LeaseLostError(RuntimeError):
+    """The run's lease was lost; another worker may be executing it."""
+
+
+def set_run_handler(handler: RunHandler) -> None:
+    """Register the function that executes claimed runs (set by the agents router)."""
+    global _handler
+    _handler = handler
+
+
+def set_worker_init(init: Callable[[], None] | None) -> None:
+    """Register a per-worker-thread warm-up (e.g. opening a browser session) run at thread start."""
+    global _worker_init
+    _worker_init = init
+
+
+def set_worker_teardown(teardown: Callable[[], None] | None) -> None:
+    """Register a per-worker-thread cleanup (e.g. closing its browser session) run when it stops."""
+    global _worker_teardown
+    _worker_teardown = teardown
+
+
+def ensure_lease() -> None:
+    """
+    Raise LeaseLostError if the queued run executing on this thread no longer holds its
+    lease (renewing it otherwise). No-op outside a scheduler worker.
+    """
+    current = getattr(_current, "run", None)
+    if current is None:
+        return
+    scheduler, run_id = current
+    if not scheduler.holds_lease(run_id):
+        raise LeaseLostError(f"Lease on run {run_id} was lost; another worker may be running it")
+
+
+class RunScheduler:
+    """Worker threads claiming runs from a RunQueue, with lane priority and metrics."""
+
+    def __init__(
+        self,
+        queue: RunQueue,
+        workers: int,
+        queue_size: int,
+        bulk_queue_size: int,
+        run_seconds: float,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 2,
+        poll_seconds: float = 2.0,
+        handler: RunHandler | None = None,
+    ):
+        self.queue = queue
+        self.workers = max(1, workers)
+        # Keep one worker for interactive runs whenever there is more than one
+        self.bulk_workers = max(1, self.workers - 1)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._capacity = {"interactive": max(0, queue_size), "bulk": max(0, bulk_queue_size)}
+        self._default_run_seconds = run_seconds
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max(1, max_attempts)
+        self._poll_seconds = poll_seconds
+        self._handler = handler
+        self._cond = threading.Condition()
+        # Claims within a process are serialized so the bulk worker limit holds exactly
+        self._claim_lock = threading.Lock()
+        self._running: dict[str, tuple[str, float]] = {}  # run_id -> (lane, start time)
+        self._busy_seconds = 0.0
+        self._created = time.monotonic()
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._lost_leases = 0
+        self._lost: set[str] = set()  # running here, but the heartbeat found the lease gone
+
+    def submit(self, run_id: str, session_id: str, payload: dict, lane: str = "interactive") -> int:
+        """
+        Persist a run and wake a worker; returns the run's position in its lane (1 = next).
+        Raises 429 with Retry-After when the lane is full, 503 after shutdown.
+        """
+        if lane not in LANES:
+            raise ValueError(f"lane must be one of {LANES}")
+        with self._cond:
+            if self._closed:
+                raise HTTPException(status_code=503, detail="Agent runner is shutting down.")
+        queued = self.queue.counts().get("queued", {}).get(lane, 0)
+        if queued >= self._capacity[lane]:
+            retry_after = self._retry_after()
+            with self._cond:
+                self._rejected += 1
+            logger.warning(
+                "agent_run_rejected", run_id=run_id, lane=lane, queued=queued, retry_after=retry_after
+            )
+            raise HTTPException(
+                status_code=429,
+                detail=f"Agent runner is busy ({lane} queue full). Retry in {retry_after}s.",
+                headers={"Retry-After": str(retry_after)},
+            )
+        self.queue.enqueue(run_id, session_id, lane, payload)
+        self.start()
+        with self._cond:
+            self._submitted += 1
+            self._cond.notify()
+        position = self.queue.position(run_id) or 0
+        logger.info("agent_run_queued", run_id=run_id, lane=lane, position=position)
+        return position
+
+    def holds_lease(self, run_id: str) -> bool:
+        """Renew the lease of a run executing here; False if it was lost (or cannot be checked)."""
+        with self._cond:
+            if run_id in self._lost:
+                return False
+        try:
+            lost = self.queue.heartbeat([run_id], self.owner, self._lease_seconds)
+        except Exception as e:
+            logger.warning("agent_run_lease_check_failed", run_id=run_id, error=str(e))
+            return False
+        if lost:
+            with self._cond:
+                self._lost.add(run_id)
+            logger.warning("agent_run_lease_check_lost", run_id=run_id, owner=self.owner)
+            return False
+        return True
+
+    def position(self, run_id: str) -> int | None:
+        """1-based queue position of a waiting run; 0 if running; None if unknown or finished."""
+        return self.queue.position(run_id)
+
+    def _run_seconds(self) -> float:
+        """Mean duration of recently finished runs (any process), else the configured estimate."""
+        durations = [d for _, _, d in self.queue.recent_timings() if d is not None]
+        return sum(durations) / len(durations) if durations else self._default_run_seconds
+
+    def _retry_after(self) -> int:
+        """Seconds until the next running run is expected to finish (frees a queue slot)."""
+        run_seconds = self._run_seconds()
+        now = time.time()
+        remaining = [run_seconds - (now - started) for started in self.queue.running_started()]
+        estimate = min(remaining) if remaining else run_seconds
+        return max(1, math.ceil(estimate))
+
+    def start(self) -> None:
+        """Start worker and heartbeat threads (idempotent)."""
+        with self._cond:
+            if self._threads or self._closed:
+                return
+            for i in range(self.workers):
+                self._threads.append(
+                    threading.Thread(target=self._work, name=f"agent-run-{i}", daemon=True)
+                )
+            self._threads.append(
+                threading.Thread(target=self._heartbeat, name="agent-run-heartbeat", daemon=True)
+            )
+            for thread in self._threads:
+                thread.start()
+        logger.info("agent_run_scheduler_started", owner=self.owner, workers=self.workers)
+
+    def _lanes(self) -> tuple[str, ...]:
+        """Lanes this process may claim from right now, highest priority first. Lock held."""
+        bulk_running = sum(1 for lane, _ in self._running.values() if lane == "bulk")
+        return LANES if bulk_running < self.bulk_workers else ("interactive",)
+
+    def _work(self) -> None:
+        if _worker_init is not None:
+            try:
+                _worker_init()
+            except Exception as e:
+                logger.warning("agent_run_worker_init_failed", error=str(e))
+        try:
+            self._serve()
+        finally:
+            if _worker_teardown is not None:
+                try:
+                    _worker_teardown()
+                except Exception as e:
+                    logger.warning("agent_run_worker_teardown_failed", error=str(e))
+
+    def _serve(self) -> None:
+        """Claim and execute runs until shutdown."""
+        while True:
+            with self._claim_lock:
+                with self._cond:
+                    if self._closed:
+                        return
+                    lanes = self._lanes()
+                try:
+                    run = self.queue.claim(self.owner, lanes, self._lease_seconds, self._max_attempts)
+                except Exception as e:
+                    logger.warning("agent_run_claim_failed", error=str(e))
+                    run = None
+                if run is not None:
+                    with self._cond:
+                        self._running[run["run_id"]] = (run["lane"], time.monotonic())
+            if run is None:
+                with self._cond:
+                    if not self._closed:
+                        self._cond.wait(self._poll_seconds)
+                continue
+            self._execute(run)
+
+    def _execute(self, run: dict) -> None:
+        run_id, lane = run["run_id"], run["lane"]
+        with self._cond:
+            started = self._running[run_id][1]
+        logger.info(
+            "agent_run_dequeued",
+            run_id=run_id,
+            lane=lane,
+            attempt=run["attempts"],
+            wait_sec=round(run["started_at"] - run["enqueued_at"], 3),
+        )
+        _current.run = (self, run_id)
+        try:
+            handler = self._handler or _handler
+            if handler is None:
+                raise RuntimeError("no agent run handler registered")
+            result = handler(run)
+        except Exception as e:
+            logger.exception("agent_run_worker_error", run_id=run_id, error=str(e))
+            result = {
+                "status": "failed",
+                "confirmation_id": None,
+                "run_id": run_id,
+                "run_log": [f"[nova-act] Background error: {e!s}"],
+            }
+        finally:
+            _current.run = None
+        try:
+            recorded = self.queue.finish(run_id, self.owner, result)
+        except Exception as e:
+            logger.exception("agent_run_finish_failed", run_id=run_id, error=str(e))
+            recorded = False
+        elapsed = time.monotonic() - started
+        with self._cond:
+            del self._running[run_id]
+            self._lost.discard(run_id)
+            self._busy_seconds += elapsed
+            self._completed += 1
+            if not recorded:
+                self._lost_leases += 1
+            # A finished bulk run may let another worker claim bulk again
+            self._cond.notify_all()
+        if not recorded:
+            logger.warning("agent_run_lease_lost", run_id=run_id, owner=self.owner)
+
+    def _heartbeat(self) -> None:
+        """Renew leases of this process's running runs every third of the lease period."""
+        interval = max(0.05, self._lease_seconds / 3)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed and not self._running, timeout=interval)
+                if self._closed and not self._running:
+                    return
+                run_ids = list(self._running)
+            if not run_ids:
+                continue
+            try:
+                lost = self.queue.heartbeat(run_ids, self.owner, self._lease_seconds)
+            except Exception as e:
+                logger.warning("agent_run_heartbeat_failed", error=str(e))
+                continue
+            with self._cond:
+                self._lost.update(lost)
+            for run_id in lost:
+                logger.warning("agent_run_heartbeat_lease_lost", run_id=run_id, owner=self.owner)
+
+    def shutdown(self, wait: bool = True, timeout: float | None = None) -> None:
+        """Stop claiming; running runs finish, queued runs stay queued for other processes."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join(timeout)
+
+    def stats(self) -> dict:
+        counts = self.queue.counts()
+        waits: dict[str, list[float]] = defaultdict(list)
+        for lane, wait, _ in self.queue.recent_timings():
+            waits[lane].append(wait)
+        run_seconds = self._run_seconds()
+        with self._cond:
+            now = time.monotonic()
+            in_flight = sum(now - started for _, started in self._running.values())
+            uptime = max(now - self._created, 1e-9)
+            return {
+                "owner": self.owner,
+                "workers": self.workers,
+                "bulk_workers": self.bulk_workers,
+                "running": sum(counts.get("running", {}).values()),
+                "local_running": len(self._running),
+                "queued": {lane: counts.get("queued", {}).get(lane, 0) for lane in LANES},
+                "capacity": dict(self._capacity),
+                "utilization": round(len(self._running) / self.workers, 3),
+                "utilization_lifetime": round(
+                    (self._busy_seconds + in_flight) / (self.workers * uptime), 3
+                ),
+                "wait_seconds": {lane: _summary(waits[lane]) for lane in LANES},
+                "run_seconds_estimate": round(run_seconds, 1),
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "lost_leases": self._lost_leases,
+            }
+
+
+def _summary(samples: list[float]) -> dict:
+    """Mean and p95 of recent queue waits."""
+    if not samples:
+        return {"avg": 0.0, "p95": 0.0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return {"avg": round(sum(ordered) / len(ordered), 3), "p95": round(p95, 3)}
+
+
+def _queue_path() -> Path:
+    if settings.agent_run_queue_db:
+        return Path(settings.agent_run_queue_db).expanduser()
+    return queue_dir() / "runs.sqlite3"
+
+
+_scheduler_lock = threading.Lock()
+_scheduler: RunScheduler | None = None
+
+
+def get_run_scheduler() -> RunScheduler:
+    """Process-wide scheduler for the current queue database (recreated if the path changes)."""
+    global _scheduler
+    path = _queue_path()
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.queue.db_path != path:
+            if _scheduler is not None:
+                _scheduler.shutdown(wait=False)
+            _scheduler = RunScheduler(
+                RunQueue(path),
+                settings.agent_run_workers,
+                settings.agent_run_queue_size,
+                settings.agent_run_bulk_queue_size,
+                settings.agent_run_estimate_seconds,
+                lease_seconds=settings.agent_run_lease_seconds,
+                max_attempts=settings.agent_run_max_attempts,
+                poll_seconds=settings.agent_run_poll_seconds,
+            )
+        return _scheduler
+
+
+def resume_run_scheduler() -> None:
+    """Start workers at startup if the queue holds runs (queued, or orphaned by a dead process)."""
+    scheduler = get_run_scheduler()
+    counts = scheduler.queue.counts()
+    if counts.get("queued") or counts.get("running"):
+        scheduler.start()
+
+
+def shutdown_run_scheduler() -> None:
+    """Stop the scheduler (application shutdown); a later submit creates a new one."""
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown(wait=True)
@@ -0,0 +1,141 @@
+"""Compact prompt encoding for capture sessions (used by real-mode inference).
+
+The full CaptureSession JSON repeats every URL, screenshot path and null field for
+each step. For the model only the action sequence matters, so this encoding:
+
+- drops nulls / empty strings and fields the model never needs (screenshot_path,
+  per-step timestamps, step_index),
+- interns URLs into a table and references them by index,
+- collapses consecutive identical actions into one entry with a ``repeat`` count,
+- enforces a token budget by eliding steps from the middle of the session
+  (deterministic: the head and tail are kept, the gap is marked with ``omitted``).
+"""
+
+import json
+from datetime import datetime
+from typing import Any
+
+from app.models import CaptureSession, CaptureStep
+
+# Rough chars-per-token ratio for English/JSON text; good enough for budgeting.
+_CHARS_PER_TOKEN = 4
+# Long element texts (e.g. whole paragraphs captured by a click) are clipped.
+_MAX_TEXT_CHARS = 120
+# Step fields kept in the compact form, mapped to their short key.
+_STEP_FIELDS = {
+    "action": "action",
+    "element_text": "text",
+    "field_label": "field",
+    "value_redacted": "value",
+}
+
+PROMPT_LEGEND = (
+    "Steps reference URLs by index into `urls`; `repeat` counts consecutive identical "
+    "actions; `omitted` marks steps elided from the middle of a long session."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count for text (ceil of chars / 4)."""
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def _clip(value: str) -> str:
+    value = value.strip()
+    if len(value) > _MAX_TEXT_CHARS:
+        return value[: _MAX_TEXT_CHARS - 1] + "…"
+    return value
+
+
+def _duration_seconds(steps: list[CaptureStep]) -> int | None:
+    """Seconds between first and last timestamped step, or None if unavailable."""
+    stamps = [s.timestamp for s in steps if s.timestamp]
+    if len(stamps) < 2:
+        return None
+    try:
+        first = datetime.fromisoformat(stamps[0].replace("Z", "+00:00"))
+        last = datetime.fromisoformat(stamps[-1].replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0, int((last - first).total_seconds()))
+
+
+def _compact_steps(steps: list[CaptureStep], urls: list[str]) -> list[dict[str, Any]]:
+    """Encode steps with interned URLs and consecutive duplicates collapsed."""
+    url_index: dict[str, int] = {}
+    out: list[dict[str, Any]] = []
+    for step in steps:
+        if step.url not in url_index:
+            url_index[step.url] = len(urls)
+            urls.append(step.url)
+        entry: dict[str, Any] = {"url": url_index[step.url]}
+        for field, key in _STEP_FIELDS.items():
+            value = getattr(step, field)
+            if value is not None and value.strip():
+                entry[key] = _clip(value)
+        if out:
+            prev = {k: v for k, v in out[-1].items() if k != "repeat"}
+            if prev == entry:
+                out[-1]["repeat"] = out[-1].get("repeat", 1) + 1
+                continue
+        out.append(entry)
+    return out
+
+
+def compact_session(session: CaptureSession) -> dict[str, Any]:
+    """Return the compact dict form of a session (no token budget applied)."""
+    urls: list[str] = []
+    steps = _compact_steps(session.steps, urls)
+    data: dict[str, Any] = {"session_id": session.session_id, "urls": urls, "steps": steps}
+    duration = _duration_seconds(session.steps)
+    if duration is not None:
+        data["duration_s"] = duration
+    if session.metadata:
+        metadata = {k: v for k, v in session.metadata.items() if v is not None and v != ""}
+        if metadata:
+            data["metadata"] = metadata
+    return data
+
+
+def _dumps(data: dict[str, Any]) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _with_kept_steps(data: dict[str, Any], keep: int) -> dict[str, Any]:
+    """Copy of data keeping ``keep`` steps (head-biased split), with an omitted marker."""
+    steps = data["steps"]
+    if keep >= len(steps):
+        return data
+    head = (keep + 1) // 2
+    tail = keep - head
+    omitted = sum(s.get("repeat", 1) for s in steps[head : len(steps) - tail])
+    kept = steps[:head] + [{"omitted": omitted}] + (steps[len(steps) - tail :] if tail else [])
+    used = sorted({s["url"] for s in kept if "url" in s})
+    remap = {old: new for new, old in enumerate(used)}
+    kept = [{**s, "url": remap[s["url"]]} if "url" in s else s for s in kept]
+    return {**data, "urls": [data["urls"][i] for i in used], "steps": kept}
+
+
+def encode_session(session: CaptureSession, token_budget: int = 0) -> str:
+    """
+    Serialize a session as compact JSON for the inference prompt.
+
+    When token_budget > 0 and the encoding exceeds it, middle steps are elided
+    (largest number of kept steps that fits, found by binary search). At least the
+    first and last step are always kept, so the result may still exceed a tiny budget.
+    """
+    data = compact_session(session)
+    text = _dumps(data)
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return text
+    lo, hi = min(2, len(data["steps"])), len(data["steps"]) - 1
+    best = _dumps(_with_kept_steps(data, lo))
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = _dumps(_with_kept_steps(data, mid))
+        if estimate_tokens(candidate) <= token_budget:
+            best = candidate
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best
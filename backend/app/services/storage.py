@@ -36,6 +36,41 @@ def runs_dir() -> Path:
     return _project_root() / "demo" / "runs"
 
 
+def uploads_dir() -> Path:
+    """Directory for partial resumable receipt uploads: demo/uploads."""
+    return _project_root() / "demo" / "uploads"
+
+
+def blobs_dir() -> Path:
+    """Content-addressed receipt files: demo/blobs."""
+    return _project_root() / "demo" / "blobs"
+
+
+def index_dir() -> Path:
+    """Directory for receipt indexes (duplicate detection): demo/index."""
+    return _project_root() / "demo" / "index"
+
+
+def queue_dir() -> Path:
+    """Durable agent-run queue database: demo/queue."""
+    return _project_root() / "demo" / "queue"
+
+
+def replay_dir() -> Path:
+    """Recorded replay scripts per agent: demo/replay."""
+    return _project_root() / "demo" / "replay"
+
+
+def learned_dir() -> Path:
+    """Learned step instructions: demo/learned."""
+    return _project_root() / "demo" / "learned"
+
+
+def checkpoints_dir() -> Path:
+    """Per-step progress of real agent runs: demo/checkpoints."""
+    return _project_root() / "demo" / "checkpoints"
+
+
 def list_workflow_session_ids() -> list[str]:
     """List session_ids of stored workflows (demo/workflows/*.workflow.json)."""
     directory = workflows_dir()
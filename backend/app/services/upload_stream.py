@@ -0,0 +1,310 @@
+"""Streaming receipt uploads: size limit, magic-byte sniffing and hashing as bytes arrive.
+
+The multipart body is parsed incrementally from the ASGI stream instead of being read
+whole, so an oversized or mislabelled upload is rejected after the first offending
+chunk. Accepted bytes are hashed (SHA-256) on the fly and spooled to a temporary file
+that moves from memory to disk past UPLOAD_SPOOL_THRESHOLD_BYTES.
+"""
+
+import hashlib
+import tempfile
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Bytes needed to recognise every signature below
+_SNIFF_BYTES = 16
+# Multipart framing (boundaries, part headers) allowed on top of the file size
+_MULTIPART_OVERHEAD_BYTES = 16 * 1024
+_TEXT_TYPES = {"text/html", "application/json", "text/plain"}
+
+
+def sniff_media_type(head: bytes) -> str | None:
+    """Media type from the file signature, or None if it is not a known binary format."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "application/zip"
+    return None
+
+
+def check_media_type(head: bytes, declared_type: str, allowed_types: set[str]) -> str:
+    """
+    Media type for an upload starting with head, or HTTPException(400).
+
+    The sniffed signature decides for binary formats; the declared type is only
+    trusted for text formats (which have no signature) and only without NUL bytes.
+    """
+    declared_type = (declared_type or "").split(";")[0].strip().lower()
+    sniffed = sniff_media_type(head)
+    if sniffed is not None:
+        media_type = sniffed
+    elif declared_type in _TEXT_TYPES and b"\x00" not in head:
+        media_type = declared_type
+    else:
+        media_type = None
+    if media_type is None or media_type not in allowed_types:
+        logger.warning("upload_rejected_content", declared_type=declared_type, sniffed=sniffed)
+        raise _content_mismatch(allowed_types)
+    return media_type
+
+
+def _content_mismatch(allowed_types: set[str]) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"File content does not match an allowed type. Allowed: {', '.join(sorted(allowed_types))}",
+    )
+
+
+class ReceiptUpload:
+    """A fully received upload: verified media type, size, SHA-256 and spooled content."""
+
+    def __init__(self, file, media_type: str, size: int, sha256: str):
+        self.file = file
+        self.media_type = media_type
+        self.size = size
+        self.sha256 = sha256
+
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class UploadSink:
+    """
+    Accepts an upload chunk by chunk; raises HTTPException(400) as soon as the size
+    limit is exceeded, the first bytes do not match an allowed type (check_media_type),
+    or a text upload contains a NUL byte anywhere.
+    """
+
+    def __init__(self, declared_type: str, allowed_types: set[str], max_bytes: int):
+        self.declared_type = declared_type
+        self.allowed_types = allowed_types
+        self.max_bytes = max_bytes
+        self.media_type: str | None = None
+        self.size = 0
+        self._head = b""
+        self._hash = hashlib.sha256()
+        self._file = tempfile.SpooledTemporaryFile(max_size=settings.upload_spool_threshold_bytes)
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            logger.warning("upload_rejected_size", received=self.size, max_bytes=self.max_bytes)
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Max size: {self.max_bytes // (1024 * 1024)}MB",
+            )
+        if self.media_type is None:
+            self._head += chunk[: _SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= _SNIFF_BYTES:
+                self.media_type = check_media_type(self._head, self.declared_type, self.allowed_types)
+        if self.media_type in _TEXT_TYPES and b"\x00" in chunk:
+            logger.warning("upload_rejected_content", declared_type=self.declared_type, nul_at=self.size)
+            raise _content_mismatch(self.allowed_types)
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self) -> ReceiptUpload:
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="Empty file.")
+        if self.media_type is None:
+            self.media_type = check_media_type(self._head, self.declared_type, self.allowed_types)
+        return ReceiptUpload(self._file, self.media_type, self.size, self._hash.hexdigest())
+
+    def discard(self) -> None:
+        self._file.close()
+
+
+def _check_multipart(request: Request, max_request_bytes: int, too_large_detail: str) -> bytes:
+    """Boundary of a multipart/form-data request; rejects by Content-Length before reading."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data upload.")
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit():
+        if int(declared_length) > max_request_bytes + _MULTIPART_OVERHEAD_BYTES:
+            raise HTTPException(status_code=400, detail=too_large_detail)
+    return boundary
+
+
+async def _file_parts(
+    request: Request, boundary: bytes, field: str
+) -> AsyncIterator[tuple[str, dict[bytes, bytes], bytes]]:
+    """
+    Yield ("begin", headers, b""), ("data", headers, chunk), ("end", headers, b"") for
+    each part named field, as the body streams in. Other form fields are skipped.
+    """
+    # Parser callbacks only collect events; they are yielded after each write so that
+    # exceptions raised by the consumer propagate from there, not from inside the parser.
+    events: list[tuple[str, bytes]] = []
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        events.append(("header", bytes(header_field).lower() + b"\x00" + bytes(header_value)))
+        header_field.clear()
+        header_value.clear()
+
+    parser = MultipartParser(
+        boundary,
+        callbacks={
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("begin", b"")),
+            "on_part_data": lambda data, start, end: events.append(("data", bytes(data[start:end]))),
+            "on_part_end": lambda: events.append(("end", b"")),
+        },
+    )
+    headers: dict[bytes, bytes] = {}
+    in_field = False
+    async for chunk in request.stream():
+        parser.write(chunk)
+        batch = list(events)
+        events.clear()
+        for kind, payload in batch:
+            if kind == "header":
+                name, _, value = payload.partition(b"\x00")
+                headers[name] = value
+            elif kind == "begin":
+                _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+                in_field = disposition.get(b"name") == field.encode()
+                if in_field:
+                    yield "begin", headers, b""
+            elif kind == "data" and in_field:
+                yield "data", headers, payload
+            elif kind == "end":
+                if in_field:
+                    yield "end", headers, b""
+                headers = {}
+                in_field = False
+
+
+def part_filename(headers: dict[bytes, bytes]) -> str | None:
+    """filename from a part's Content-Disposition header."""
+    _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+    name = disposition.get(b"filename")
+    return name.decode("utf-8", errors="replace") if name else None
+
+
+async def receive_file(
+    request: Request, allowed_types: set[str], max_bytes: int, field: str = "file"
+) -> ReceiptUpload:
+    """
+    Stream one file field of a multipart/form-data request into an UploadSink.
+
+    Rejects before reading when Content-Length already exceeds the limit. Raises
+    HTTPException(400) for a non-multipart body, a missing field, or a failed check.
+    The caller must close() the returned upload.
+    """
+    boundary = _check_multipart(
+        request, max_bytes, f"File too large. Max size: {max_bytes // (1024 * 1024)}MB"
+    )
+    sink: UploadSink | None = None
+    try:
+        async for kind, headers, payload in _file_parts(request, boundary, field):
+            if kind == "begin":
+                sink = UploadSink(
+                    headers.get(b"content-type", b"").decode("latin-1"), allowed_types, max_bytes
+                )
+            elif kind == "data":
+                sink.write(payload)
+            else:
+                break
+        if sink is None:
+            raise HTTPException(status_code=400, detail=f"Missing file field '{field}'.")
+        return sink.finish()
+    except Exception:
+        if sink is not None:
+            sink.discard()
+        raise
+
+
+async def receive_files(
+    request: Request,
+    allowed_types: set[str],
+    max_bytes: int,
+    max_files: int,
+    max_total_bytes: int,
+    field: str = "files",
+) -> AsyncIterator[tuple[str, ReceiptUpload | HTTPException]]:
+    """
+    Stream every file in the given multipart field, yielding (filename, upload) as each
+    part completes, or (filename, HTTPException) for a part that failed its checks; a
+    bad file does not stop the others. The request as a whole is rejected (raised) for
+    more than max_files parts or more than max_total_bytes. Callers close() uploads.
+    """
+    boundary = _check_multipart(
+        request,
+        max_total_bytes,
+        f"Request too large. Max total size: {max_total_bytes // (1024 * 1024)}MB",
+    )
+    sink: UploadSink | None = None
+    error: HTTPException | None = None
+    filename = ""
+    count = 0
+    total = 0
+    try:
+        async for kind, headers, payload in _file_parts(request, boundary, field):
+            if kind == "begin":
+                count += 1
+                if count > max_files:
+                    raise HTTPException(status_code=400, detail=f"Too many files. Max files: {max_files}")
+                filename = part_filename(headers) or f"file_{count}"
+                error = None
+                sink = UploadSink(
+                    headers.get(b"content-type", b"").decode("latin-1"), allowed_types, max_bytes
+                )
+            elif kind == "data":
+                total += len(payload)
+                if total > max_total_bytes:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Request too large. Max total size: {max_total_bytes // (1024 * 1024)}MB",
+                    )
+                if error is None:
+                    try:
+                        sink.write(payload)
+                    except HTTPException as e:
+                        error = e
+                        sink.discard()
+            else:
+                if error is None:
+                    try:
+                        upload = sink.finish()
+                    except HTTPException as e:
+                        error = e
+                        sink.discard()
+                sink = None
+                yield filename, error if error is not None else upload
+    except BaseException:
+        if sink is not None:
+            sink.discard()
+        raise
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Offline receipt backfill: run receipt → session → workflow over a directory, no HTTP.
+
+Walks DIRECTORY recursively for receipt files (images, PDF, HTML, JSON, text), runs
+each through the same pipeline as POST /api/capture/receipt (parse_receipt or the
+e-receipt parser, then infer_workflow) on a thread or process pool, and writes sessions
+and workflows through the storage layer (demo/sessions, demo/workflows).
+
+Progress is checkpointed to a JSONL file after every receipt; re-running the same
+command skips receipts already processed (same path and content hash) and retries
+failures. Prints throughput and latency percentiles at the end.
+
+Uses NOVA_MODE / AWS settings from the environment or backend/.env like the server.
+
+Usage:
+  From repo root:  python backend/scripts/backfill_receipts.py ~/receipts --concurrency 8
+  From backend/:   python scripts/backfill_receipts.py ~/receipts --executor process
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import mimetypes
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+_SCRIPT_DIR = Path(__file__).resolve().parent
+_BACKEND_DIR = _SCRIPT_DIR.parent
+sys.path.insert(0, str(_BACKEND_DIR))
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services.receipt_pipeline import (  # noqa: E402
+    ALLOWED_CONTENT_TYPES,
+    MAX_FILE_BYTES,
+    process_receipt,
+)
+from app.services.upload_stream import check_media_type  # noqa: E402
+
+CHECKPOINT_NAME = ".backfill_checkpoint.jsonl"
+PROGRESS_EVERY = 10
+
+
+def _process_file(path_str: str) -> dict:
+    """Worker: run one receipt through the pipeline; never raises."""
+    path = Path(path_str)
+    t0 = time.perf_counter()
+    record = {"path": path_str, "status": "error"}
+    try:
+        body = path.read_bytes()
+        record["sha256"] = hashlib.sha256(body).hexdigest()
+        if len(body) > MAX_FILE_BYTES:
+            raise HTTPException(status_code=400, detail="File too large")
+        declared = mimetypes.guess_type(path.name)[0] or ""
+        media_type = check_media_type(body[:16], declared, ALLOWED_CONTENT_TYPES)
+        result = process_receipt(body, media_type, len(body), record["sha256"], source="backfill")
+        record.update(status="ok", session_id=result["session_id"])
+    except HTTPException as e:
+        record["error"] = f"{e.status_code}: {e.detail}"
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency_sec"] = round(time.perf_counter() - t0, 4)
+    return record
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_checkpoint(path: Path) -> dict[str, str]:
+    """{receipt path: sha256} for receipts that completed successfully."""
+    done: dict[str, str] = {}
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line after a crash
+            if record.get("status") == "ok":
+                done[record["path"]] = record.get("sha256", "")
+    return done
+
+
+def _find_receipts(directory: Path) -> list[Path]:
+    return sorted(
+        p for p in directory.rglob("*")
+        if p.is_file() and not p.name.startswith(".")
+    )
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct * len(ordered) / 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _print_summary(records: list[dict], skipped: int, elapsed: float) -> None:
+    ok = [r for r in records if r["status"] == "ok"]
+    failed = [r for r in records if r["status"] != "ok"]
+    latencies = [r["latency_sec"] for r in records]
+    print()
+    print("--- Backfill summary ---")
+    print(f"  processed:  {len(records)} ({len(ok)} ok, {len(failed)} failed)")
+    print(f"  skipped:    {skipped} (already in checkpoint)")
+    print(f"  elapsed:    {elapsed:.2f}s")
+    rate = len(records) / elapsed if elapsed > 0 else 0.0
+    print(f"  throughput: {rate:.2f} receipts/s")
+    if latencies:
+        print(
+            "  latency:    "
+            f"p50 {_percentile(latencies, 50):.3f}s  "
+            f"p90 {_percentile(latencies, 90):.3f}s  "
+            f"p99 {_percentile(latencies, 99):.3f}s  "
+            f"max {max(latencies):.3f}s"
+        )
+    for r in failed[:10]:
+        print(f"  FAILED {r['path']}: {r.get('error')}", file=sys.stderr)
+    if len(failed) > 10:
+        print(f"  ... and {len(failed) - 10} more failures (see checkpoint)", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline receipt → session → workflow backfill.")
+    parser.add_argument("directory", type=Path, help="Directory of receipt files (searched recursively)")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.bulk_receipt_workers,
+        help="Receipts processed at once (default: BULK_RECEIPT_WORKERS)",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=("thread", "process"),
+        default="thread",
+        help="thread (default; Nova calls are I/O-bound) or process (CPU-heavy local parsing)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=None,
+        help=f"Checkpoint file (default: DIRECTORY/{CHECKPOINT_NAME})",
+    )
+    parser.add_argument("--limit", type=int, default=0, help="Process at most N receipts (0 = all)")
+    args = parser.parse_args()
+
+    directory = args.directory.expanduser().resolve()
+    if not directory.is_dir():
+        print(f"Not a directory: {directory}", file=sys.stderr)
+        sys.exit(1)
+    checkpoint = (args.checkpoint or directory / CHECKPOINT_NAME).resolve()
+    done = _load_checkpoint(checkpoint)
+
+    todo: list[Path] = []
+    skipped = 0
+    for path in _find_receipts(directory):
+        if path == checkpoint:
+            continue
+        key = str(path)
+        if key in done and done[key] == _sha256(path):
+            skipped += 1
+            continue
+        todo.append(path)
+    if args.limit:
+        todo = todo[: args.limit]
+    print(f"NOVA_MODE = {settings.nova_mode}")
+    print(f"{len(todo)} receipts to process, {skipped} already done; concurrency {args.concurrency} ({args.executor})")
+
+    pool_cls = ProcessPoolExecutor if args.executor == "process" else ThreadPoolExecutor
+    records: list[dict] = []
+    t0 = time.perf_counter()
+    queue = iter(todo)
+    pending: set[Future] = set()
+    interrupted = False
+    with pool_cls(max_workers=max(1, args.concurrency)) as pool, checkpoint.open("a", encoding="utf-8") as out:
+
+        def checkpoint_record(future: Future) -> None:
+            record = future.result()
+            records.append(record)
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        try:
+            # Keep at most 2x concurrency submitted so an interrupt loses little queued work
+            while True:
+                while len(pending) < 2 * max(1, args.concurrency):
+                    path = next(queue, None)
+                    if path is None:
+                        break
+                    pending.add(pool.submit(_process_file, str(path)))
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.discard(future)
+                    checkpoint_record(future)
+                    if len(records) % PROGRESS_EVERY == 0:
+                        rate = len(records) / (time.perf_counter() - t0)
+                        print(f"  {len(records)}/{len(todo)} done ({rate:.2f}/s)")
+        except KeyboardInterrupt:
+            interrupted = True
+            print("\nInterrupted; finishing in-flight receipts (progress is checkpointed)...")
+            for future in pending:
+                future.cancel()
+            # Receipts already running still create sessions: checkpoint them so a re-run skips them
+            finished, _ = wait(pending)
+            for future in finished:
+                if not future.cancelled() and future.exception() is None:
+                    checkpoint_record(future)
+    _print_summary(records, skipped, time.perf_counter() - t0)
+    if interrupted:
+        sys.exit(130)
+    if any(r["status"] != "ok" for r in records):
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
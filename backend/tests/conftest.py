@@ -15,3 +15,12 @@ from app.main import app
 @pytest.fixture
 def client() -> TestClient:
     return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limit():
+    """Each test starts with empty per-IP rate-limit buckets."""
+    from app import main
+
+    main._rate_buckets.clear()
+    yield
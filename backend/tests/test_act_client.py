@@ -1,35 +1,20 @@
-"""Tests for Nova Act client: _interpolate_instruction, _workflow_to_parameter_schema, mock create/run."""
+"""Tests for Nova Act client: _workflow_to_parameter_schema, mock create/run."""
+import contextlib
+import sys
+import types
+
+import boto3
+import pytest
+
 from app.models import ActAgentSpec, InferredWorkflow, WorkflowParameter, WorkflowStep
+from app.services import act_client
 from app.services.act_client import (
     ActClientMock,
-    _interpolate_instruction,
+    _ensure_workflow_definition,
     _workflow_to_parameter_schema,
 )
 
 
-class TestInterpolateInstruction:
-    def test_empty_uses_parameters_returns_instruction(self):
-        assert _interpolate_instruction("Do the thing", [], {}) == "Do the thing"
-
-    def test_appends_param_values(self):
-        out = _interpolate_instruction(
-            "Fill amount",
-            ["amount", "date"],
-            {"amount": "100", "date": "2025-02-20"},
-        )
-        assert "amount: 100" in out
-        assert "date: 2025-02-20" in out
-
-    def test_skips_missing_or_empty(self):
-        out = _interpolate_instruction(
-            "Fill",
-            ["a", "b"],
-            {"a": "x", "b": ""},
-        )
-        assert "a: x" in out
-        assert "b:" not in out or "b: " in out  # empty skipped
-
-
 class TestWorkflowToParameterSchema:
     def test_minimal_workflow(self):
         w = InferredWorkflow(
@@ -86,3 +71,85 @@ class TestActClientMock:
         assert result.confirmation_id is not None
         assert "EXP-" in (result.confirmation_id or "")
         assert len(result.run_log) >= 1
+
+
+class FakeNovaActService:
+    """boto3 nova-act client stand-in that counts calls and introspections."""
+
+    class ResourceNotFoundException(Exception):
+        pass
+
+    def __init__(self, exists: bool = True):
+        self.exists = exists
+        self.calls: list[str] = []
+        self.exceptions = types.SimpleNamespace(ResourceNotFoundException=self.ResourceNotFoundException)
+        shape = types.SimpleNamespace(members={"workflowDefinitionName": None})
+        self._service_model = types.SimpleNamespace(
+            operation_model=lambda op: self.calls.append(f"introspect:{op}")
+            or types.SimpleNamespace(input_shape=shape)
+        )
+
+    def get_workflow_definition(self, **kwargs):
+        self.calls.append("get")
+        if not self.exists:
+            raise self.ResourceNotFoundException()
+
+    def create_workflow_definition(self, **kwargs):
+        self.calls.append("create")
+        self.exists = True
+
+
+class TestWorkflowDefinitionCache:
+    @pytest.fixture
+    def service(self, monkeypatch):
+        service = FakeNovaActService(exists=False)
+        created = []
+        monkeypatch.setattr(boto3, "client", lambda *a, **k: created.append(a) or service)
+        monkeypatch.setattr(act_client, "_definition_client", None)
+        monkeypatch.setattr(act_client, "_definition_keys", None)
+        monkeypatch.setattr(act_client, "_definition_ready", False)
+        service.clients_created = created
+        return service
+
+    def test_resolved_once_per_process(self, service):
+        for _ in range(3):
+            _ensure_workflow_definition()
+        assert service.calls == [
+            "introspect:GetWorkflowDefinition",
+            "introspect:CreateWorkflowDefinition",
+            "get",
+            "create",
+        ]
+        assert len(service.clients_created) == 1
+
+    def test_refresh_reuses_client_and_params(self, service):
+        _ensure_workflow_definition()
+        service.calls.clear()
+        service.exists = False
+        _ensure_workflow_definition(refresh=True)
+        assert service.calls == ["get", "create"]
+        assert len(service.clients_created) == 1
+
+    def test_missing_definition_on_open_refreshes_and_retries(self, service, monkeypatch):
+        opened = []
+
+        @contextlib.contextmanager
+        def workflow(**kwargs):
+            if not opened:
+                opened.append("missing")
+                raise service.ResourceNotFoundException("workflow definition not found")
+            yield "wf"
+
+        @contextlib.contextmanager
+        def nova_act_browser(**kwargs):
+            opened.append("browser")
+            yield "nova"
+
+        module = types.ModuleType("nova_act")
+        module.Workflow, module.NovaAct = workflow, nova_act_browser
+        monkeypatch.setitem(sys.modules, "nova_act", module)
+        session = act_client._open_browser_session()
+        assert session.nova == "nova"
+        assert opened == ["missing", "browser"]
+        # Initial resolve, then a refresh after the not-found error
+        assert service.calls.count("get") == 2
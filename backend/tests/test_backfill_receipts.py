@@ -0,0 +1,18 @@
+"""Tests for the offline receipt backfill script's summary statistics."""
+import importlib.util
+from pathlib import Path
+
+_SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "backfill_receipts.py"
+_spec = importlib.util.spec_from_file_location("backfill_receipts", _SCRIPT)
+backfill = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backfill)
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(10, 0, -1)]  # 1..10, unsorted
+    assert backfill._percentile(values, 50) == 5.0
+    assert backfill._percentile(values, 90) == 9.0
+    assert backfill._percentile(values, 99) == 10.0
+    assert backfill._percentile(values, 1) == 1.0
+    assert backfill._percentile([float(v) for v in range(1, 101)], 7) == 7.0
+    assert backfill._percentile([], 50) == 0.0
@@ -0,0 +1,44 @@
+"""Tests for multi-expense batch runs (POST /api/agents/{session_id}/run/batch)."""
+import pytest
+
+from app.config import settings
+from app.services import storage
+
+SPEC = {
+    "agent_id": "agent_batch",
+    "name": "Expense",
+    "description": "Submit expense",
+    "steps": [
+        {"order": 1, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount"]},
+        {"order": 2, "intent": "submit_form", "instruction": "Submit"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def tmp_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    storage.write_json(storage.agents_dir() / "sess_batch.agent.json", SPEC)
+    return tmp_path
+
+
+def test_mock_batch_returns_per_item_results(client):
+    items = [{"amount": "10.00"}, {"amount": "20.00"}, {"amount": "30.00"}]
+    r = client.post("/api/agents/sess_batch/run/batch", json={"items": items})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["status"] == "completed"
+    assert data["succeeded"] == 3 and data["failed"] == 0
+    assert [item["confirmation_id"].startswith("EXP-2026-") for item in data["results"]] == [True] * 3
+    # The batch and every item can be polled like a run
+    for run_id in [data["run_id"]] + [item["run_id"] for item in data["results"]]:
+        poll = client.get(f"/api/agents/sess_batch/run/{run_id}")
+        assert poll.status_code == 200
+
+
+def test_batch_validation(client, monkeypatch):
+    assert client.post("/api/agents/missing/run/batch", json={"items": [{}]}).status_code == 404
+    assert client.post("/api/agents/sess_batch/run/batch", json={"items": []}).status_code == 422
+    monkeypatch.setattr(settings, "agent_batch_max_items", 2)
+    r = client.post("/api/agents/sess_batch/run/batch", json={"items": [{}, {}, {}]})
+    assert r.status_code == 400
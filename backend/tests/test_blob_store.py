@@ -0,0 +1,145 @@
+"""Tests for the content-addressed receipt blob store and receipt file serving."""
+import hashlib
+import time
+
+import pytest
+
+from app.config import settings
+from app.services import blob_store, receipt_pipeline, storage
+from app.services.blob_store import BlobStore
+from app.services.receipt_pipeline import process_receipt
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(200))
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def tmp_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    return tmp_path
+
+
+class TestBlobStore:
+    def test_deduplicates_and_counts_references(self, tmp_path):
+        store = BlobStore(tmp_path / "blobs", budget_bytes=0)
+        assert store.put(sha(PNG), PNG, "image/png", ref="s1") is True
+        assert store.put(sha(PNG), PNG, "image/png", ref="s2") is False
+        assert store.path(sha(PNG)).read_bytes() == PNG
+        assert store.get(sha(PNG))["refs"] == ["s1", "s2"]
+        store.release(sha(PNG), "s1")
+        assert store.get(sha(PNG))["refs"] == ["s2"]
+        assert store.stats()["blobs"] == 1
+        assert store.stats()["total_bytes"] == len(PNG)
+
+    def test_evicts_unreferenced_then_least_recently_used(self, tmp_path):
+        store = BlobStore(tmp_path / "blobs", budget_bytes=350)
+        blobs = [bytes([i]) * 100 for i in range(5)]
+        store.put(sha(blobs[0]), blobs[0], "image/png", ref="s0")
+        time.sleep(0.01)
+        store.put(sha(blobs[1]), blobs[1], "image/png", ref="s1")
+        store.put(sha(blobs[2]), blobs[2], "image/png")  # unreferenced
+        store.put(sha(blobs[3]), blobs[3], "image/png", ref="s3")
+        assert store.get(sha(blobs[2])) is None
+        time.sleep(0.01)
+        store.get(sha(blobs[0]))  # s0 now more recently used than s1
+        store.put(sha(blobs[4]), blobs[4], "image/png", ref="s4")
+        assert not store.path(sha(blobs[1])).exists()
+        assert store.get(sha(blobs[0]))["evicted"] is False
+        assert store.stats()["evictions"] == 2
+        assert store.stats()["total_bytes"] <= 350
+        assert store.stats()["over_budget"] is False
+
+    def test_evicted_referenced_blob_keeps_hash_and_is_restored(self, tmp_path):
+        store = BlobStore(tmp_path / "blobs", budget_bytes=150)
+        first, second = b"a" * 100, b"b" * 100
+        store.put(sha(first), first, "image/png", ref="s1")
+        store.put(sha(second), second, "image/png", ref="s2")
+        meta = store.get(sha(first))
+        assert meta["evicted"] is True and meta["refs"] == ["s1"]
+        assert not store.path(sha(first)).exists()
+        assert BlobStore(tmp_path / "blobs", budget_bytes=150).get(sha(first))["evicted"] is True
+
+        assert store.put(sha(first), first, "image/png", ref="s3") is True
+        assert store.path(sha(first)).read_bytes() == first
+        assert store.get(sha(first))["refs"] == ["s1", "s3"]
+        assert store.get(sha(second))["evicted"] is True
+        assert store.stats()["total_bytes"] == 100
+
+    def test_releasing_last_ref_of_evicted_blob_forgets_it(self, tmp_path):
+        store = BlobStore(tmp_path / "blobs", budget_bytes=150)
+        first, second = b"a" * 100, b"b" * 100
+        store.put(sha(first), first, "image/png", ref="s1")
+        store.put(sha(second), second, "image/png", ref="s2")
+        store.release(sha(first), "s1")
+        assert store.get(sha(first)) is None
+        assert store.stats()["evicted_files"] == 0
+
+    def test_reloads_from_disk(self, tmp_path):
+        BlobStore(tmp_path / "blobs", budget_bytes=0).put(sha(PNG), PNG, "image/png", ref="s1")
+        reloaded = BlobStore(tmp_path / "blobs", budget_bytes=0)
+        assert reloaded.get(sha(PNG))["media_type"] == "image/png"
+        assert reloaded.stats()["total_bytes"] == len(PNG)
+
+    def test_rejects_non_hash_keys(self, tmp_path):
+        with pytest.raises(ValueError):
+            BlobStore(tmp_path / "blobs", budget_bytes=0).put("../../etc", PNG, "image/png")
+
+
+class TestReceiptPipeline:
+    def test_budget_enforced_for_session_receipts(self, monkeypatch, client):
+        monkeypatch.setattr(settings, "blob_store_budget_bytes", len(PNG) + 50)
+        monkeypatch.setattr(blob_store, "_store", None)
+        older, newer = PNG, PNG + b"\x00"
+        older_session = process_receipt(older, "image/png", len(older), sha(older))["session_id"]
+        process_receipt(newer, "image/png", len(newer), sha(newer))
+        store = blob_store.get_blob_store()
+        assert store.stats()["total_bytes"] <= len(PNG) + 50
+        meta = store.get(sha(older))
+        assert meta["evicted"] is True and meta["refs"] == [older_session]
+
+        r = client.get(f"/api/capture/sessions/{older_session}/receipt")
+        assert r.status_code == 404
+        assert "upload the receipt again" in r.json()["detail"]
+        process_receipt(older, "image/png", len(older), sha(older))
+        assert client.get(f"/api/capture/sessions/{older_session}/receipt").content == older
+
+    def test_reference_released_when_session_is_not_written(self, monkeypatch):
+        monkeypatch.setattr(blob_store, "_store", None)
+
+        def fail(path, data):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(receipt_pipeline, "write_json", fail)
+        with pytest.raises(OSError):
+            process_receipt(PNG, "image/png", len(PNG), sha(PNG))
+        assert blob_store.get_blob_store().get(sha(PNG))["refs"] == []
+
+
+class TestServing:
+    def test_session_receipt_served_with_ranges(self, client):
+        r = client.post("/api/capture/receipt", files={"file": ("r.png", PNG, "image/png")})
+        session_id = r.json()["session_id"]
+
+        r = client.get(f"/api/capture/sessions/{session_id}/receipt")
+        assert r.status_code == 200
+        assert r.content == PNG
+        assert r.headers["content-type"] == "image/png"
+        assert r.headers["etag"] == f'"{sha(PNG)}"'
+
+        r = client.get(f"/api/capture/receipt/blobs/{sha(PNG)}", headers={"Range": "bytes=0-7"})
+        assert r.status_code == 206
+        assert r.content == PNG[:8]
+
+    def test_same_file_twice_stored_once(self, client, tmp_storage):
+        for _ in range(2):
+            client.post("/api/capture/receipt", files={"file": ("r.png", PNG, "image/png")})
+        blob_files = [p for p in (tmp_storage / "demo" / "blobs").rglob("*") if p.is_file() and p.suffix != ".json"]
+        assert len(blob_files) == 1
+
+    def test_unknown_blob_is_404(self, client):
+        assert client.get("/api/capture/receipt/blobs/" + "0" * 64).status_code == 404
+        assert client.get("/api/capture/receipt/blobs/not-a-hash").status_code == 404
+        assert client.get("/api/capture/sessions/missing/receipt").status_code == 404
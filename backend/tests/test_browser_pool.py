@@ -0,0 +1,192 @@
+"""Tests for the warm Nova Act browser session pool."""
+import sys
+import threading
+import types
+
+import pytest
+
+from app.models import ActAgentSpec
+from app.services import act_client, storage
+from app.services.act_client import ActClientReal
+from app.services.browser_pool import BrowserPool, PooledSession
+
+START = "https://expense.example.com/form"
+
+
+class FakePage:
+    def __init__(self, nova):
+        self.nova = nova
+
+    def evaluate(self, script):
+        if self.nova.dead:
+            raise RuntimeError("Target closed")
+        return "complete"
+
+
+class FakeNova:
+    """Stands in for NovaAct: act(), act_get(), go_to_url() and page."""
+
+    def __init__(self):
+        self.dead = False
+        self.visited: list[str] = []
+        self.instructions: list[str] = []
+        self.page = FakePage(self)
+
+    def go_to_url(self, url):
+        if self.dead:
+            raise RuntimeError("Target closed")
+        self.visited.append(url)
+
+    def act(self, instruction):
+        self.instructions.append(instruction)
+        metadata = types.SimpleNamespace(num_steps_executed=2, time_worked_s=0.1)
+        return types.SimpleNamespace(metadata=metadata)
+
+    def act_get(self, instruction):
+        return types.SimpleNamespace(response="EXP-2026-000042")
+
+
+class Opener:
+    def __init__(self):
+        self.opened: list[FakeNova] = []
+        self.closed: list[FakeNova] = []
+
+    def __call__(self) -> PooledSession:
+        nova = FakeNova()
+        self.opened.append(nova)
+        return PooledSession(nova, lambda: self.closed.append(nova))
+
+
+def make_pool(opener, max_uses=10, max_age=0.0, enabled=True) -> BrowserPool:
+    return BrowserPool(opener, START, max_uses=max_uses, max_age_seconds=max_age, enabled=enabled)
+
+
+class TestBrowserPool:
+    def test_reuses_and_resets_session(self):
+        opener = Opener()
+        pool = make_pool(opener)
+        with pool.lease() as first:
+            pass
+        with pool.lease() as second:
+            assert second is first
+            assert second.uses == 2
+        assert len(opener.opened) == 1
+        assert opener.opened[0].visited == [START, START]
+        stats = pool.stats()
+        assert stats["leases"] == 2 and stats["warm_leases"] == 1
+        assert stats["live_sessions"] == 1
+
+    def test_recycles_after_max_uses(self):
+        opener = Opener()
+        pool = make_pool(opener, max_uses=2)
+        for _ in range(3):
+            with pool.lease():
+                pass
+        assert len(opener.opened) == 2
+        assert opener.closed == [opener.opened[0]]
+        assert pool.stats()["recycled_max_uses"] == 1
+
+    def test_unhealthy_and_broken_sessions_replaced(self):
+        opener = Opener()
+        pool = make_pool(opener)
+        pool.warm()
+        opener.opened[0].dead = True
+        with pool.lease() as session:
+            assert session.nova is opener.opened[1]
+        with pytest.raises(RuntimeError):
+            with pool.lease():
+                raise RuntimeError("browser crashed")
+        with pool.lease() as session:
+            assert session.nova is opener.opened[2]
+        stats = pool.stats()
+        assert stats["recycled_unhealthy"] == 1
+        assert stats["recycled_broken"] == 1
+
+    def test_one_session_per_thread(self):
+        opener = Opener()
+        pool = make_pool(opener)
+        seen = []
+
+        def worker():
+            for _ in range(2):
+                with pool.lease() as session:
+                    seen.append((threading.get_ident(), session))
+            pool.close_own()
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(opener.opened) == 2
+        by_thread = {}
+        for ident, session in seen:
+            by_thread.setdefault(ident, set()).add(id(session))
+        assert all(len(sessions) == 1 for sessions in by_thread.values())
+        assert len(opener.closed) == 2
+        assert pool.stats()["live_sessions"] == 0
+
+    def test_disabled_pool_opens_per_lease(self):
+        opener = Opener()
+        pool = make_pool(opener, enabled=False)
+        for _ in range(2):
+            with pool.lease():
+                pass
+        assert len(opener.opened) == 2 and len(opener.closed) == 2
+
+
+def test_real_client_runs_on_warm_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    monkeypatch.setitem(sys.modules, "nova_act", types.ModuleType("nova_act"))
+    opener = Opener()
+    pool = make_pool(opener)
+    monkeypatch.setattr(act_client, "_browser_pool", lambda: pool)
+    spec = ActAgentSpec(
+        agent_id="a1",
+        name="Expense",
+        description="d",
+        steps=[
+            {"order": 1, "intent": "navigate", "instruction": "Open form"},
+            {"order": 2, "intent": "submit_form", "instruction": "Submit"},
+        ],
+    )
+    client = ActClientReal()
+    first = client.run_agent(spec, {"amount": "1"})
+    second = client.run_agent(spec, {"amount": "2"})
+    assert first.status == second.status == "completed"
+    assert second.confirmation_id == "EXP-2026-000042"
+    assert len(opener.opened) == 1
+    assert any("Reusing warm browser session" in line for line in second.run_log)
+    assert len(opener.opened[0].instructions) == 2
+
+
+def test_real_batch_continues_on_fresh_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    monkeypatch.setitem(sys.modules, "nova_act", types.ModuleType("nova_act"))
+    opener = Opener()
+    pool = make_pool(opener)
+    monkeypatch.setattr(act_client, "_browser_pool", lambda: pool)
+    spec = ActAgentSpec(
+        agent_id="a1",
+        name="Expense",
+        description="d",
+        steps=[{"order": 1, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount"]}],
+    )
+    client = ActClientReal()
+    real_run_steps = client._run_steps
+
+    def run_steps(nova, plan, parameters, run_log, **kwargs):
+        if parameters["amount"] == "2":
+            raise RuntimeError("form rejected")
+        if parameters["amount"] == "3":
+            nova.dead = True  # browser dies after this item
+        return real_run_steps(nova, plan, parameters, run_log, **kwargs)
+
+    monkeypatch.setattr(client, "_run_steps", run_steps)
+    batch = client.run_agent_batch(spec, [{"amount": str(n)} for n in range(1, 6)])
+    assert [r.status for r in batch.results] == ["completed", "failed", "completed", "completed", "completed"]
+    assert batch.status == "partial" and batch.succeeded == 4 and batch.failed == 1
+    assert all(r.confirmation_id == "EXP-2026-000042" for r in batch.results if r.status == "completed")
+    # Items 1-3 share the first session; after it dies the rest share a second one
+    assert len(opener.opened) == 2
+    assert pool.stats()["recycled_broken"] == 1
@@ -0,0 +1,156 @@
+"""Tests for bulk receipt ingestion: multiple files, zip archives, per-file failures."""
+import asyncio
+import io
+import json
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import receipt_pipeline
+from app.services import bulk_ingest, storage
+from app.services.upload_stream import UploadSink
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+JPEG = b"\xff\xd8\xff\xe0" + b"\x01" * 64
+
+
+@pytest.fixture(autouse=True)
+def tmp_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    return tmp_path
+
+
+def ndjson(response) -> list[dict]:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def make_zip(entries: dict[str, bytes], compression: int = zipfile.ZIP_STORED) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_bulk_files_and_zip(client, tmp_storage):
+    archive = make_zip(
+        {
+            "march/taxi.png": PNG,
+            "march/notes.txt": b"Uber\n2025-03-02\nTotal: $18.20\n",
+            "march/virus.exe": b"MZ\x90\x00" + b"\x00" * 40,
+            "__MACOSX/._taxi.png": b"junk",
+        }
+    )
+    files = [
+        ("files", ("a.png", PNG, "image/png")),
+        ("files", ("b.jpg", JPEG, "image/jpeg")),
+        ("files", ("bogus.png", b"definitely not an image", "image/png")),
+        ("files", ("receipts.zip", archive, "application/zip")),
+    ]
+    r = client.post("/api/capture/receipt/bulk", files=files)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = ndjson(r)
+    summary = lines[-1]["summary"]
+    assert summary == {**summary, "files": 6, "succeeded": 4, "failed": 2}
+    by_name = {line["filename"]: line for line in lines[:-1]}
+    assert set(by_name) == {"a.png", "b.jpg", "bogus.png", "march/taxi.png", "march/notes.txt", "march/virus.exe"}
+    assert by_name["bogus.png"]["status"] == "error"
+    assert by_name["bogus.png"]["status_code"] == 400
+    assert by_name["march/virus.exe"]["status"] == "error"
+    assert by_name["march/notes.txt"]["extracted"]["amount"] == "18.20"
+    for name in ("a.png", "b.jpg", "march/taxi.png", "march/notes.txt"):
+        session_id = by_name[name]["session_id"]
+        assert (tmp_storage / "demo" / "sessions" / f"{session_id}.json").exists()
+
+
+def test_processing_failure_does_not_fail_batch(client, monkeypatch):
+    real_parse = receipt_pipeline.parse_receipt
+
+    def flaky_parse(body, media_type):
+        if media_type == "image/jpeg":
+            raise HTTPException(status_code=502, detail="Receipt extraction service unavailable.")
+        return real_parse(body, media_type)
+
+    monkeypatch.setattr(receipt_pipeline, "parse_receipt", flaky_parse)
+    files = [("files", ("a.png", PNG, "image/png")), ("files", ("b.jpg", JPEG, "image/jpeg"))]
+    lines = ndjson(client.post("/api/capture/receipt/bulk", files=files))
+    by_name = {line.get("filename"): line for line in lines}
+    assert by_name["a.png"]["status"] == "ok"
+    assert by_name["b.jpg"] == {
+        "index": 1,
+        "filename": "b.jpg",
+        "status": "error",
+        "status_code": 502,
+        "error": "Receipt extraction service unavailable.",
+    }
+
+
+def test_too_many_files_rejected(client, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "bulk_receipt_max_files", 2)
+    files = [("files", (f"{i}.png", PNG, "image/png")) for i in range(3)]
+    r = client.post("/api/capture/receipt/bulk", files=files)
+    assert r.status_code == 400
+
+
+def test_zip_entry_over_size_limit_is_cut_off():
+    archive = make_zip({"big.png": PNG + b"\x00" * 10_000, "ok.png": PNG})
+    sink = UploadSink("application/zip", {"application/zip"}, len(archive))
+    sink.write(archive)
+    items = bulk_ingest.expand_zip(sink.finish(), {"image/png"}, max_bytes=1024, max_total_bytes=10**6)
+    assert isinstance(items[0][1], HTTPException)
+    assert items[1][1].media_type == "image/png"
+    items[1][1].close()
+
+
+def test_zip_entries_share_the_request_size_budget(client, monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "bulk_receipt_max_total_bytes", 8000)
+    big = PNG + b"\x00" * 3000
+    archive = make_zip({"one.png": big, "two.png": big + b"\x01"}, zipfile.ZIP_DEFLATED)
+    files = [
+        ("files", ("plain.png", big + b"\x02", "image/png")),
+        ("files", ("receipts.zip", archive, "application/zip")),
+    ]
+    r = client.post("/api/capture/receipt/bulk", files=files)
+    assert r.status_code == 200
+    by_name = {line["filename"]: line for line in ndjson(r)[:-1]}
+    assert by_name["plain.png"]["status"] == "ok"
+    assert by_name["one.png"]["status"] == "ok"
+    assert by_name["two.png"]["status"] == "error"
+    assert "Archive too large" in by_name["two.png"]["error"]
+
+
+def test_worker_pool_bounds_concurrency(monkeypatch):
+    monkeypatch.setattr(bulk_ingest, "_executor", ThreadPoolExecutor(max_workers=2))
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def slow_process(body, media_type, size, sha256):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return {"session_id": sha256[:8]}
+
+    batch = bulk_ingest.BulkIngest(slow_process)
+    for i in range(6):
+        sink = UploadSink("image/png", {"image/png"}, 1024)
+        sink.write(PNG + bytes([i]))
+        batch.submit(f"{i}.png", sink.finish())
+
+    async def collect():
+        return [line async for line in batch.results()]
+
+    lines = asyncio.run(collect())
+    assert state["peak"] == 2
+    assert lines[-1]["summary"]["succeeded"] == 6
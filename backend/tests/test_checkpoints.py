@@ -0,0 +1,331 @@
+"""Tests for per-step run checkpoints and resuming a failed run."""
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from app.config import settings
+from app.models import ActAgentSpec
+from app.routes import agents as agents_route
+from app.services import act_client, checkpoints, instruction_cache, storage
+from app.services.act_client import ActClientReal
+from app.services.browser_pool import BrowserPool, PooledSession
+from app.services.checkpoints import load_checkpoint, open_checkpoint, resume_refusal
+from app.services.execution_plan import compile_plan
+
+SESSION = "sess_ckpt"
+STEPS = [
+    {"order": 1, "intent": "navigate", "instruction": "Open form"},
+    {"order": 2, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount"]},
+    {"order": 3, "intent": "submit_form", "instruction": "Submit"},
+    {"order": 4, "intent": "confirmation", "instruction": "Confirm"},
+]
+
+
+class NothingClicked(RuntimeError):
+    """A failed act() that reports no browser actions (e.g. the button was never found)."""
+
+    metadata = types.SimpleNamespace(num_steps_executed=0)
+
+
+class FakeNova:
+    """act() fails for instructions containing `fail_on`, with `error` (a crash by default)."""
+
+    def __init__(self, fail_on=None, error=None):
+        self.fail_on = fail_on
+        self.error = error or RuntimeError("ActAgentFailed: browser crashed")
+        self.instructions: list[str] = []
+        self.page = types.SimpleNamespace(url="https://expense.example.com/form", evaluate=lambda s: "complete")
+
+    def go_to_url(self, url):
+        pass
+
+    def act(self, instruction):
+        self.instructions.append(instruction)
+        if self.fail_on and self.fail_on in instruction:
+            raise self.error
+        return types.SimpleNamespace(metadata=types.SimpleNamespace(num_steps_executed=1, time_worked_s=0.1))
+
+    def act_get(self, instruction):
+        return types.SimpleNamespace(response="EXP-2026-000777")
+
+
+class Browsers:
+    """Opens a fresh FakeNova per lease; the first ones fail as listed."""
+
+    def __init__(self, *fail_on, error=None):
+        self.fail_on = list(fail_on)
+        self.error = error
+        self.opened: list[FakeNova] = []
+
+    def __call__(self) -> PooledSession:
+        nova = FakeNova(self.fail_on.pop(0) if self.fail_on else None, self.error)
+        self.opened.append(nova)
+        return PooledSession(nova, lambda: None)
+
+
+@pytest.fixture
+def real(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    monkeypatch.setitem(sys.modules, "nova_act", types.ModuleType("nova_act"))
+    monkeypatch.setattr(settings, "nova_act_replay", False)
+    monkeypatch.setattr(settings, "nova_act_fuse_steps", False)
+    monkeypatch.setattr(instruction_cache, "_cache", None)
+    client = ActClientReal()
+    monkeypatch.setattr(agents_route, "act_client", client)
+    spec = ActAgentSpec(agent_id="agent_c", name="Expense", description="d", steps=STEPS)
+    spec.plan = compile_plan(spec.steps)
+    storage.write_json(storage.agents_dir() / f"{SESSION}.agent.json", spec.model_dump(mode="json"))
+
+    def use(browsers: Browsers) -> Browsers:
+        pool = BrowserPool(browsers, settings.nova_act_starting_page, max_uses=10, max_age_seconds=0, enabled=False)
+        monkeypatch.setattr(act_client, "_browser_pool", lambda: pool)
+        return browsers
+
+    return client, spec, use
+
+
+def test_each_step_is_checkpointed(real):
+    client, spec, use = real
+    use(Browsers())
+    result = client.run_agent(spec, {"amount": "12"})
+    assert result.status == "completed"
+    checkpoint = load_checkpoint(result.run_id)
+    assert checkpoint.status == "completed" and checkpoint.attempts == 1
+    assert checkpoint.data["confirmation_id"] == "EXP-2026-000777"
+    assert checkpoint.data["filing_step"] == 4
+    # navigate is skipped at compile time (the session starts on the form)
+    assert {i: s["status"] for i, s in checkpoint.data["steps"].items()} == {
+        "2": "completed", "3": "completed", "4": "completed",
+    }
+    assert checkpoint.step(2)["how"] == "act"
+    assert checkpoint.step(2)["page_url"] == "https://expense.example.com/form"
+    assert resume_refusal(checkpoint).startswith("the expense was already submitted")
+
+
+def test_filing_step_that_acted_nothing_fails_run_and_resume_continues(real, client):
+    real_client, spec, use = real
+    browsers = use(Browsers("Confirm", error=NothingClicked("ActAgentFailed: button not found")))
+    failed = real_client.run_agent(spec, {"amount": "12"})
+    assert failed.status == "failed"
+    assert "Step 4 (confirmation) failed; the expense was not submitted" in failed.run_log[-1]
+    checkpoint = load_checkpoint(failed.run_id)
+    assert checkpoint.status == "failed" and checkpoint.resume_index() == 4
+    assert checkpoint.filing_state() == "not_started"
+
+    r = client.post(f"/api/agents/{SESSION}/run/{failed.run_id}/resume")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "completed" and body["confirmation_id"] == "EXP-2026-000777"
+    assert body["resume_of"] == failed.run_id and body["resume_from_step"] == 4
+    assert any("Resuming run" in line and "at step 4 (attempt 2)" in line for line in body["run_log"])
+    assert len(browsers.opened) == 2  # the resume ran in a fresh session
+    resumed = load_checkpoint(failed.run_id)
+    assert resumed.status == "completed" and resumed.attempts == 2
+    assert resumed.data["parameters"] == {"amount": "12"}
+
+    again = client.post(f"/api/agents/{SESSION}/run/{failed.run_id}/resume")
+    assert again.status_code == 409
+    assert "already submitted (confirmation EXP-2026-000777)" in again.json()["detail"]
+
+
+def test_filing_step_crash_is_in_doubt_and_not_resumed(real, client):
+    real_client, spec, use = real
+    browsers = use(Browsers("Confirm"))  # the browser crashes during Confirm
+    failed = real_client.run_agent(spec, {"amount": "12"})
+    assert failed.status == "failed"
+    assert "Step 4 (confirmation) failed after it started; the expense may have been submitted" in (
+        failed.run_log[-1]
+    )
+    checkpoint = load_checkpoint(failed.run_id)
+    assert checkpoint.step(4)["status"] == "failed_after_start"
+    assert checkpoint.filing_state() == "in_doubt"
+
+    r = client.post(f"/api/agents/{SESSION}/run/{failed.run_id}/resume")
+    assert r.status_code == 409
+    assert "may already be filed" in r.json()["detail"]
+    assert len(browsers.opened) == 1
+
+
+def test_commit_step_does_not_run_if_its_start_cannot_be_saved(real, monkeypatch):
+    real_client, spec, use = real
+    browsers = use(Browsers())
+    write_json = checkpoints.write_json
+
+    def failing_write(path, data):
+        if any(step["status"] == "started" for step in data["steps"].values()):
+            raise OSError("disk full")
+        write_json(path, data)
+
+    monkeypatch.setattr(checkpoints, "write_json", failing_write)
+    result = real_client.run_agent(spec, {"amount": "12"})
+    assert result.status == "failed" and "disk full" in result.run_log[-1]
+    assert len(browsers.opened[0].instructions) == 1  # the fill step; submit never ran
+    checkpoint = load_checkpoint(result.run_id)
+    assert checkpoint.status == "failed" and checkpoint.step(3) is None
+    assert checkpoint.filing_state() == "not_started"
+
+
+def test_filing_step_in_doubt_is_never_resumed(real, client):
+    _, spec, _ = real
+    checkpoint = open_checkpoint("run_doubt", spec.agent_id, spec.plan, {"amount": "5"})
+    filing = spec.plan.steps[-1]
+    checkpoint.step_started(filing)  # the process died while the confirm step ran
+    r = client.post(f"/api/agents/{SESSION}/run/run_doubt/resume")
+    assert r.status_code == 409
+    assert "may already be filed" in r.json()["detail"]
+
+
+def test_resume_unknown_run_or_other_agent_is_404(real, client):
+    _, spec, _ = real
+    assert client.post(f"/api/agents/{SESSION}/run/run_missing/resume").status_code == 404
+    open_checkpoint("run_other", "agent_other", spec.plan, {})
+    assert client.post(f"/api/agents/{SESSION}/run/run_other/resume").status_code == 404
+
+
+def test_real_mode_queues_resume_and_rejects_while_active(real, client, monkeypatch):
+    _, spec, _ = real
+    monkeypatch.setattr(settings, "nova_act_mode", "real")
+    submitted: dict[str, dict] = {}
+
+    def submit(run_id, session_id, payload, lane="interactive"):
+        submitted[run_id] = payload
+        return 0
+
+    queue = types.SimpleNamespace(get=lambda run_id: {"status": "queued"} if run_id in submitted else None)
+    scheduler = types.SimpleNamespace(submit=submit, queue=queue)
+    monkeypatch.setattr(agents_route, "get_run_scheduler", lambda: scheduler)
+    checkpoint = open_checkpoint("run_crashed", spec.agent_id, spec.plan, {"amount": "9"})
+    checkpoint.step_finished(spec.plan.steps[0], True, "act", 1.0, None)
+
+    r = client.post(f"/api/agents/{SESSION}/run/run_crashed/resume")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "running" and body["resume_from_step"] == 3
+    payload = submitted[body["run_id"]]
+    assert payload["resume_of"] == "run_crashed" and payload["parameters"] == {"amount": "9"}
+    assert load_checkpoint("run_crashed").data["resumed_by"] == body["run_id"]
+    # The resume is still queued: a second one is refused
+    assert client.post(f"/api/agents/{SESSION}/run/run_crashed/resume").status_code == 409
+
+
+def test_concurrent_resumes_queue_only_one_run(real, monkeypatch):
+    _, spec, _ = real
+    monkeypatch.setattr(settings, "nova_act_mode", "real")
+    submitted: dict[str, dict] = {}
+
+    def submit(run_id, session_id, payload, lane="interactive"):
+        time.sleep(0.1)  # widen the window between the checks and the enqueue
+        submitted[run_id] = payload
+        return 0
+
+    queue = types.SimpleNamespace(get=lambda run_id: {"status": "queued"} if run_id in submitted else None)
+    scheduler = types.SimpleNamespace(submit=submit, queue=queue)
+    monkeypatch.setattr(agents_route, "get_run_scheduler", lambda: scheduler)
+    checkpoint = open_checkpoint("run_clicked_twice", spec.agent_id, spec.plan, {"amount": "9"})
+    checkpoint.step_finished(spec.plan.steps[0], True, "act", 1.0, None)
+
+    outcomes: list = []
+
+    def resume():
+        try:
+            outcomes.append(agents_route.post_agent_run_resume(SESSION, "run_clicked_twice")["run_id"])
+        except agents_route.HTTPException as e:
+            outcomes.append(e.status_code)
+
+    threads = [threading.Thread(target=resume) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(outcomes, key=str) == sorted([409, *submitted], key=str)
+    assert len(submitted) == 1
+
+    # A resume run that lost its claim on the checkpoint does not run
+    calls = []
+    monkeypatch.setattr(agents_route.act_client, "run_agent", lambda *a, **kw: calls.append(a))
+    stale = agents_route._run_agent_background(
+        {
+            "session_id": SESSION,
+            "run_id": "run_stale_resume",
+            "payload": {
+                "agent_spec": spec.model_dump(mode="json"),
+                "parameters": {"amount": "9"},
+                "simulate_ui_change": False,
+                "resume_of": "run_clicked_twice",
+            },
+        }
+    )
+    assert calls == []
+    assert stale["status"] == "failed" and "has taken it over" in stale["run_log"][0]
+
+
+def redeliver(spec, run_id):
+    return agents_route._run_agent_background(
+        {
+            "session_id": SESSION,
+            "run_id": run_id,
+            "payload": {"agent_spec": spec.model_dump(mode="json"), "parameters": {}, "simulate_ui_change": False},
+        }
+    )
+
+
+def test_redelivered_run_is_not_filed_twice(real, monkeypatch):
+    _, spec, _ = real
+    checkpoint = open_checkpoint("run_redelivered", spec.agent_id, spec.plan, {"amount": "3"})
+    for step in spec.plan.steps:
+        checkpoint.step_finished(step, True, "act", 1.0, None)
+    checkpoint.finish("completed", "EXP-2026-000001")
+    calls = []
+    monkeypatch.setattr(agents_route.act_client, "run_agent", lambda *a, **kw: calls.append(a))
+
+    # The worker died before writing its result: it is rebuilt from the checkpoint
+    result = redeliver(spec, "run_redelivered")
+    assert calls == []
+    assert result["status"] == "completed" and result["confirmation_id"] == "EXP-2026-000001"
+    assert "already completed on an earlier attempt" in result["run_log"][0]
+    stored = storage.read_json(storage.runs_dir() / "run_redelivered.json")
+    assert stored["status"] == "completed"
+
+    # A stored completed result is returned as it is, never overwritten
+    stored["run_log"] = ["original log"]
+    storage.write_json(storage.runs_dir() / "run_redelivered.json", stored)
+    assert redeliver(spec, "run_redelivered")["run_log"] == ["original log"]
+    assert storage.read_json(storage.runs_dir() / "run_redelivered.json")["run_log"] == ["original log"]
+    assert calls == []
+
+
+def test_redelivered_run_in_doubt_fails_without_running(real, monkeypatch):
+    _, spec, _ = real
+    checkpoint = open_checkpoint("run_doubtful", spec.agent_id, spec.plan, {"amount": "3"})
+    checkpoint.step_started(spec.plan.steps[-1])
+    calls = []
+    monkeypatch.setattr(agents_route.act_client, "run_agent", lambda *a, **kw: calls.append(a))
+    result = redeliver(spec, "run_doubtful")
+    assert calls == []
+    assert result["status"] == "failed" and "may already be filed" in result["run_log"][0]
+
+
+def test_redelivered_batch_does_not_refile_items(real):
+    real_client, spec, use = real
+    items = [{"amount": "1"}, {"amount": "2"}, {"amount": "3"}]
+    use(Browsers())
+    first = real_client.run_agent_batch(spec, items, batch_id="batch_redo")
+    assert [r.run_id for r in first.results] == ["batch_redo_0", "batch_redo_1", "batch_redo_2"]
+    assert first.succeeded == 3
+    # The worker died before the third item filed: its checkpoint shows it not started
+    third = load_checkpoint("batch_redo_2")
+    third.data["steps"] = {}
+    third.finish("running")
+
+    browsers = use(Browsers())
+    again = real_client.run_agent_batch(spec, items, batch_id="batch_redo")
+    assert [r.status for r in again.results] == ["completed"] * 3
+    assert [r.confirmation_id for r in again.results[:2]] == [r.confirmation_id for r in first.results[:2]]
+    assert "not re-run" in again.results[0].run_log[0]
+    # Only the unfiled item ran again: one fill plus submit and confirm
+    submits = [i for i in browsers.opened[0].instructions if "Submit Expense" in i]
+    assert len(submits) == 1
+    assert load_checkpoint("batch_redo_2").attempts == 2
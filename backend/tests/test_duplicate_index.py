@@ -0,0 +1,97 @@
+"""Tests for the duplicate-expense index: upload-time flags and blocked duplicate runs."""
+import pytest
+
+from app.config import settings
+from app.services import duplicate_index, receipt_pipeline, storage
+from app.services.duplicate_index import DuplicateIndex, fingerprint
+
+TEXT_RECEIPT = b"Cafe Roma\n2025-02-20\nTotal: $45.50\n"
+HTML_RECEIPT = b"<html><body><h1>Cafe Roma</h1><p>Feb 20, 2025</p><p>Total USD 45.50</p></body></html>"
+
+
+@pytest.fixture(autouse=True)
+def tmp_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    return tmp_path
+
+
+def upload(client, content: bytes, name: str, content_type: str) -> dict:
+    r = client.post("/api/capture/receipt", files={"file": (name, content, content_type)})
+    assert r.status_code == 200
+    return r.json()
+
+
+class TestFingerprint:
+    def test_normalizes_fields(self):
+        a = {"merchant": "Cafe Roma", "date": "2025-02-20", "amount": "45.5", "currency": "usd"}
+        b = {"merchant": "CAFE  ROMA", "date": "2025-02-20T00:00:00", "amount": 45.50, "currency": "USD"}
+        assert fingerprint(a) == fingerprint(b) == "caferoma|2025-02-20|45.50|USD"
+
+    def test_incomplete_fields_have_no_fingerprint(self):
+        assert fingerprint({"merchant": "Cafe", "date": None, "amount": "1.00"}) is None
+
+
+class TestDuplicateIndex:
+    def test_image_then_fields_matches_and_reload(self, tmp_path):
+        log = tmp_path / "index.jsonl"
+        index = DuplicateIndex(log)
+        fields = {"merchant": "Cafe Roma", "date": "2025-02-20", "amount": "45.50", "currency": "USD"}
+        assert index.find("h1", fields) == ([], None)
+        index.add("s1", "h1", fields)
+        assert index.find("h1", {}) == (["s1"], "image")
+        assert index.find("h2", dict(fields, amount="45.5")) == (["s1"], "fields")
+        assert index.extracted_for_hash("h1") == fields
+
+        index.add("s2", "h2", fields)
+        index.record_run("s1", "run_1")
+        reloaded = DuplicateIndex(log)
+        assert reloaded.executed_duplicates("s2") == [("s1", "run_1")]
+        assert reloaded.executed_duplicates("s1") == []
+
+
+def test_upload_flags_duplicates(client, monkeypatch):
+    first = upload(client, TEXT_RECEIPT, "r.txt", "text/plain")
+    assert first["duplicate_of"] == []
+
+    calls = []
+    real_extract = receipt_pipeline.extract_fields
+    monkeypatch.setattr(
+        receipt_pipeline, "extract_fields", lambda b, m: calls.append(m) or real_extract(b, m)
+    )
+    same_file = upload(client, TEXT_RECEIPT, "copy.txt", "text/plain")
+    assert same_file["duplicate_of"] == [first["session_id"]]
+    assert same_file["duplicate_reason"] == "image"
+    # Identical bytes reuse the earlier extraction
+    assert calls == []
+
+    same_expense = upload(client, HTML_RECEIPT, "r.html", "text/html")
+    assert same_expense["duplicate_reason"] == "fields"
+    assert first["session_id"] in same_expense["duplicate_of"]
+
+
+def test_duplicate_run_blocked_when_enabled(client, monkeypatch):
+    monkeypatch.setattr(settings, "block_duplicate_runs", True)
+    params = {"parameters": {"amount": "45.50", "date": "2025-02-20", "category": "Meals"}}
+
+    def prepare(content, name, content_type):
+        session_id = upload(client, content, name, content_type)["session_id"]
+        assert client.post(f"/api/workflows/{session_id}/approve").status_code == 200
+        assert client.post(f"/api/agents/{session_id}/generate").status_code == 200
+        return session_id
+
+    original = prepare(TEXT_RECEIPT, "r.txt", "text/plain")
+    assert client.post(f"/api/agents/{original}/run", json=params).status_code == 200
+
+    duplicate = prepare(HTML_RECEIPT, "r.html", "text/html")
+    r = client.post(f"/api/agents/{duplicate}/run", json=params)
+    assert r.status_code == 409
+    assert original in r.json()["detail"]
+
+    r = client.post(f"/api/agents/{duplicate}/run", json={**params, "allow_duplicate": True})
+    assert r.status_code == 200
+
+
+def test_index_follows_storage_root(tmp_path, monkeypatch):
+    first = duplicate_index.get_duplicate_index()
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path / "other")
+    assert duplicate_index.get_duplicate_index() is not first
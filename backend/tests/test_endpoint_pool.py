@@ -0,0 +1,123 @@
+"""Tests for multi-region Bedrock routing against local stub endpoints (injected latency/errors)."""
+import io
+import json
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.config import Settings
+from app.services import nova_client
+from app.services.endpoint_pool import build_pool
+from app.services.hedging import HedgePolicy
+from app.services.resilience import AdaptiveBackoff, CircuitBreaker, CircuitOpenError
+
+
+class StubRegion:
+    """bedrock-runtime stand-in for one region with configurable latency and error."""
+
+    def __init__(self, region: str, latency: float = 0.0, error_code: str | None = None):
+        self.region = region
+        self.latency = latency
+        self.error_code = error_code
+        self.calls = 0
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.error_code:
+            raise ClientError(
+                {"Error": {"Code": self.error_code, "Message": "injected"},
+                 "ResponseMetadata": {"HTTPStatusCode": 429 if "Throttl" in self.error_code else 500}},
+                "InvokeModel",
+            )
+        response = {"output": {"message": {"content": [{"text": self.region}]}}, "usage": {}}
+        return {"body": io.BytesIO(json.dumps(response).encode())}
+
+
+@pytest.fixture
+def regions(monkeypatch):
+    stubs = {
+        "us-east-1": StubRegion("us-east-1"),
+        "us-west-2": StubRegion("us-west-2"),
+    }
+    pool = build_pool([(r, "nova-lite") for r in stubs], failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(nova_client, "_pool", pool)
+    monkeypatch.setattr(nova_client, "_breaker", CircuitBreaker("bedrock", 50, 60))
+    monkeypatch.setattr(nova_client, "_backoff", AdaptiveBackoff(base=0.0, cap=0.0))
+    monkeypatch.setattr(
+        nova_client,
+        "get_bedrock_runtime_client",
+        lambda read_timeout=None, region=None: stubs[region],
+    )
+    return stubs
+
+
+def test_settings_parse_endpoint_list():
+    s = Settings(bedrock_endpoints="us-east-1, eu-west-1=eu.amazon.nova-2-lite-v1:0")
+    assert s.get_bedrock_endpoints() == [
+        ("us-east-1", s.nova_model_id_lite),
+        ("eu-west-1", "eu.amazon.nova-2-lite-v1:0"),
+    ]
+    assert Settings(aws_region="ap-south-1").get_bedrock_endpoints()[0][0] == "ap-south-1"
+
+
+def test_primary_used_while_healthy(regions):
+    assert nova_client.call_nova_2_lite("hi") == "us-east-1"
+    assert regions["us-west-2"].calls == 0
+
+
+def test_fails_over_on_throttle(regions):
+    regions["us-east-1"].error_code = "ThrottlingException"
+    assert nova_client.call_nova_2_lite("hi") == "us-west-2"
+    assert regions["us-east-1"].calls == 1
+
+
+def test_hedge_goes_to_next_endpoint(regions, monkeypatch):
+    policy = HedgePolicy("inference", percentile=0.9, min_delay=0.01, budget_ratio=1.0, min_samples=1)
+    policy.record_latency(0.01)
+    monkeypatch.setitem(nova_client._hedge_policies, "inference", policy)
+    monkeypatch.setattr(nova_client.settings, "nova_hedging_enabled", True)
+    regions["us-east-1"].latency = 0.5
+    assert nova_client.call_nova_2_lite("hi") == "us-west-2"
+    assert regions["us-east-1"].calls == 1
+    assert regions["us-west-2"].calls == 1
+    assert policy.stats()["hedge_wins"] == 1
+
+
+def test_open_endpoint_is_skipped(regions):
+    regions["us-east-1"].error_code = "InternalServerException"
+    nova_client.call_nova_2_lite("a")
+    stats = {e["region"]: e for e in nova_client.get_endpoint_stats()}
+    assert stats["us-east-1"]["circuit"]["state"] == "open"
+    calls_before = regions["us-east-1"].calls
+    assert nova_client.call_nova_2_lite("c") == "us-west-2"
+    assert regions["us-east-1"].calls == calls_before
+
+
+def test_routes_to_lower_latency_endpoint(regions):
+    regions["us-east-1"].latency = 0.05
+    # Seed both endpoints with samples: primary slow, secondary fast
+    regions["us-east-1"].error_code = "ThrottlingException"
+    nova_client.call_nova_2_lite("warm-secondary")
+    regions["us-east-1"].error_code = None
+    pool = nova_client._pool
+    pool.endpoints[0].record_success(0.05)
+    pool.endpoints[1].record_success(0.001)
+    pool.endpoints[0].error_ewma = 0.0
+    assert nova_client.call_nova_2_lite("hi") == "us-west-2"
+
+
+def test_validation_error_does_not_fail_over(regions):
+    regions["us-east-1"].error_code = "ValidationException"
+    with pytest.raises(ClientError):
+        nova_client.call_nova_2_lite("hi")
+    assert regions["us-west-2"].calls == 0
+
+
+def test_all_endpoints_open_fails_fast(regions):
+    for endpoint in nova_client._pool.endpoints:
+        endpoint.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        nova_client.call_nova_2_lite("hi")
+    assert regions["us-east-1"].calls == regions["us-west-2"].calls == 0
@@ -0,0 +1,162 @@
+"""Tests for execution plans: compile at agent creation, bind per run, step fusion."""
+import types
+
+import pytest
+
+from app.config import settings
+from app.models import ActAgentSpec, InferredWorkflow, WorkflowParameter, WorkflowStep
+from app.services import act_client, storage
+from app.services.act_client import ActClientMock, ActClientReal
+from app.services.execution_plan import (
+    PLAN_VERSION,
+    bind_instruction,
+    compile_plan,
+    fuse_steps,
+    fused_instruction,
+    plan_for,
+)
+
+STEPS = [
+    {"order": 3, "intent": "upload_receipt", "instruction": "Attach receipt", "uses_parameters": ["receipt_file"]},
+    {"order": 1, "intent": "navigate", "instruction": "Open the expense form"},
+    {"order": 2, "intent": "fill_field", "instruction": "Fill amount, date", "uses_parameters": ["amount"]},
+    {"order": 4, "intent": "select_option", "instruction": " Pick project ", "uses_parameters": ["project", "code"]},
+    {"order": 5, "intent": "submit_form", "instruction": "Click Submit", "selector_hint": "#submit"},
+    {"intent": "unordered", "instruction": "ignored"},
+]
+
+
+class TestCompilePlan:
+    def test_orders_and_filters_skipped_steps(self):
+        plan = compile_plan(STEPS)
+        assert plan.version == PLAN_VERSION
+        assert plan.skipped == [{"index": 1, "intent": "navigate"}]
+        assert [(s.index, s.intent) for s in plan.steps] == [
+            (2, "fill_field"),
+            (3, "upload_receipt"),
+            (4, "select_option"),
+            (5, "submit_form"),
+        ]
+        assert [s.commit for s in plan.steps] == [False, False, False, True]
+        assert plan.steps[-1].selector_hint == "#submit"
+
+    def test_fill_field_binds_only_set_fields(self):
+        step = compile_plan(STEPS).steps[0]
+        out = bind_instruction(step, {"amount": 42.5, "date": "2026-01-05", "merchant": ""})
+        assert out == (
+            "On this expense form page, fill in the following fields: "
+            'Set the "Amount ($)" number input to "42.5". '
+            'Set the "Date" date input to "2026-01-05".'
+        )
+
+    def test_upload_receipt_falls_back_without_file(self):
+        step = compile_plan(STEPS).steps[1]
+        assert 'upload the file "r.pdf"' in bind_instruction(step, {"receipt_file": "r.pdf"})
+        assert bind_instruction(step, {"receipt_file": ""}) == "Attach receipt"
+
+    def test_generic_step_appends_set_parameters(self):
+        step = compile_plan(STEPS).steps[2]
+        assert bind_instruction(step, {"project": "Apollo", "code": 7}) == "Pick project project: Apollo code: 7"
+        assert bind_instruction(step, {"project": ""}) == "Pick project"
+        assert bind_instruction(step, {}) == "Pick project"
+
+    def test_literal_braces_in_instruction_kept(self):
+        step = compile_plan([{"order": 1, "intent": "check", "instruction": "Check {value}"}]).steps[0]
+        assert bind_instruction(step, {"value": "x"}) == "Check {value}"
+
+
+def test_plan_for_recompiles_missing_or_outdated_plan():
+    spec = ActAgentSpec(agent_id="a", name="n", description="d", steps=STEPS)
+    assert plan_for(spec).steps[0].intent == "fill_field"
+    spec.plan = compile_plan(STEPS)
+    assert plan_for(spec) is spec.plan
+    spec.plan = spec.plan.model_copy(update={"version": PLAN_VERSION - 1, "steps": []})
+    assert len(plan_for(spec).steps) == 4
+
+
+def test_mock_client_creates_and_runs_plan():
+    workflow = InferredWorkflow(
+        session_id="s1",
+        title="Expense",
+        description="Submit an expense",
+        steps=[WorkflowStep(**s) for s in STEPS[:5]],
+        parameters=[WorkflowParameter(name="amount", type="number", required=True)],
+        risk_level="low",
+        time_saved_minutes=5,
+    )
+    client = ActClientMock()
+    spec = client.create_agent(workflow)
+    assert spec.plan is not None and len(spec.plan.steps) == 4
+    result = client.run_agent(spec, {"amount": 12})
+    assert "[execute] Step 1: SKIPPED (navigate) – browser already on target page" in result.run_log
+    assert any('Step 2: fill_field – On this expense form page' in line and '"12"' in line for line in result.run_log)
+
+
+def test_run_backfills_plan_for_saved_agent(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    session_id = "sess_plan"
+    agent_path = storage.agents_dir() / f"{session_id}.agent.json"
+    storage.write_json(agent_path, {"agent_id": "a", "name": "n", "description": "d", "steps": STEPS})
+    r = client.post(f"/api/agents/{session_id}/run", json={"parameters": {"amount": 5}})
+    assert r.status_code == 200 and r.json()["status"] == "completed"
+    saved = storage.read_json(agent_path)
+    assert saved["plan"]["version"] == PLAN_VERSION
+    assert len(saved["plan"]["steps"]) == 4
+
+
+FORM_STEPS = [
+    {"order": 1, "intent": "navigate", "instruction": "Open form"},
+    {"order": 2, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount"]},
+    {"order": 3, "intent": "upload_receipt", "instruction": "Attach", "uses_parameters": ["receipt_file"]},
+    {"order": 4, "intent": "add_note", "instruction": "Add note"},
+    {"order": 5, "intent": "submit_form", "instruction": "Submit"},
+    {"order": 6, "intent": "confirmation", "instruction": "Confirm"},
+]
+
+
+class TestFuseSteps:
+    def test_groups_same_page_steps_and_isolates_commits(self):
+        steps = compile_plan(FORM_STEPS).steps
+        groups = fuse_steps(steps, 4)
+        assert [[s.index for s in g] for g in groups] == [[2, 3, 4], [5], [6]]
+        assert [[s.index for s in g] for g in fuse_steps(steps, 2)] == [[2, 3], [4], [5], [6]]
+        assert all(len(g) == 1 for g in fuse_steps(steps, 1))
+
+    def test_fused_instruction_numbers_non_empty_steps(self):
+        out = fused_instruction(["Set amount.", "  ", "Add note "])
+        assert out.endswith("1) Set amount. 2) Add note")
+
+
+class FakeNova:
+    def __init__(self, fail_fused=False):
+        self.fail_fused = fail_fused
+        self.instructions: list[str] = []
+
+    def act(self, instruction):
+        self.instructions.append(instruction)
+        if self.fail_fused and instruction.startswith("On this page, do the following"):
+            raise RuntimeError("ActAgentFailed")
+        return types.SimpleNamespace(metadata=types.SimpleNamespace(num_steps_executed=3, time_worked_s=0.1))
+
+    def act_get(self, instruction):
+        return types.SimpleNamespace(response="EXP-2026-000007")
+
+
+@pytest.mark.parametrize("fuse,fail_fused,act_calls", [(True, False, 3), (True, True, 6), (False, False, 5)])
+def test_real_steps_fused_with_per_step_fallback(monkeypatch, fuse, fail_fused, act_calls):
+    monkeypatch.setattr(settings, "nova_act_fuse_steps", fuse)
+    monkeypatch.setattr(settings, "nova_act_fuse_max_steps", 4)
+    nova = FakeNova(fail_fused)
+    run_log: list[str] = []
+    params = {"amount": 10, "receipt_file": "r.pdf"}
+    before = act_client.get_act_step_stats().get("fused" if fuse else "per_step", {}).get("runs", 0)
+    confirmation = ActClientReal()._run_steps(nova, compile_plan(FORM_STEPS), params, run_log)
+    assert confirmation == "EXP-2026-000007"
+    assert len(nova.instructions) == act_calls
+    # Submit and confirm are never fused
+    assert nova.instructions[-2].startswith('Click the "Submit Expense"')
+    assert any(f"{act_calls} act() calls for 5 steps" in line for line in run_log)
+    if fail_fused:
+        assert any("running the steps one by one" in line for line in run_log)
+    stats = act_client.get_act_step_stats()["fused" if fuse else "per_step"]
+    assert stats["runs"] == before + 1
@@ -0,0 +1,143 @@
+"""Tests for hedged requests: hedge fires on slow primary, budget cap, win/hedge rates."""
+import threading
+import time
+
+import pytest
+
+from app.services import hedging
+from app.services.hedging import HedgePolicy
+
+
+def _warm_policy(**kwargs) -> HedgePolicy:
+    params = {"percentile": 0.9, "min_delay": 0.01, "budget_ratio": 1.0, "min_samples": 5}
+    params.update(kwargs)
+    policy = HedgePolicy("test", **params)
+    for _ in range(10):
+        policy.record_latency(0.02)
+    return policy
+
+
+def test_no_hedge_without_samples():
+    policy = HedgePolicy("test", percentile=0.9, min_delay=0.01, budget_ratio=1.0)
+    assert policy.hedge_delay() is None
+    assert policy.run(lambda: "ok") == "ok"
+    assert policy.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    policy = _warm_policy()
+    calls = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            calls.append(1)
+            n = len(calls)
+        time.sleep(0.5 if n == 1 else 0.01)
+        return n
+
+    assert policy.run(fn) == 2
+    stats = policy.stats()
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["hedge_rate"] == 1.0
+    assert stats["win_rate"] == 1.0
+
+
+def test_fast_primary_not_hedged():
+    policy = _warm_policy()
+    assert policy.run(lambda: "fast") == "fast"
+    assert policy.stats()["hedged"] == 0
+
+
+def test_budget_caps_hedges():
+    policy = _warm_policy(budget_ratio=0.0)
+    assert policy.run(lambda: time.sleep(0.1) or "slow") == "slow"
+    stats = policy.stats()
+    assert stats["hedged"] == 0
+    assert stats["budget_denied"] == 1
+
+
+def test_failed_primary_falls_back_to_hedge():
+    policy = _warm_policy()
+    calls = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            calls.append(1)
+            n = len(calls)
+        if n == 1:
+            time.sleep(0.1)
+            raise RuntimeError("primary failed")
+        time.sleep(0.2)
+        return "hedge"
+
+    assert policy.run(fn) == "hedge"
+
+
+def test_both_fail_raises():
+    policy = _warm_policy()
+
+    def fn():
+        time.sleep(0.05)
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError, match="down"):
+        policy.run(fn)
+
+
+def test_hedge_fn_used_for_the_second_request():
+    policy = _warm_policy()
+    assert policy.run(lambda: time.sleep(0.5) or "primary", hedge_fn=lambda: "hedge") == "hedge"
+
+
+def test_loser_latency_is_recorded():
+    policy = _warm_policy()
+    policy.run(lambda: time.sleep(0.3) or "slow", hedge_fn=lambda: "fast")
+    deadline = time.monotonic() + 2
+    while policy.stats()["latency_samples"] < 12 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert policy.stats()["latency_samples"] == 12
+    assert max(policy._latencies) >= 0.3
+
+
+def test_pool_grows_when_every_worker_is_busy():
+    executor = hedging._ElasticExecutor(workers=2, max_workers=8)
+    barrier = threading.Barrier(3, timeout=2)
+    futures = [executor.submit(barrier.wait) for _ in range(3)]
+    for future in futures:
+        future.result(timeout=3)  # all three ran at once, so none queued behind the others
+    assert executor.workers == 4
+
+
+def test_pool_stops_growing_at_max_workers():
+    executor = hedging._ElasticExecutor(workers=1, max_workers=2)
+    release = threading.Event()
+    busy = [executor.submit(release.wait) for _ in range(2)]
+    assert executor.workers == 2
+    assert executor.submit(release.wait) is None
+    release.set()
+    for future in busy:
+        future.result(timeout=2)
+
+
+def test_full_pool_skips_hedge_and_counts_it_denied(monkeypatch):
+    executor = hedging._ElasticExecutor(workers=1, max_workers=1)
+    monkeypatch.setattr(hedging, "_executor", executor)
+    policy = _warm_policy()
+    assert policy.run(lambda: time.sleep(0.1) or "primary", hedge_fn=lambda: "hedge") == "primary"
+    stats = policy.stats()
+    assert stats["hedged"] == 0
+    assert stats["budget_denied"] == 1
+
+
+def test_full_pool_runs_call_on_caller_thread(monkeypatch):
+    executor = hedging._ElasticExecutor(workers=1, max_workers=1)
+    monkeypatch.setattr(hedging, "_executor", executor)
+    release = threading.Event()
+    blocker = executor.submit(release.wait)
+    policy = _warm_policy()
+    assert policy.run(threading.current_thread) is threading.current_thread()
+    release.set()
+    blocker.result(timeout=2)
@@ -64,3 +64,67 @@ class TestParseWorkflowJson:
         with pytest.raises(HTTPException) as exc_info:
             inference_mod._parse_workflow_json("not json at all")
         assert exc_info.value.status_code == 502
+
+
+def _workflow_json(session_id: str) -> dict:
+    return {
+        "session_id": session_id, "title": "T", "description": "D", "parameters": [],
+        "steps": [{"order": 1, "intent": "submit_form", "instruction": "Submit"}],
+        "risk_level": "low", "time_saved_minutes": 3,
+    }
+
+
+class TestInferWorkflowsBatch:
+    @pytest.fixture
+    def sessions(self):
+        from app.models import CaptureSession, CaptureStep
+
+        step = CaptureStep(step_index=0, url="/new", action="click", element_text="Submit")
+        return [CaptureSession(session_id=f"s{i}", steps=[step]) for i in range(5)]
+
+    @pytest.fixture
+    def real_mode(self, monkeypatch):
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "nova_mode", "real")
+        monkeypatch.setattr(settings, "inference_batch_size", 3)
+
+    def test_mock_mode_returns_workflow_per_session(self, sessions):
+        result = inference_mod.infer_workflows_batch(sessions)
+        assert list(result.workflows) == [s.session_id for s in sessions]
+        assert not result.errors
+
+    def test_packs_sessions_and_retries_missing_individually(self, sessions, real_mode, monkeypatch):
+        from app.services import nova_client
+
+        calls = []
+
+        def fake_call(prompt, cacheable_prefix=None):
+            calls.append(prompt)
+            if prompt.startswith(inference_mod.BATCH_PROMPT_HEADER):
+                ids = [s.session_id for s in sessions if f'"session_id":"{s.session_id}"' in prompt]
+                # Drop one session and return an invalid workflow for another
+                out = [_workflow_json(sid) for sid in ids if sid != "s1"]
+                out[-1].pop("steps")
+                return json.dumps({"workflows": out})
+            sid = next(s.session_id for s in sessions if f'"session_id":"{s.session_id}"' in prompt)
+            return json.dumps(_workflow_json(sid))
+
+        monkeypatch.setattr(nova_client, "call_nova_2_lite", fake_call)
+        result = inference_mod.infer_workflows_batch(sessions)
+        assert sorted(result.workflows) == ["s0", "s1", "s2", "s3", "s4"]
+        # Batches of 3 + 2; s1 missing and s2/s4 invalid are retried alone
+        assert result.retried == ["s1", "s2", "s4"]
+        assert len(calls) == 2 + 3
+        assert not result.errors
+
+    def test_individual_failure_reported_not_raised(self, sessions, real_mode, monkeypatch):
+        from app.services import nova_client
+
+        def failing_call(prompt, cacheable_prefix=None):
+            raise RuntimeError("throttled")
+
+        monkeypatch.setattr(nova_client, "call_nova_2_lite", failing_call)
+        result = inference_mod.infer_workflows_batch(sessions[:2])
+        assert not result.workflows
+        assert set(result.errors) == {"s0", "s1"}
@@ -0,0 +1,112 @@
+"""Tests for learned submit/confirm instructions (self-healing retries)."""
+import time
+import types
+
+import pytest
+
+from app.config import settings
+from app.services import instruction_cache, storage
+from app.services.act_client import ActClientReal
+from app.services.execution_plan import compile_plan
+from app.services.instruction_cache import InstructionCache
+
+STEPS = [
+    {"order": 1, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount"]},
+    {"order": 2, "intent": "submit_form", "instruction": "Submit"},
+]
+
+
+class ButtonNotFound(RuntimeError):
+    """Like ActAgentFailed when the agent gives up without acting (no sub-steps executed)."""
+
+    metadata = types.SimpleNamespace(num_steps_executed=0)
+
+
+class RenamedButtonNova:
+    """The Submit button was renamed: only the adapted wording finds it (unless broken)."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.instructions: list[str] = []
+
+    def act(self, instruction):
+        self.instructions.append(instruction)
+        if "Submit Expense" in instruction and (self.broken or "renamed" not in instruction):
+            time.sleep(0.02)
+            raise ButtonNotFound("ActAgentFailed: button not found")
+        return types.SimpleNamespace(metadata=types.SimpleNamespace(num_steps_executed=2, time_worked_s=0.1))
+
+    def act_get(self, instruction):
+        return types.SimpleNamespace(response="EXP-2026-000555")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    monkeypatch.setattr(settings, "nova_act_replay", False)
+    monkeypatch.setattr(settings, "nova_act_learned_instructions", True)
+    monkeypatch.setattr(settings, "nova_act_learned_max_failures", 2)
+    monkeypatch.setattr(instruction_cache, "_cache", None)
+    return instruction_cache.get_instruction_cache()
+
+
+def run(nova, agent_id="agent_l"):
+    run_log: list[str] = []
+    try:
+        ActClientReal()._run_steps(nova, compile_plan(STEPS), {"amount": 5}, run_log, agent_id=agent_id)
+    except RuntimeError as e:
+        run_log.append(f"error: {e}")
+    return run_log
+
+
+def submit_calls(nova):
+    return [i for i in nova.instructions if "Submit Expense" in i]
+
+
+def test_successful_retry_is_learned_and_used_first(cache, tmp_path):
+    first = RenamedButtonNova()
+    run(first)
+    assert len(submit_calls(first)) == 2  # failure + adapted retry
+    assert cache.stats()["learned"] == 1
+
+    second = RenamedButtonNova()
+    run_log = run(second)
+    assert len(submit_calls(second)) == 1
+    assert "renamed" in submit_calls(second)[0]
+    assert any("completed with learned instruction" in line for line in run_log)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["hit_rate"] == 0.5
+    assert stats["seconds_saved"] > 0
+
+    # Persisted: a new cache on the same file knows the instruction
+    reloaded = InstructionCache(tmp_path / "demo" / "learned" / "instructions.json", 2)
+    key = reloaded.key("agent_l", "submit_form", settings.nova_act_starting_page)
+    assert reloaded.get(key) is not None
+    # Keyed per agent
+    assert reloaded.get(reloaded.key("other", "submit_form", settings.nova_act_starting_page)) is None
+
+
+def test_failing_learned_instruction_is_demoted(cache):
+    run(RenamedButtonNova())
+    for _ in range(2):
+        nova = RenamedButtonNova(broken=True)
+        run_log = run(nova)
+        # learned wording, then the original instruction and its retry
+        assert len(submit_calls(nova)) == 3
+        assert "error: Step 2 (submit_form) failed; the expense was not submitted" in run_log
+    assert any("demoted" in line for line in run_log)
+    stats = cache.stats()
+    assert stats["demoted"] == 1 and stats["entries"] == 0
+
+    nova = RenamedButtonNova()
+    run(nova)
+    assert "renamed" not in submit_calls(nova)[0]
+
+
+def test_disabled_does_not_learn(cache, monkeypatch):
+    monkeypatch.setattr(settings, "nova_act_learned_instructions", False)
+    run(RenamedButtonNova())
+    nova = RenamedButtonNova()
+    run(nova)
+    assert len(submit_calls(nova)) == 2
+    assert cache.stats()["entries"] == 0
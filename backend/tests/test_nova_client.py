@@ -0,0 +1,93 @@
+"""Tests for Nova client prompt caching, using a local stub bedrock-runtime client."""
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.config import settings
+from app.services import nova_client
+
+
+class StubBedrockRuntime:
+    """Records invoke_model bodies; returns a Nova-shaped response with cache usage fields."""
+
+    def __init__(self, reject_cache: bool = False):
+        self.reject_cache = reject_cache
+        self.bodies: list[dict] = []
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        payload = json.loads(body)
+        self.bodies.append(payload)
+        content = payload["messages"][0]["content"]
+        has_cache_point = any("cachePoint" in block for block in content)
+        if has_cache_point and self.reject_cache:
+            raise ClientError(
+                {"Error": {"Code": "ValidationException", "Message": "cachePoint is not supported"}},
+                "InvokeModel",
+            )
+        usage = {"inputTokens": 40, "outputTokens": 5}
+        if has_cache_point:
+            # First call writes the prefix, later calls read it
+            cached = len(self.bodies) > 1
+            usage["cacheReadInputTokenCount"] = 1200 if cached else 0
+            usage["cacheWriteInputTokenCount"] = 0 if cached else 1200
+        response = {"output": {"message": {"content": [{"text": '{"ok": true}'}]}}, "usage": usage}
+        return {"body": io.BytesIO(json.dumps(response).encode())}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    nova_client.reset_prompt_cache_stats()
+    monkeypatch.setattr(settings, "nova_prompt_cache_enabled", True)
+    client = StubBedrockRuntime()
+    monkeypatch.setattr(nova_client, "get_bedrock_runtime_client", lambda **kwargs: client)
+    yield client
+    nova_client.reset_prompt_cache_stats()
+
+
+def test_prefix_sent_before_cache_point(stub):
+    assert nova_client.call_nova_2_lite("session", cacheable_prefix="instructions") == '{"ok": true}'
+    content = stub.bodies[0]["messages"][0]["content"]
+    assert content == [{"text": "instructions"}, {"cachePoint": {"type": "default"}}, {"text": "session"}]
+
+
+def test_records_cache_read_and_write_tokens(stub):
+    nova_client.call_nova_2_lite("a", cacheable_prefix="instructions")
+    nova_client.call_nova_2_lite("b", cacheable_prefix="instructions")
+    stats = nova_client.get_prompt_cache_stats()
+    assert stats["requests"] == 2
+    assert stats["cached_requests"] == 2
+    assert stats["cache_write_tokens"] == 1200
+    assert stats["cache_read_tokens"] == 1200
+
+
+def test_no_prefix_sends_plain_prompt(stub):
+    nova_client.call_nova_2_lite("just a prompt")
+    assert stub.bodies[0]["messages"][0]["content"] == [{"text": "just a prompt"}]
+    assert nova_client.get_prompt_cache_stats()["cached_requests"] == 0
+
+
+def test_disabled_inlines_prefix(stub, monkeypatch):
+    monkeypatch.setattr(settings, "nova_prompt_cache_enabled", False)
+    nova_client.call_nova_2_lite("session", cacheable_prefix="instructions")
+    assert stub.bodies[0]["messages"][0]["content"] == [{"text": "instructions\n\nsession"}]
+
+
+def test_falls_back_when_model_rejects_cache_point(stub):
+    stub.reject_cache = True
+    assert nova_client.call_nova_2_lite("session", cacheable_prefix="instructions") == '{"ok": true}'
+    assert len(stub.bodies) == 2
+    # Model is remembered: next call goes straight to the plain request
+    nova_client.call_nova_2_lite("session", cacheable_prefix="instructions")
+    assert len(stub.bodies) == 3
+    assert all("cachePoint" not in b for b in stub.bodies[2]["messages"][0]["content"])
+    assert settings.nova_model_id_lite in nova_client.get_prompt_cache_stats()["unsupported_models"]
+
+
+def test_multimodal_caches_prompt_ahead_of_image(stub):
+    nova_client.call_nova_2_lite_multimodal("extract", b"img", "image/png")
+    content = stub.bodies[0]["messages"][0]["content"]
+    assert content[0] == {"text": "extract"}
+    assert "cachePoint" in content[1]
+    assert content[2]["image"]["format"] == "png"
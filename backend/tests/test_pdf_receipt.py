@@ -0,0 +1,151 @@
+"""Tests for scanned multi-page PDF receipts: rasterization, bounded page extraction, merge."""
+import threading
+import time
+import zlib
+
+import pytest
+from fastapi import HTTPException
+
+pdfium = pytest.importorskip("pypdfium2")
+
+from app.config import settings  # noqa: E402
+from app.services import pdf_receipt  # noqa: E402
+from app.services.ereceipt_parser import parse_structured_receipt  # noqa: E402
+
+
+def make_scanned_pdf(pages: int) -> bytes:
+    """Image-only PDF (no text layer) with the given number of blank pages."""
+    import io
+
+    doc = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        doc.new_page(200, 300)
+    buf = io.BytesIO()
+    doc.save(buf)
+    doc.close()
+    return buf.getvalue()
+
+
+@pytest.fixture
+def page_extractor(monkeypatch):
+    """Replace the multimodal call with a slow fake that records peak concurrency."""
+    monkeypatch.setattr(settings, "receipt_pdf_page_concurrency", 2)
+    monkeypatch.setattr(pdf_receipt, "_extract_pool", None)
+    pdf_receipt.reset_pdf_receipt_stats()
+    state = {"active": 0, "peak": 0, "images": []}
+    lock = threading.Lock()
+
+    def fake_parse_receipt(image_bytes, media_type, extra_instructions=None):
+        assert extra_instructions == pdf_receipt.PAGE_INSTRUCTIONS
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["images"].append((image_bytes, media_type))
+        time.sleep(0.1)
+        with lock:
+            state["active"] -= 1
+        return {
+            "amount": None,
+            "merchant": "Grand Hotel",
+            "date": "2025-04-02",
+            "category": "Travel",
+            "currency": "USD",
+            "confidence": 0.9,
+            "line_items_total": "100.00",
+        }
+
+    monkeypatch.setattr(pdf_receipt, "parse_receipt", fake_parse_receipt)
+    return state
+
+
+class TestMergePageResults:
+    def test_total_from_last_page_and_line_items_summed(self):
+        pages = [
+            {"amount": None, "merchant": "Grand Hotel", "date": "2025-04-01", "category": "Travel",
+             "currency": "USD", "confidence": 0.95, "line_items_total": "200.00"},
+            {"amount": "12.00", "merchant": None, "date": None, "category": None,
+             "currency": None, "confidence": 0.6, "line_items_total": "30.50"},
+            {"amount": "1,230.50", "merchant": "Grand Hotel Folio", "date": "2025-04-03",
+             "category": "Travel", "currency": "USD", "confidence": 0.85, "line_items_total": None},
+        ]
+        merged = pdf_receipt.merge_page_results(pages)
+        assert merged["amount"] == "1230.50"
+        assert merged["merchant"] == "Grand Hotel"
+        assert merged["date"] == "2025-04-01"
+        assert merged["line_items_total"] == "230.50"
+        assert merged["pages"] == 3
+        assert merged["confidence"] == 0.85
+
+    def test_falls_back_to_line_item_sum(self):
+        pages = [
+            {"amount": None, "merchant": "Cafe", "date": "2025-01-01", "confidence": 0.9,
+             "line_items_total": "4.50"},
+            {"amount": None, "merchant": None, "date": None, "confidence": 0.9,
+             "line_items_total": "5.25"},
+        ]
+        assert pdf_receipt.merge_page_results(pages)["amount"] == "9.75"
+
+
+class TestParsePdfReceipt:
+    def test_pages_rendered_and_extracted_with_bounded_concurrency(self, page_extractor):
+        out = pdf_receipt.parse_pdf_receipt(make_scanned_pdf(4))
+        assert out["pages"] == 4
+        assert out["amount"] == "400.00"
+        assert out["line_items_total"] == "400.00"
+        assert out["merchant"] == "Grand Hotel"
+        assert page_extractor["peak"] == 2
+        png, media_type = page_extractor["images"][0]
+        assert media_type == "image/png"
+        assert png.startswith(b"\x89PNG\r\n\x1a\n")
+        stats = pdf_receipt.get_pdf_receipt_stats()
+        assert stats["documents"] == 1
+        assert stats["pages"] == 4
+        assert stats["sequential_seconds"] >= 0.4
+
+    def test_pdf_written_once_for_all_page_renders(self, monkeypatch, tmp_path, page_extractor):
+        monkeypatch.setattr(pdf_receipt.tempfile, "tempdir", str(tmp_path))
+        submitted = []
+        real_pools = pdf_receipt._pools
+
+        class RecordingPool:
+            def __init__(self, pool):
+                self._pool = pool
+
+            def submit(self, fn, *args):
+                submitted.append(args)
+                return self._pool.submit(fn, *args)
+
+        def pools():
+            render_pool, extract_pool = real_pools()
+            return RecordingPool(render_pool), extract_pool
+
+        monkeypatch.setattr(pdf_receipt, "_pools", pools)
+        assert pdf_receipt.parse_pdf_receipt(make_scanned_pdf(3))["pages"] == 3
+        assert [type(args[0]) for args in submitted] == [str] * 3
+        assert len({args[0] for args in submitted}) == 1
+        assert list(tmp_path.iterdir()) == []
+
+    def test_scanned_pdf_routed_from_structured_parser(self, page_extractor):
+        out = parse_structured_receipt(make_scanned_pdf(1), "application/pdf")
+        assert out["pages"] == 1
+        assert out["amount"] == "100.00"
+
+    def test_too_many_pages_rejected(self, monkeypatch, page_extractor):
+        monkeypatch.setattr(settings, "receipt_pdf_max_pages", 2)
+        with pytest.raises(HTTPException) as exc_info:
+            pdf_receipt.parse_pdf_receipt(make_scanned_pdf(3))
+        assert exc_info.value.status_code == 400
+        assert page_extractor["images"] == []
+
+    def test_unreadable_pdf_rejected(self):
+        with pytest.raises(HTTPException) as exc_info:
+            pdf_receipt.parse_pdf_receipt(b"%PDF-1.4 garbage")
+        assert exc_info.value.status_code == 400
+
+
+def test_encode_png_grayscale_rows():
+    png = pdf_receipt._encode_png(2, 2, 4, 1, bytes([0, 255, 9, 9, 255, 0, 9, 9]))
+    idat_start = png.index(b"IDAT") + 4
+    raw = zlib.decompress(png[idat_start:png.index(b"IEND") - 8])
+    # Each row: filter byte 0 followed by width pixels; stride padding dropped
+    assert raw == bytes([0, 0, 255, 0, 255, 0])
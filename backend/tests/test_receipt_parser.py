@@ -1,4 +1,6 @@
 """Tests for receipt parser. With NOVA_MODE=mock, parse_receipt returns fixed dict."""
+import json
+
 import pytest
 
 from app.services.receipt_parser import parse_receipt
@@ -21,3 +23,74 @@ class TestParseReceiptMock:
         assert out["amount"] == "45.50"
         assert out["merchant"] == "Demo Cafe"
         assert out["confidence"] == 0.95
+
+
+class TestTieredExtraction:
+    """Real-mode routing across model tiers with a stubbed Nova client."""
+
+    @pytest.fixture
+    def tiers(self, monkeypatch):
+        from app.config import settings
+        from app.services import nova_client, receipt_parser
+
+        monkeypatch.setattr(settings, "nova_mode", "real")
+        monkeypatch.setattr(settings, "receipt_model_tiers", "cheap=0.1/0.2,strong=1.0/2.0")
+        monkeypatch.setattr(settings, "receipt_escalation_confidence", 0.8)
+        receipt_parser.reset_receipt_routing_stats()
+        responses = {}
+        calls = []
+
+        def fake_call(prompt, image_bytes, media_type, model_id=None, usage_out=None):
+            calls.append(model_id)
+            if usage_out is not None:
+                usage_out.update({"inputTokens": 1000, "outputTokens": 100})
+            response = responses[model_id]
+            if isinstance(response, Exception):
+                raise response
+            return json.dumps(response)
+
+        monkeypatch.setattr(nova_client, "call_nova_2_lite_multimodal", fake_call)
+        yield responses, calls
+        receipt_parser.reset_receipt_routing_stats()
+
+    def test_confident_cheap_result_not_escalated(self, tiers):
+        from app.services.receipt_parser import get_receipt_routing_stats
+
+        responses, calls = tiers
+        responses["cheap"] = _receipt(0.95)
+        out = parse_receipt(b"img", "image/png")
+        assert out["confidence"] == 0.95
+        assert calls == ["cheap"]
+        stats = get_receipt_routing_stats()["tiers"]["cheap"]
+        assert stats["escalation_rate"] == 0.0
+        assert stats["total_cost_usd"] == pytest.approx(0.12)
+
+    def test_low_confidence_escalates(self, tiers):
+        from app.services.receipt_parser import get_receipt_routing_stats
+
+        responses, calls = tiers
+        responses["cheap"] = _receipt(0.4)
+        responses["strong"] = _receipt(0.9)
+        assert parse_receipt(b"img", "image/png")["confidence"] == 0.9
+        assert calls == ["cheap", "strong"]
+        assert get_receipt_routing_stats()["tiers"]["cheap"]["escalation_rate"] == 1.0
+
+    def test_missing_field_escalates(self, tiers):
+        responses, calls = tiers
+        responses["cheap"] = {**_receipt(0.99), "merchant": None}
+        responses["strong"] = _receipt(0.9)
+        assert parse_receipt(b"img", "image/png")["merchant"] == "Cafe"
+        assert calls == ["cheap", "strong"]
+
+    def test_failed_strong_tier_keeps_cheap_result(self, tiers):
+        responses, calls = tiers
+        responses["cheap"] = _receipt(0.5)
+        responses["strong"] = RuntimeError("down")
+        assert parse_receipt(b"img", "image/png")["confidence"] == 0.5
+
+
+def _receipt(confidence: float) -> dict:
+    return {
+        "amount": "12.00", "merchant": "Cafe", "date": "2025-02-20",
+        "category": "Meals", "currency": "USD", "confidence": confidence,
+    }
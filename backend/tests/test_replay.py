@@ -0,0 +1,158 @@
+"""Tests for record-and-replay of real Nova Act steps."""
+import re
+import time
+import types
+
+import pytest
+
+from app.config import settings
+from app.services import replay as replay_module
+from app.services import storage
+from app.services.act_client import ActClientReal
+from app.services.execution_plan import compile_plan
+from app.services.replay import ReplayStore
+
+STEPS = [
+    {"order": 1, "intent": "navigate", "instruction": "Open form"},
+    {"order": 2, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount", "date"]},
+    {"order": 3, "intent": "upload_receipt", "instruction": "Attach", "uses_parameters": ["receipt_file"]},
+    {"order": 4, "intent": "submit_form", "instruction": "Submit", "selector_hint": "#submit"},
+    {"order": 5, "intent": "confirmation", "instruction": "Confirm"},
+]
+LABELS = {"Amount ($)": "#amount", "Date": "#date", "Category": 'select[name="category"]'}
+
+
+class FakeLocator:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+
+    def count(self):
+        return int(self.selector in self.page.fields or self.selector in self.page.buttons or self.selector == "#receipt")
+
+    def input_value(self):
+        return self.page.fields[self.selector]
+
+    def fill(self, value, timeout=None):
+        self.page.fields[self.selector] = value
+
+    select_option = fill
+
+    def set_input_files(self, path, timeout=None):
+        self.page.file = path.rsplit("/", 1)[-1]
+
+    def click(self, timeout=None):
+        self.page.clicks.append(self.selector)
+
+
+class FakePage:
+    """The expense form: value fields, one file input, and buttons."""
+
+    def __init__(self):
+        self.fields = {selector: "" for selector in LABELS.values()}
+        self.file = None
+        self.buttons = {"#submit"}
+        self.clicks: list[str] = []
+
+    def locator(self, selector):
+        return FakeLocator(self, selector)
+
+    def evaluate(self, script, args=None):
+        fields = {}
+        for param, want in args["values"].items():
+            matches = [s for s, v in self.fields.items() if v == want]
+            if len(matches) == 1:
+                fields[param] = {"selector": matches[0], "tag": matches[0].split("[")[0] if "[" in matches[0] else "input"}
+        return {"fields": fields, "file": "#receipt" if args["file"] and args["file"] == self.file else None}
+
+
+class FakeNova:
+    """act() performs instructions on the fake form like Nova Act would."""
+
+    def __init__(self):
+        self.page = FakePage()
+        self.instructions: list[str] = []
+
+    def act(self, instruction):
+        self.instructions.append(instruction)
+        time.sleep(0.05)
+        for label, value in re.findall(r'Set the "(.+?)" [a-z ]+ to "(.*?)"\.', instruction):
+            self.page.fields[LABELS[label]] = value
+        if upload := re.search(r'upload the file "(.+?)"', instruction):
+            self.page.file = upload.group(1).rsplit("/", 1)[-1]
+        if "Submit Expense" in instruction:
+            self.page.clicks.append("#submit")
+        return types.SimpleNamespace(metadata=types.SimpleNamespace(num_steps_executed=4, time_worked_s=1.0))
+
+    def act_get(self, instruction):
+        return types.SimpleNamespace(response="EXP-2026-000321")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    monkeypatch.setattr(settings, "nova_act_replay", True)
+    monkeypatch.setattr(settings, "nova_act_fuse_steps", True)
+    store = ReplayStore()
+    monkeypatch.setattr(replay_module, "_store", store)
+    return store
+
+
+def run(params, nova=None):
+    nova = nova or FakeNova()
+    run_log: list[str] = []
+    ActClientReal()._run_steps(nova, compile_plan(STEPS), params, run_log, agent_id="agent_r")
+    return nova, run_log
+
+
+PARAMS = {"amount": "42", "date": "2026-02-01", "receipt_file": "/tmp/r1.pdf"}
+
+
+def test_records_then_replays_with_new_values(store, tmp_path):
+    first, _ = run(PARAMS)
+    assert len(first.instructions) == 3  # fused fill+upload, submit, confirm
+    script = storage.read_json(tmp_path / "demo" / "replay" / "agent_r.json")
+    recorded = {s["index"]: s for s in script["steps"]}
+    assert set(recorded) == {2, 3, 4}  # confirmation has no hint: not recordable
+    assert recorded[2]["params"] == ["amount", "date"]
+    assert recorded[4]["actions"] == [{"kind": "click", "selector": "#submit", "param": None}]
+
+    second, run_log = run({"amount": "99", "date": "2026-03-01", "receipt_file": "/tmp/r2.pdf"})
+    # Only the unrecorded confirmation step still calls act()
+    assert len(second.instructions) == 1 and "Confirm" in second.instructions[0]
+    assert second.page.fields["#amount"] == "99" and second.page.file == "r2.pdf"
+    assert second.page.clicks == ["#submit"]
+    assert any("1 act() calls for 4 steps (3 replayed" in line for line in run_log)
+    stats = store.stats()
+    assert stats["hits"] == 3
+    assert stats["hit_rate"] == pytest.approx(3 / 8, abs=1e-3)
+    assert stats["seconds_saved"] > 0
+
+
+def test_uncovered_parameter_falls_back_to_act(store):
+    run(PARAMS)
+    nova, _ = run({**PARAMS, "category": "Travel"})
+    assert any("Category" in i for i in nova.instructions)
+    # The fill step was re-recorded with the new parameter
+    assert nova.page.fields['select[name="category"]'] == "Travel"
+    again, _ = run({**PARAMS, "category": "Meals"})
+    assert again.page.fields['select[name="category"]'] == "Meals"
+    assert len(again.instructions) == 1
+
+
+def test_failed_replay_falls_back_for_that_step_only(store):
+    run(PARAMS)
+    nova = FakeNova()
+    nova.page.buttons.clear()  # submit button moved: recorded selector no longer matches
+    _, run_log = run(PARAMS, nova)
+    assert any("Step 4: replay failed" in line for line in run_log)
+    assert [i.split(" ")[0] for i in nova.instructions] == ["Click", "A"]
+    assert store.stats()["failed"] == 1
+
+
+def test_replay_disabled(store, monkeypatch):
+    monkeypatch.setattr(settings, "nova_act_replay", False)
+    run(PARAMS)
+    nova, _ = run(PARAMS)
+    assert len(nova.instructions) == 3
+    assert store.stats()["recorded"] == 0
@@ -0,0 +1,170 @@
+"""Tests for Bedrock resilience: error classification, backoff, circuit breaker, deadlines."""
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+from app.services.resilience import (
+    AdaptiveBackoff,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    call_with_retry,
+    classify_error,
+)
+
+
+def _client_error(code: str, status: int = 400) -> ClientError:
+    return ClientError(
+        {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "InvokeModel",
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class TestClassifyError:
+    def test_kinds(self):
+        assert classify_error(_client_error("ThrottlingException", 429)) == "throttle"
+        assert classify_error(_client_error("ModelTimeoutException", 408)) == "timeout"
+        assert classify_error(_client_error("ValidationException")) == "validation"
+        assert classify_error(_client_error("InternalServerException", 500)) == "server"
+        assert classify_error(ReadTimeoutError(endpoint_url="https://x")) == "timeout"
+        assert classify_error(ValueError("boom")) == "other"
+
+
+class TestAdaptiveBackoff:
+    def test_delay_is_jittered_and_capped(self):
+        backoff = AdaptiveBackoff(base=1.0, cap=5.0)
+        assert backoff.delay(1, rng=lambda lo, hi: hi) == 1.0
+        assert backoff.delay(3, rng=lambda lo, hi: hi) == 4.0
+        assert backoff.delay(10, rng=lambda lo, hi: hi) == 5.0
+        assert backoff.delay(2, rng=lambda lo, hi: lo) == 0.0
+
+    def test_throttle_raises_penalty_and_success_decays(self):
+        backoff = AdaptiveBackoff(base=1.0, cap=100.0)
+        backoff.on_throttle()
+        backoff.on_throttle()
+        assert backoff.delay(1, rng=lambda lo, hi: hi) == 4.0
+        backoff.on_success()
+        assert backoff.delay(1, rng=lambda lo, hi: hi) == 2.0
+
+
+def _call(fn, clock, breaker=None, max_attempts=4, deadline=60.0):
+    return call_with_retry(
+        fn,
+        operation="test",
+        breaker=breaker or CircuitBreaker("t", failure_threshold=10, reset_timeout=30, clock=clock),
+        backoff=AdaptiveBackoff(base=1.0, cap=10.0),
+        max_attempts=max_attempts,
+        deadline_seconds=deadline,
+        sleep=clock.sleep,
+        clock=clock,
+    )
+
+
+class TestCallWithRetry:
+    def test_retries_throttle_then_succeeds(self):
+        clock = FakeClock()
+        errors = [_client_error("ThrottlingException", 429), _client_error("ThrottlingException", 429)]
+
+        def fn(remaining):
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        assert _call(fn, clock) == "ok"
+        assert not errors
+
+    def test_validation_is_not_retried(self):
+        clock = FakeClock()
+        calls = []
+
+        def fn(remaining):
+            calls.append(remaining)
+            raise _client_error("ValidationException")
+
+        with pytest.raises(ClientError):
+            _call(fn, clock)
+        assert len(calls) == 1
+
+    def test_gives_up_after_max_attempts(self):
+        clock = FakeClock()
+        calls = []
+
+        def fn(remaining):
+            calls.append(remaining)
+            raise _client_error("InternalServerException", 500)
+
+        with pytest.raises(ClientError):
+            _call(fn, clock, max_attempts=3)
+        assert len(calls) == 3
+
+    def test_deadline_bounds_attempts_and_passes_remaining_time(self):
+        clock = FakeClock()
+        seen = []
+
+        def fn(remaining):
+            seen.append(remaining)
+            clock.now += 4.0  # each attempt hangs until its timeout
+            raise ReadTimeoutError(endpoint_url="https://x")
+
+        with pytest.raises((DeadlineExceededError, ReadTimeoutError)):
+            _call(fn, clock, max_attempts=10, deadline=10.0)
+        assert seen[0] == 10.0
+        assert clock.now <= 10.0 + 4.0
+        assert all(r > 0 for r in seen)
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_fails_fast(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("bedrock", failure_threshold=2, reset_timeout=30, clock=clock)
+        calls = []
+
+        def fn(remaining):
+            calls.append(1)
+            raise _client_error("ThrottlingException", 429)
+
+        with pytest.raises(ClientError):
+            _call(fn, clock, breaker=breaker, max_attempts=1)
+        with pytest.raises(ClientError):
+            _call(fn, clock, breaker=breaker, max_attempts=1)
+        assert breaker.snapshot()["state"] == "open"
+        with pytest.raises(CircuitOpenError):
+            _call(fn, clock, breaker=breaker)
+        assert len(calls) == 2
+
+    def test_half_open_probe_closes_on_success(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("bedrock", failure_threshold=1, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        assert breaker.snapshot()["state"] == "open"
+        clock.now += 31
+        assert _call(lambda remaining: "ok", clock, breaker=breaker) == "ok"
+        snap = breaker.snapshot()
+        assert snap["state"] == "closed"
+        assert snap["times_opened"] == 1
+
+    def test_half_open_failure_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("bedrock", failure_threshold=3, reset_timeout=30, clock=clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now += 31
+        breaker.before_call()
+        assert breaker.snapshot()["state"] == "half_open"
+        breaker.record_failure()
+        assert breaker.snapshot()["state"] == "open"
+
+
+def test_health_reports_circuit_state(client):
+    data = client.get("/api/health").json()
+    assert data["bedrock_circuit"]["state"] in ("closed", "open", "half_open")
@@ -0,0 +1,192 @@
+"""Tests for resumable receipt uploads, including a simulated flaky mobile client."""
+import hashlib
+import json
+import random
+import threading
+
+import pytest
+
+from app.config import settings
+from app.services import resumable_uploads, storage
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(random.Random(7).getrandbits(8) for _ in range(50_000))
+
+
+@pytest.fixture(autouse=True)
+def tmp_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    return tmp_path
+
+
+def create(client, content: bytes, content_type: str = "image/jpeg") -> str:
+    r = client.post(
+        "/api/capture/receipt/uploads",
+        json={"size": len(content), "content_type": content_type, "filename": "r.jpg"},
+    )
+    assert r.status_code == 200
+    assert r.json()["offset"] == 0
+    return r.json()["upload_id"]
+
+
+def put_range(client, upload_id: str, content: bytes, start: int, end: int):
+    return client.put(
+        f"/api/capture/receipt/uploads/{upload_id}",
+        content=content[start:end],
+        headers={"Content-Range": f"bytes {start}-{end - 1}/{len(content)}"},
+    )
+
+
+class FlakyClient:
+    """
+    Sends fixed-size ranges over a bad connection: some requests lose part of their
+    body (server sees a short range), some lose the response (client must ask for the
+    offset), and some resend bytes the server already has.
+    """
+
+    def __init__(self, client, seed: int, chunk_size: int = 8192):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.requests = 0
+
+    def upload(self, upload_id: str, content: bytes) -> None:
+        offset = 0
+        while offset < len(content):
+            self.requests += 1
+            assert self.requests < 500, "upload did not converge"
+            start = offset
+            if self.rng.random() < 0.2 and offset:
+                start = max(0, offset - self.rng.randint(1, self.chunk_size))  # duplicate resend
+            end = min(len(content), start + self.chunk_size)
+            sent_end = end
+            if self.rng.random() < 0.3:
+                sent_end = self.rng.randint(start, end)  # connection dropped mid-body
+            r = self.client.put(
+                f"/api/capture/receipt/uploads/{upload_id}",
+                content=content[start:sent_end],
+                headers={"Content-Range": f"bytes {start}-{end - 1}/{len(content)}"},
+            )
+            assert r.status_code == 200
+            if self.rng.random() < 0.3:
+                # Response lost: ask the server how far it got
+                offset = self.client.get(f"/api/capture/receipt/uploads/{upload_id}").json()["offset"]
+            else:
+                offset = r.json()["offset"]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_flaky_client_upload_completes_intact(client, tmp_storage, seed):
+    upload_id = create(client, JPEG)
+    flaky = FlakyClient(client, seed)
+    flaky.upload(upload_id, JPEG)
+    assert flaky.requests > len(JPEG) // flaky.chunk_size
+
+    r = client.post(f"/api/capture/receipt/uploads/{upload_id}/complete")
+    assert r.status_code == 200
+    session_id = r.json()["session_id"]
+    session = json.loads((tmp_storage / "demo" / "sessions" / f"{session_id}.json").read_text())
+    assert session["metadata"]["content_sha256"] == hashlib.sha256(JPEG).hexdigest()
+    # Finished uploads are removed
+    assert client.get(f"/api/capture/receipt/uploads/{upload_id}").status_code == 404
+
+
+def test_concurrent_complete_processes_once(client, monkeypatch):
+    from fastapi import HTTPException
+
+    from app.routes import receipt as receipt_route
+
+    upload_id = create(client, JPEG)
+    put_range(client, upload_id, JPEG, 0, len(JPEG))
+    started, release = threading.Event(), threading.Event()
+    processed = []
+
+    def slow_process(body, media_type, size, sha256):
+        processed.append(sha256)
+        started.set()
+        release.wait(2)
+        return {"session_id": "receipt_once"}
+
+    monkeypatch.setattr(receipt_route, "process_receipt", slow_process)
+    outcomes = []
+    first = threading.Thread(
+        target=lambda: outcomes.append(receipt_route.post_resumable_upload_complete(upload_id))
+    )
+    first.start()
+    assert started.wait(2)
+    for call in (receipt_route.post_resumable_upload_complete, receipt_route.delete_resumable_upload):
+        with pytest.raises(HTTPException) as exc_info:
+            call(upload_id)
+        assert exc_info.value.status_code == 409
+    release.set()
+    first.join()
+    assert outcomes == [{"session_id": "receipt_once"}]
+    assert len(processed) == 1
+    assert client.get(f"/api/capture/receipt/uploads/{upload_id}").status_code == 404
+
+
+def test_range_past_offset_conflicts(client):
+    upload_id = create(client, JPEG)
+    r = put_range(client, upload_id, JPEG, 100, 200)
+    assert r.status_code == 409
+    assert r.headers["Upload-Offset"] == "0"
+
+
+def test_complete_before_all_bytes_conflicts(client):
+    upload_id = create(client, JPEG)
+    assert put_range(client, upload_id, JPEG, 0, 1000).json()["offset"] == 1000
+    r = client.post(f"/api/capture/receipt/uploads/{upload_id}/complete")
+    assert r.status_code == 409
+    assert r.headers["Upload-Offset"] == "1000"
+
+
+def test_bytes_beyond_declared_size_rejected(client):
+    upload_id = create(client, JPEG[:100])
+    r = client.put(
+        f"/api/capture/receipt/uploads/{upload_id}",
+        content=JPEG[:200],
+        headers={"Content-Range": "bytes 0-199/100"},
+    )
+    assert r.status_code == 400
+
+
+def test_wrong_signature_rejected_on_first_range(client):
+    upload_id = create(client, b"MZ" + JPEG[2:])
+    r = put_range(client, upload_id, b"MZ" + JPEG[2:], 0, 4096)
+    assert r.status_code == 400
+    assert client.get(f"/api/capture/receipt/uploads/{upload_id}").status_code == 404
+
+
+def test_create_validates_size_and_type(client):
+    r = client.post("/api/capture/receipt/uploads", json={"size": 10, "content_type": "video/mp4"})
+    assert r.status_code == 400
+    r = client.post(
+        "/api/capture/receipt/uploads", json={"size": 50 * 1024 * 1024, "content_type": "image/png"}
+    )
+    assert r.status_code == 400
+
+
+def test_expired_upload_is_gone(client, monkeypatch):
+    upload_id = create(client, JPEG)
+    put_range(client, upload_id, JPEG, 0, 1000)
+    monkeypatch.setattr(settings, "resumable_upload_ttl_seconds", -1)
+    put_range(client, upload_id, JPEG, 1000, 2000)  # activity with a negative TTL expires it
+    assert client.get(f"/api/capture/receipt/uploads/{upload_id}").status_code == 404
+
+
+def test_purge_removes_only_expired(client, tmp_storage):
+    keep = create(client, JPEG)
+    old = create(client, JPEG)
+    meta_path = tmp_storage / "demo" / "uploads" / f"{old}.json"
+    meta = json.loads(meta_path.read_text())
+    meta["expires_at"] = 0
+    meta_path.write_text(json.dumps(meta))
+    assert resumable_uploads.purge_expired() == 1
+    assert not (tmp_storage / "demo" / "uploads" / f"{old}.part").exists()
+    assert client.get(f"/api/capture/receipt/uploads/{keep}").status_code == 200
+
+
+def test_content_range_parsing():
+    assert resumable_uploads.parse_content_range("bytes 0-99/100") == (0, 99, 100)
+    assert resumable_uploads.parse_content_range("bytes 10-/*") == (10, None, None)
+    with pytest.raises(Exception):
+        resumable_uploads.parse_content_range("items 0-1/2")
@@ -1,4 +1,4 @@
-"""Tests for API routes: health, workflows. No writes to demo/ or real external calls."""
+"""Tests for API routes: health, workflows, batch inference input checks. No writes to demo/ or real external calls."""
 import pytest
 
 
@@ -23,3 +23,9 @@ def test_root_returns_service_info(client):
     data = r.json()
     assert "service" in data
     assert "health" in data
+
+
+def test_infer_batch_rejects_path_like_session_ids(client):
+    r = client.post("/api/infer/batch", json={"session_ids": ["ok_1", "../agents/x"]})
+    assert r.status_code == 400
+    assert "../agents/x" in r.json()["detail"]
@@ -0,0 +1,279 @@
+"""Tests for the agent-run scheduler and durable run queue: lanes, backpressure, leases."""
+import sqlite3
+import threading
+import time
+import types
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.routes import agents as agents_route
+from app.services import run_scheduler, storage
+from app.services.act_client import ActClientMock, ActClientReal
+from app.services.execution_plan import compile_plan
+from app.services.run_queue import RunQueue
+from app.services.run_scheduler import RunScheduler
+
+
+def wait_for(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def make_scheduler(tmp_path, handler, workers=2, queue_size=5, bulk_queue_size=5, run_seconds=10):
+    return RunScheduler(
+        RunQueue(tmp_path / "runs.sqlite3"),
+        workers,
+        queue_size,
+        bulk_queue_size,
+        run_seconds,
+        poll_seconds=0.05,
+        handler=handler,
+    )
+
+
+class TestRunScheduler:
+    def test_bounded_workers_and_interactive_first(self, tmp_path):
+        gate = threading.Event()
+        order: list[str] = []
+
+        def handler(run):
+            gate.wait(5)
+            order.append(run["run_id"])
+            return {"status": "completed", "run_id": run["run_id"]}
+
+        scheduler = make_scheduler(tmp_path, handler)
+        scheduler.submit("b1", "s", {}, lane="bulk")
+        scheduler.submit("i1", "s", {})
+        wait_for(lambda: scheduler.stats()["running"] == 2)
+        # Both workers busy: later runs queue; interactive goes ahead of the earlier bulk run
+        scheduler.submit("b2", "s", {}, lane="bulk")
+        assert scheduler.submit("i2", "s", {}) == 1
+        assert scheduler.position("b2") == 1
+        assert scheduler.position("i1") == 0
+        stats = scheduler.stats()
+        assert stats["queued"] == {"interactive": 1, "bulk": 1}
+        assert stats["utilization"] == 1.0
+
+        gate.set()
+        wait_for(lambda: scheduler.stats()["completed"] == 4)
+        scheduler.shutdown(wait=True, timeout=5)
+        assert order.index("i2") < order.index("b2")
+        assert scheduler.queue.get("b2")["status"] == "completed"
+
+    def test_bulk_leaves_a_worker_for_interactive(self, tmp_path):
+        gate = threading.Event()
+        started = threading.Event()
+
+        def handler(run):
+            if run["lane"] == "interactive":
+                started.set()
+            else:
+                gate.wait(5)
+            return {"status": "completed"}
+
+        scheduler = make_scheduler(tmp_path, handler)
+        scheduler.submit("b1", "s", {}, lane="bulk")
+        scheduler.submit("b2", "s", {}, lane="bulk")
+        wait_for(lambda: scheduler.stats()["running"] == 1)
+        time.sleep(0.2)
+        assert scheduler.stats()["queued"]["bulk"] == 1
+
+        scheduler.submit("i1", "s", {})
+        assert started.wait(5)
+        gate.set()
+        scheduler.shutdown(wait=True, timeout=5)
+
+    def test_full_queue_is_429_with_retry_after(self, tmp_path):
+        gate = threading.Event()
+
+        def handler(run):
+            gate.wait(5)
+            return {"status": "completed"}
+
+        scheduler = make_scheduler(
+            tmp_path, handler, workers=1, queue_size=1, bulk_queue_size=0, run_seconds=30
+        )
+        scheduler.submit("i1", "s", {})
+        wait_for(lambda: scheduler.stats()["running"] == 1)
+        scheduler.submit("i2", "s", {})
+        with pytest.raises(HTTPException) as exc:
+            scheduler.submit("i3", "s", {})
+        assert exc.value.status_code == 429
+        assert 1 <= int(exc.value.headers["Retry-After"]) <= 30
+        with pytest.raises(HTTPException):
+            scheduler.submit("b1", "s", {}, lane="bulk")
+        assert scheduler.stats()["rejected"] == 2
+        gate.set()
+        scheduler.shutdown(wait=True, timeout=5)
+        with pytest.raises(HTTPException) as exc:
+            scheduler.submit("late", "s", {})
+        assert exc.value.status_code == 503
+
+    def test_handler_error_fails_run(self, tmp_path):
+        def handler(run):
+            raise RuntimeError("browser crashed")
+
+        scheduler = make_scheduler(tmp_path, handler)
+        scheduler.submit("r1", "s", {})
+        wait_for(lambda: (scheduler.queue.get("r1") or {}).get("status") == "failed")
+        assert "browser crashed" in scheduler.queue.get("r1")["result"]["run_log"][0]
+        scheduler.shutdown(wait=True, timeout=5)
+
+
+    def test_worker_teardown_runs_on_each_worker_thread(self, tmp_path, monkeypatch):
+        stopped: list[str] = []
+        monkeypatch.setattr(
+            run_scheduler, "_worker_teardown", lambda: stopped.append(threading.current_thread().name)
+        )
+        scheduler = make_scheduler(tmp_path, lambda run: {"status": "completed"})
+        scheduler.start()
+        scheduler.shutdown(wait=True, timeout=5)
+        assert sorted(stopped) == ["agent-run-0", "agent-run-1"]
+
+    def test_lost_lease_aborts_before_filing(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+        monkeypatch.setattr(settings, "nova_act_replay", False)
+        plan = compile_plan([
+            {"order": 1, "intent": "fill_field", "instruction": "Fill", "uses_parameters": ["amount"]},
+            {"order": 2, "intent": "submit_form", "instruction": "Submit"},
+        ])
+        instructions: list[str] = []
+        metadata = types.SimpleNamespace(num_steps_executed=1, time_worked_s=0.1)
+        nova = types.SimpleNamespace(
+            act=lambda i: instructions.append(i) or types.SimpleNamespace(metadata=metadata),
+            act_get=lambda i: types.SimpleNamespace(response="EXP-2026-000001"),
+        )
+
+        def handler(run):
+            assert run_scheduler.ensure_lease() is None  # still held: renewed
+            # The worker stalled past its lease and another worker reclaimed the run
+            with sqlite3.connect(tmp_path / "runs.sqlite3") as db:
+                db.execute("UPDATE runs SET lease_owner = 'other' WHERE run_id = ?", (run["run_id"],))
+            ActClientReal()._run_steps(nova, plan, {"amount": 5}, [])
+            return {"status": "completed"}
+
+        scheduler = make_scheduler(tmp_path, handler)
+        scheduler.submit("r1", "s", {})
+        wait_for(lambda: scheduler.stats()["completed"] == 1)
+        # The fill ran; the submit did not
+        assert len(instructions) == 1 and "Submit Expense" not in instructions[0]
+        assert scheduler.stats()["lost_leases"] == 1
+        assert scheduler.queue.get("r1")["lease_owner"] == "other"
+        scheduler.shutdown(wait=True, timeout=5)
+        run_scheduler.ensure_lease()  # outside a worker: no-op
+
+
+class TestRunQueue:
+    def test_claim_priority_and_finish(self, tmp_path):
+        queue = RunQueue(tmp_path / "q.sqlite3")
+        queue.enqueue("b1", "s1", "bulk", {"n": 1})
+        queue.enqueue("i1", "s2", "interactive", {"n": 2})
+        assert queue.claim("w1", ("interactive", "bulk"), 60, 2)["run_id"] == "i1"
+        assert queue.claim("w1", ("interactive",), 60, 2) is None
+        run = queue.claim("w2", ("interactive", "bulk"), 60, 2)
+        assert run["run_id"] == "b1" and run["payload"] == {"n": 1} and run["attempts"] == 1
+        assert queue.finish("b1", "w1", {"status": "completed"}) is False
+        assert queue.finish("b1", "w2", {"status": "completed"}) is True
+        assert queue.get("b1")["status"] == "completed"
+        assert queue.counts() == {"running": {"interactive": 1}, "completed": {"bulk": 1}}
+
+    def test_expired_lease_is_requeued_then_failed(self, tmp_path):
+        # Two queue objects on one file stand in for two worker processes
+        path = tmp_path / "q.sqlite3"
+        crashed, survivor = RunQueue(path), RunQueue(path)
+        crashed.enqueue("r1", "s1", "interactive", {})
+        assert crashed.claim("dead", ("interactive",), 0.05, 2)["run_id"] == "r1"
+        assert survivor.claim("live", ("interactive",), 60, 2) is None
+        time.sleep(0.1)
+        # Lease expired: re-queued and claimed by the surviving worker
+        run = survivor.claim("live", ("interactive",), 0.05, 2)
+        assert run["run_id"] == "r1" and run["attempts"] == 2
+        assert crashed.heartbeat(["r1"], "dead", 60) == ["r1"]
+        time.sleep(0.1)
+        # Expired again with attempts exhausted: failed instead of re-queued
+        assert survivor.claim("live", ("interactive",), 60, 2) is None
+        failed = survivor.get("r1")
+        assert failed["status"] == "failed"
+        assert "lease expired" in failed["result"]["run_log"][0]
+
+    def test_heartbeat_keeps_lease(self, tmp_path):
+        queue = RunQueue(tmp_path / "q.sqlite3")
+        queue.enqueue("r1", "s1", "interactive", {})
+        queue.claim("w1", ("interactive",), 0.2, 2)
+        for _ in range(3):
+            time.sleep(0.1)
+            assert queue.heartbeat(["r1"], "w1", 0.2) == []
+        assert queue.claim("w2", ("interactive",), 60, 2) is None
+        assert queue.get("r1")["lease_owner"] == "w1"
+
+
+@pytest.fixture
+def real_runs(tmp_path, monkeypatch):
+    """Real Nova Act mode with a blocking fake run_agent and a one-worker scheduler."""
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    monkeypatch.setattr(settings, "nova_act_mode", "real")
+    scheduler = make_scheduler(tmp_path, None, workers=1, queue_size=1, bulk_queue_size=1, run_seconds=45)
+    monkeypatch.setattr(agents_route, "get_run_scheduler", lambda: scheduler)
+    gate = threading.Event()
+    mock_client = ActClientMock()
+
+    def run_agent(spec, parameters, simulate_ui_change=False, **kwargs):
+        gate.wait(5)
+        return mock_client.run_agent(spec, parameters, simulate_ui_change)
+
+    monkeypatch.setattr(agents_route.act_client, "run_agent", run_agent)
+    yield scheduler, gate
+    gate.set()
+    scheduler.shutdown(wait=True, timeout=5)
+
+
+def test_run_endpoint_queues_and_rejects(client, real_runs):
+    scheduler, gate = real_runs
+    session_id = "sess_sched"
+    spec = {
+        "agent_id": "agent_x",
+        "name": "Expense",
+        "description": "Submit expense",
+        "steps": [{"order": 1, "intent": "submit", "instruction": "Submit"}],
+    }
+    storage.write_json(storage.agents_dir() / f"{session_id}.agent.json", spec)
+
+    first = client.post(f"/api/agents/{session_id}/run", json={})
+    assert first.status_code == 200
+    assert first.json()["status"] == "running"
+    wait_for(lambda: scheduler.stats()["running"] == 1)
+    second = client.post(f"/api/agents/{session_id}/run", json={})
+    assert second.json()["queue_position"] == 1
+    poll = client.get(f"/api/agents/{session_id}/run/{second.json()['run_id']}")
+    assert poll.json()["status"] == "running"
+    assert poll.json()["queue_position"] == 1
+
+    rejected = client.post(f"/api/agents/{session_id}/run", json={})
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert client.post(f"/api/agents/{session_id}/run", json={"priority": "bulk"}).status_code == 200
+
+    gate.set()
+    run_id = second.json()["run_id"]
+    wait_for(lambda: client.get(f"/api/agents/{session_id}/run/{run_id}").json()["status"] == "completed")
+
+
+def test_poll_answered_from_queue_without_result_file(client, real_runs):
+    """A poll reaching a process that never saw the run is answered from the shared queue."""
+    scheduler, _ = real_runs
+    scheduler.queue.enqueue("run_elsewhere", "sess_x", "interactive", {})
+    r = client.get("/api/agents/sess_x/run/run_elsewhere")
+    assert r.json()["status"] == "running"
+    assert client.get("/api/agents/other/run/run_elsewhere").status_code == 404
+
+
+def test_health_reports_agent_runs(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    stats = client.get("/api/health").json()["agent_runs"]
+    assert stats["workers"] == settings.agent_run_workers
+    assert set(stats["queued"]) == set(run_scheduler.LANES)
+    assert not (tmp_path / "demo" / "queue").exists()
@@ -0,0 +1,65 @@
+"""Tests for compact session encoding: nulls dropped, URLs interned, duplicates collapsed, budget."""
+import json
+
+from app.models import CaptureSession, CaptureStep
+from app.services.session_encoding import compact_session, encode_session, estimate_tokens
+
+
+def _session(n: int = 3) -> CaptureSession:
+    return CaptureSession(
+        session_id="s1",
+        steps=[
+            CaptureStep(
+                step_index=i,
+                url=f"https://app.example.com/page{i % 2}",
+                action="type",
+                field_label=f"Field {i}",
+                screenshot_path=f"/shots/{i}.png",
+                timestamp=f"2025-02-20T09:00:{i:02d}Z",
+            )
+            for i in range(n)
+        ],
+        metadata={"tenant_id": "acme", "empty": None},
+    )
+
+
+class TestCompactSession:
+    def test_drops_nulls_and_irrelevant_fields(self):
+        data = compact_session(_session())
+        step = data["steps"][0]
+        assert set(step) == {"url", "action", "field"}
+        assert data["metadata"] == {"tenant_id": "acme"}
+        assert data["duration_s"] == 2
+
+    def test_interns_urls(self):
+        data = compact_session(_session(4))
+        assert data["urls"] == ["https://app.example.com/page0", "https://app.example.com/page1"]
+        assert [s["url"] for s in data["steps"]] == [0, 1, 0, 1]
+
+    def test_collapses_consecutive_duplicates(self):
+        step = CaptureStep(step_index=0, url="/a", action="click", element_text="Next")
+        session = CaptureSession(session_id="s", steps=[step, step, step])
+        data = compact_session(session)
+        assert data["steps"] == [{"url": 0, "action": "click", "text": "Next", "repeat": 3}]
+
+
+class TestEncodeSession:
+    def test_smaller_than_full_dump(self):
+        session = _session(20)
+        assert len(encode_session(session)) < len(session.model_dump_json(exclude_none=False)) / 2
+
+    def test_budget_elides_middle_deterministically(self):
+        session = _session(100)
+        out = encode_session(session, token_budget=200)
+        assert estimate_tokens(out) <= 200
+        assert out == encode_session(session, token_budget=200)
+        steps = json.loads(out)["steps"]
+        omitted = [s for s in steps if "omitted" in s]
+        assert len(omitted) == 1
+        assert steps[0]["field"] == "Field 0"
+        assert steps[-1]["field"] == "Field 99"
+        assert omitted[0]["omitted"] + len(steps) - 1 == 100
+
+    def test_no_budget_keeps_all_steps(self):
+        out = json.loads(encode_session(_session(50), token_budget=0))
+        assert len(out["steps"]) == 50
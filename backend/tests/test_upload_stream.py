@@ -0,0 +1,161 @@
+"""Tests for streaming uploads: early size/type rejection, hashing, receipt route."""
+import asyncio
+import hashlib
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.config import settings
+from app.services import storage
+from app.services.upload_stream import UploadSink, receive_file, sniff_media_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+ALLOWED = {"image/png", "image/jpeg", "application/pdf", "text/plain"}
+BOUNDARY = "testboundary"
+
+
+def multipart_chunks(content: bytes, content_type: str, chunk_size: int = 1024) -> list[bytes]:
+    body = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="receipt"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+    return [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+
+def streaming_request(chunks: list[bytes], content_length: int | None = None) -> tuple[Request, list]:
+    """Request whose body arrives in chunks; the returned list records chunks consumed."""
+    consumed: list[bytes] = []
+    queue = list(chunks)
+
+    async def receive():
+        if queue:
+            chunk = queue.pop(0)
+            consumed.append(chunk)
+            return {"type": "http.request", "body": chunk, "more_body": bool(queue)}
+        return {"type": "http.disconnect"}
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": headers}
+    return Request(scope, receive), consumed
+
+
+class TestUploadSink:
+    def test_sniffs_signatures(self):
+        assert sniff_media_type(PNG) == "image/png"
+        assert sniff_media_type(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+        assert sniff_media_type(b"%PDF-1.7\n") == "application/pdf"
+        assert sniff_media_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+        assert sniff_media_type(b"hello") is None
+
+    def test_signature_overrides_declared_type(self):
+        sink = UploadSink("image/jpeg", ALLOWED, 1024)
+        sink.write(PNG)
+        upload = sink.finish()
+        assert upload.media_type == "image/png"
+        assert upload.sha256 == hashlib.sha256(PNG).hexdigest()
+        assert upload.read() == PNG
+        upload.close()
+
+    def test_rejects_binary_without_known_signature(self):
+        sink = UploadSink("image/png", ALLOWED, 1024)
+        with pytest.raises(HTTPException) as exc_info:
+            sink.write(b"MZ\x90\x00" + b"\x00" * 32)
+        assert exc_info.value.status_code == 400
+        assert "does not match" in exc_info.value.detail
+
+    def test_rejects_on_chunk_that_crosses_limit(self):
+        sink = UploadSink("image/png", ALLOWED, 100)
+        sink.write(PNG)
+        with pytest.raises(HTTPException) as exc_info:
+            sink.write(b"\x00" * 64)
+        assert "too large" in exc_info.value.detail
+
+    def test_text_declared_type_kept_when_no_signature(self):
+        sink = UploadSink("text/plain; charset=utf-8", ALLOWED, 1024)
+        sink.write(b"Total: $4.50")
+        assert sink.finish().media_type == "text/plain"
+
+    def test_text_with_nul_past_the_first_bytes_rejected(self):
+        for chunks in ([b"Total: $4.50 " * 4 + b"\x00"], [b"Merchant: Cafe Luna\n", b"Total\x00"]):
+            sink = UploadSink("text/plain", ALLOWED, 1024)
+            with pytest.raises(HTTPException) as exc_info:
+                for chunk in chunks:
+                    sink.write(chunk)
+            assert "does not match" in exc_info.value.detail
+
+    def test_large_upload_spools_to_disk(self, monkeypatch):
+        monkeypatch.setattr(settings, "upload_spool_threshold_bytes", 32)
+        sink = UploadSink("image/png", ALLOWED, 1024)
+        sink.write(PNG)
+        sink.write(b"\x00" * 200)
+        assert sink._file._rolled
+        sink.discard()
+
+
+class TestReceiveFile:
+    def test_streams_and_hashes(self):
+        content = PNG + b"\x01" * 5000
+        request, consumed = streaming_request(multipart_chunks(content, "image/png"))
+        upload = asyncio.run(receive_file(request, ALLOWED, 1024 * 1024))
+        assert upload.size == len(content)
+        assert upload.sha256 == hashlib.sha256(content).hexdigest()
+        assert upload.read() == content
+        upload.close()
+
+    def test_bogus_file_rejected_after_first_chunk(self):
+        chunks = multipart_chunks(b"MZ" + b"\x00" * 20000, "image/png")
+        request, consumed = streaming_request(chunks)
+        with pytest.raises(HTTPException):
+            asyncio.run(receive_file(request, ALLOWED, 1024 * 1024))
+        assert len(consumed) == 1 < len(chunks)
+
+    def test_oversized_stream_rejected_before_end(self):
+        chunks = multipart_chunks(PNG + b"\x00" * 20000, "image/png")
+        request, consumed = streaming_request(chunks)
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(receive_file(request, ALLOWED, 4096))
+        assert "too large" in exc_info.value.detail
+        assert len(consumed) < len(chunks)
+
+    def test_content_length_checked_before_reading(self):
+        chunks = multipart_chunks(PNG, "image/png")
+        request, consumed = streaming_request(chunks, content_length=10 * 1024 * 1024)
+        with pytest.raises(HTTPException):
+            asyncio.run(receive_file(request, ALLOWED, 1024))
+        assert consumed == []
+
+
+def test_receipt_route_records_content_hash(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_project_root", lambda: tmp_path)
+    r = client.post("/api/capture/receipt", files={"file": ("r.png", PNG, "image/png")})
+    assert r.status_code == 200
+    session_id = r.json()["session_id"]
+    session = json.loads((tmp_path / "demo" / "sessions" / f"{session_id}.json").read_text())
+    assert session["metadata"]["content_sha256"] == hashlib.sha256(PNG).hexdigest()
+
+
+def test_receipt_route_processes_off_the_event_loop(client, monkeypatch):
+    from app.routes import receipt as receipt_route
+
+    def process(body, media_type, size, sha256):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return {"session_id": "off_loop"}
+        return {"session_id": "on_loop"}
+
+    monkeypatch.setattr(receipt_route, "process_receipt", process)
+    r = client.post("/api/capture/receipt", files={"file": ("r.png", PNG, "image/png")})
+    assert r.json() == {"session_id": "off_loop"}
+
+
+def test_receipt_route_rejects_mislabelled_file(client):
+    r = client.post(
+        "/api/capture/receipt", files={"file": ("r.png", b"not an image at all", "image/png")}
+    )
+    assert r.status_code == 400